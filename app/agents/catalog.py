@@ -0,0 +1,206 @@
+
+"""Recommender catalog sources and the persisted TF-IDF index built from them.
+
+A catalog is a list of {"id", "title", "desc", ...} dicts, read from JSON / JSONL / CSV or
+a SQLite table. CatalogIndex keeps the fitted vocabulary and idf plus the L2-normalised
+CSR matrix on disk as .npy files that are memory-mapped on load, so a restart doesn't
+refit. Added or changed items are vectorised against the fixed vocabulary and appended;
+removed or replaced rows are tombstoned in the `alive` mask until the next compaction.
+"""
+
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize as l2_normalize
+
+INDEX_VERSION = 1
+VECTORIZER_PARAMS = {"ngram_range": (1, 2), "stop_words": "english", "lowercase": True, "min_df": 1}
+COMPACT_RATIO = 0.2  # rewrite without tombstones once this share of rows is dead
+SQLITE_SUFFIXES = {".db", ".sqlite", ".sqlite3"}
+
+# ---- sources ------------------------------------------------------------
+
+def _coerce(row: Dict) -> Dict:
+    item = dict(row)
+    item.setdefault("title", item.get("name", ""))
+    item.setdefault("desc", item.get("description", item.get("category", "")))
+    if item.get("id") is None:
+        raise ValueError(f"catalog item without an id: {row!r}")
+    item["title"] = str(item["title"] or "")
+    item["desc"] = str(item["desc"] or "")
+    return item
+
+def load_catalog(source: str, table: str = "catalog") -> List[Dict]:
+    """Read catalog items from a .json / .jsonl / .csv file or a table in a SQLite file."""
+    path = Path(source)
+    suffix = path.suffix.lower()
+    if suffix in SQLITE_SUFFIXES:
+        con = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            con.row_factory = sqlite3.Row
+            rows = [dict(r) for r in con.execute(f'SELECT * FROM "{table}";')]
+        finally:
+            con.close()
+    elif suffix == ".jsonl":
+        with open(path, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    elif suffix == ".csv":
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            rows = json.load(f)
+    return [_coerce(r) for r in rows]
+
+def source_signature(source: str, table: str = "catalog") -> str:
+    """Cheap change detector for a catalog file: size and mtime, no read."""
+    st = os.stat(source)
+    return f"{Path(source).resolve()}:{table}:{st.st_size}:{st.st_mtime_ns}"
+
+def items_signature(items: Iterable[Dict]) -> str:
+    payload = json.dumps(list(items), sort_keys=True, default=str)
+    return "inline:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def item_digest(item: Dict) -> str:
+    return hashlib.sha256(json.dumps(item, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+# ---- index --------------------------------------------------------------
+
+def _unit_rows(mat) -> sp.csr_matrix:
+    mat = l2_normalize(mat.astype(np.float32).tocsr(), norm="l2", copy=False)
+    mat.sort_indices()
+    return mat
+
+class CatalogIndex:
+    """One immutable snapshot of the catalog; updates return a new snapshot."""
+
+    def __init__(self, items: List[Dict], terms: List[str], idf: np.ndarray, mat: sp.csr_matrix,
+                 alive: np.ndarray, fitted_rows: int, appended: int = 0):
+        self.items = items
+        self.terms = terms
+        self.idf = idf
+        self.mat = mat
+        self.alive = alive
+        self.fitted_rows = fitted_rows  # rows the vocabulary and idf were learned from
+        self.appended = appended        # rows vectorised against that vocabulary since the fit
+        self.rows = {it["id"]: i for i, it in enumerate(items) if alive[i]}
+        self.vectorizer = TfidfVectorizer(vocabulary={t: i for i, t in enumerate(terms)}, **VECTORIZER_PARAMS)
+        self.vectorizer.idf_ = np.asarray(idf, dtype=np.float64)
+
+    @property
+    def dead(self) -> int:
+        return len(self.items) - len(self.rows)
+
+    @classmethod
+    def fit(cls, items: List[Dict], texts: List[str]) -> "CatalogIndex":
+        vectorizer = TfidfVectorizer(**VECTORIZER_PARAMS)
+        mat = _unit_rows(vectorizer.fit_transform(texts))
+        terms = vectorizer.get_feature_names_out().tolist()
+        return cls(list(items), terms, vectorizer.idf_.astype(np.float32), mat,
+                   np.ones(len(items), dtype=bool), len(items))
+
+    def transform(self, texts: List[str]) -> sp.csr_matrix:
+        """Vectorise with the fitted vocabulary; terms it has never seen are ignored."""
+        return _unit_rows(self.vectorizer.transform(texts))
+
+    def upsert(self, items: List[Dict], texts: List[str]) -> "CatalogIndex":
+        """Append new versions of the given items, tombstoning any rows they replace."""
+        if not items:
+            return self
+        alive = np.array(self.alive, dtype=bool)
+        for it in items:
+            row = self.rows.get(it["id"])
+            if row is not None:
+                alive[row] = False
+        mat = sp.vstack([self.mat, self.transform(texts)], format="csr", dtype=np.float32)
+        alive = np.concatenate([alive, np.ones(len(items), dtype=bool)])
+        return CatalogIndex(self.items + list(items), self.terms, self.idf, mat, alive, self.fitted_rows,
+                            self.appended + len(items))
+
+    def remove(self, ids: Iterable) -> "CatalogIndex":
+        rows = [self.rows[i] for i in ids if i in self.rows]
+        if not rows:
+            return self
+        alive = np.array(self.alive, dtype=bool)
+        alive[rows] = False
+        return CatalogIndex(self.items, self.terms, self.idf, self.mat, alive, self.fitted_rows, self.appended)
+
+    def compact(self) -> "CatalogIndex":
+        """Drop tombstoned rows; row numbers change, the vocabulary does not."""
+        keep = np.flatnonzero(self.alive)
+        items = [self.items[i] for i in keep]
+        return CatalogIndex(items, self.terms, self.idf, self.mat[keep], np.ones(len(items), dtype=bool),
+                            self.fitted_rows, self.appended)
+
+    # ---- persistence ----------------------------------------------------
+
+    def save(self, index_dir: str, signature: str):
+        """Each file is replaced by rename, manifest last; load() rejects files whose shapes disagree."""
+        d = Path(index_dir)
+        d.mkdir(parents=True, exist_ok=True)
+
+        def _put(name: str, write):
+            tmp = d / f"{name}.tmp"
+            with open(tmp, "wb") as f:
+                write(f)
+            os.replace(tmp, d / name)
+
+        mat = self.mat
+        _put("data.npy", lambda f: np.save(f, np.asarray(mat.data, dtype=np.float32)))
+        _put("indices.npy", lambda f: np.save(f, np.asarray(mat.indices)))
+        _put("indptr.npy", lambda f: np.save(f, np.asarray(mat.indptr)))
+        _put("idf.npy", lambda f: np.save(f, np.asarray(self.idf, dtype=np.float32)))
+        _put("alive.npy", lambda f: np.save(f, np.asarray(self.alive, dtype=bool)))
+        _put("terms.txt", lambda f: f.write("\n".join(self.terms).encode("utf-8")))
+        _put("items.json", lambda f: f.write(json.dumps(self.items, default=str).encode("utf-8")))
+        manifest = {
+            "version": INDEX_VERSION,
+            "vectorizer": {k: list(v) if isinstance(v, tuple) else v for k, v in VECTORIZER_PARAMS.items()},
+            "signature": signature,
+            "shape": list(mat.shape),
+            "fitted_rows": self.fitted_rows,
+            "appended": self.appended,
+        }
+        _put("manifest.json", lambda f: f.write(json.dumps(manifest, indent=1).encode("utf-8")))
+
+    @staticmethod
+    def read_manifest(index_dir: str) -> Optional[Dict]:
+        try:
+            with open(Path(index_dir) / "manifest.json", "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        params = {k: list(v) if isinstance(v, tuple) else v for k, v in VECTORIZER_PARAMS.items()}
+        if manifest.get("version") != INDEX_VERSION or manifest.get("vectorizer") != params:
+            return None
+        return manifest
+
+    @classmethod
+    def load(cls, index_dir: str, manifest: Dict) -> Optional["CatalogIndex"]:
+        """Memory-map the persisted matrix; None if the files are missing or don't agree."""
+        d = Path(index_dir)
+        try:
+            data = np.load(d / "data.npy", mmap_mode="r")
+            indices = np.load(d / "indices.npy", mmap_mode="r")
+            indptr = np.load(d / "indptr.npy", mmap_mode="r")
+            idf = np.load(d / "idf.npy")
+            alive = np.load(d / "alive.npy")
+            terms = (d / "terms.txt").read_text(encoding="utf-8").split("\n")
+            with open(d / "items.json", "r", encoding="utf-8") as f:
+                items = json.load(f)
+        except (OSError, ValueError):
+            return None
+        shape = tuple(manifest["shape"])
+        if not (len(items) == len(alive) == shape[0] == len(indptr) - 1 and len(terms) == len(idf) == shape[1]):
+            return None
+        mat = sp.csr_matrix((data, indices, indptr), shape=shape, copy=False)
+        mat.has_sorted_indices = True  # saved sorted; the mapped arrays are read-only
+        return cls(items, terms, idf, mat, alive, manifest["fitted_rows"], manifest.get("appended", 0))
@@ -1,44 +1,69 @@
 
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+
 import numpy as np
 import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 import unicodedata
-from typing import List, Dict
-
-try:
-    # Optional: allow lightweight LLM re-ranking/enrichment
-    import openai
-    from app.utils.config import settings
-    _HAS_OPENAI = bool(getattr(settings, "OPENAI_API_KEY", ""))
-    _ONLINE = bool(getattr(settings, "RECOMMENDER_ONLINE_ENRICHMENT", False))
-    if _HAS_OPENAI:
-        openai.api_key = settings.OPENAI_API_KEY
-except Exception:
-    _HAS_OPENAI = False
-    _ONLINE = False
+from typing import Iterable, List, Dict
+
+from app.agents.catalog import (
+    COMPACT_RATIO, CatalogIndex, item_digest, items_signature, load_catalog, source_signature,
+)
+from app.utils.cache import SingleFlight, TTLCache
+from app.utils.config import settings
+from app.utils import metrics
+
+# Optional LLM re-ranking/enrichment (RECOMMENDER_ONLINE_ENRICHMENT) goes through the shared
+# chat client; its calls run on one small pool so a latency budget can cut them off
+_llm_pool = None
+_llm_pool_lock = threading.Lock()
+
+def _online() -> bool:
+    return settings.RECOMMENDER_ONLINE_ENRICHMENT and (settings.LLM_BACKEND == "stub" or bool(settings.OPENAI_API_KEY))
+
+def _get_llm_pool() -> ThreadPoolExecutor:
+    global _llm_pool
+    if _llm_pool is None:
+        with _llm_pool_lock:
+            if _llm_pool is None:
+                _llm_pool = ThreadPoolExecutor(max_workers=settings.RECOMMENDER_LLM_CONCURRENCY,
+                                               thread_name_prefix="rec-llm")
+    return _llm_pool
+
+def _chat(system: str, prompt: str) -> List[str]:
+    from app.rag.qa import get_llm
+    with metrics.span("llm"):
+        content = get_llm().invoke([("system", system), ("user", prompt)]).content
+    return [ln.strip() for ln in content.splitlines() if ln.strip()]
+
+def _line_title(line: str) -> str:
+    return line.strip("- ").split(" — ")[0].strip()
+
+DEFAULT_ITEMS = [
+    {"id": 1, "title": "Noise-cancelling headphones", "desc": "over-ear bluetooth travel ANC wireless"},
+    {"id": 2, "title": "Running shoes", "desc": "lightweight breathable daily trainer cushioned"},
+    {"id": 3, "title": "Mechanical keyboard", "desc": "tactile switches compact rgb quiet office"},
+]
 
 class RecommenderAgent:
-    def __init__(self):
-        self.items = [
-            {"id": 1, "title": "Noise-cancelling headphones", "desc": "over-ear bluetooth travel ANC wireless"},
-            {"id": 2, "title": "Running shoes", "desc": "lightweight breathable daily trainer cushioned"},
-            {"id": 3, "title": "Mechanical keyboard", "desc": "tactile switches compact rgb quiet office"},
-        ]
-
-        # Build a richer text field combining title + description for better recall
-        corpus: List[str] = [
-            f"{it['title']} {it['desc']}" for it in self.items
-        ]
-
-        # Stronger TF-IDF: unigrams+bigrams, english stopwords, lowercase, simple normalization
-        self.vectorizer = TfidfVectorizer(
-            ngram_range=(1, 2),
-            stop_words="english",
-            lowercase=True,
-            min_df=1,
-        )
-        self.mat = self.vectorizer.fit_transform([self._normalize_text(c) for c in corpus])
+    def __init__(self, items: List[Dict] = None, catalog: str = None, index_dir: str = None):
+        """Explicit `items` are indexed in memory (persisted only if `index_dir` is given);
+        otherwise the catalog is read from RECOMMENDER_CATALOG (the built-in demo items when
+        unset) and the fitted index is kept under RECOMMENDER_INDEX_DIR across restarts."""
+        if items is not None:
+            self.source, self.index_dir = None, index_dir
+            self._inline = [dict(it) for it in items]
+        else:
+            self.source = catalog if catalog is not None else settings.RECOMMENDER_CATALOG
+            self.index_dir = index_dir or settings.RECOMMENDER_INDEX_DIR
+            self._inline = None if self.source else [dict(it) for it in DEFAULT_ITEMS]
+        self._lock = threading.Lock()
+        self.index: CatalogIndex = None
+        self._llm_cache = TTLCache(maxsize=settings.RECOMMENDER_LLM_CACHE_SIZE, ttl=settings.RECOMMENDER_LLM_CACHE_TTL)
+        self._llm_flight = SingleFlight()
+        self._synced = None  # source signature the current index reflects
 
         # Domain synonyms/expansions to bridge vocabulary gaps
         self.synonyms: Dict[str, List[str]] = {
@@ -48,6 +73,83 @@ class RecommenderAgent:
             "shoes": ["running", "trainer", "sneakers", "breathable", "lightweight"],
             "keyboard": ["mechanical", "tactile", "compact", "rgb", "quiet"],
         }
+        self.sync()
+
+    @property
+    def items(self) -> List[Dict]:
+        idx = self.index
+        return [idx.items[r] for r in sorted(idx.rows.values())]
+
+    # ---- catalog --------------------------------------------------------
+
+    def _signature(self) -> str:
+        if self.source:
+            return source_signature(self.source, settings.RECOMMENDER_CATALOG_TABLE)
+        return items_signature(self._inline)
+
+    def _item_text(self, it: Dict) -> str:
+        # Title + description together give better recall than either alone
+        return self._normalize_text(f"{it['title']} {it['desc']}")
+
+    def _fit(self, items: List[Dict]) -> CatalogIndex:
+        return CatalogIndex.fit(items, [self._item_text(it) for it in items])
+
+    def sync(self):
+        """Bring the index in line with the catalog source.
+
+        An unchanged source just memory-maps the persisted index. A changed one is diffed by
+        item id and content: new and edited items are appended, missing ones tombstoned. The
+        vocabulary is refit only once appended rows outgrow RECOMMENDER_REFIT_RATIO of the
+        rows it was learned from (or of the live catalog, if smaller), since terms it never
+        saw don't score."""
+        with self._lock:
+            signature = self._signature()
+            if self.index is not None and signature == self._synced:
+                return
+            base = self.index
+            if base is None and self.index_dir:
+                manifest = CatalogIndex.read_manifest(self.index_dir)
+                base = manifest and CatalogIndex.load(self.index_dir, manifest)
+                if base is not None and manifest["signature"] == signature:
+                    self.index, self._synced = base, signature
+                    return
+
+            items = load_catalog(self.source, settings.RECOMMENDER_CATALOG_TABLE) if self.source else self._inline
+            idx = self._apply_diff(base, items) if base is not None else None
+            if idx is None or idx.appended > settings.RECOMMENDER_REFIT_RATIO * max(min(idx.fitted_rows, len(idx.rows)), 1):
+                idx = self._fit(items)
+            self._commit(idx, signature)
+
+    def _apply_diff(self, base: CatalogIndex, items: List[Dict]) -> CatalogIndex:
+        current = {it["id"]: it for it in items}
+        removed = [i for i in base.rows if i not in current]
+        changed = [it for i, it in current.items()
+                   if i not in base.rows or item_digest(base.items[base.rows[i]]) != item_digest(it)]
+        return base.remove(removed).upsert(changed, [self._item_text(it) for it in changed])
+
+    def _commit(self, idx: CatalogIndex, signature: str = ""):
+        """Swap in a new snapshot (caller holds the lock). An empty signature marks a
+        hand-edited index, which the next sync() re-diffs against the source."""
+        if idx.dead > COMPACT_RATIO * len(idx.items):
+            idx = idx.compact()
+        if self.index_dir:
+            idx.save(self.index_dir, signature)
+        self.index, self._synced = idx, signature
+
+    def upsert_items(self, items: Iterable[Dict]):
+        """Add or replace items by id without refitting the vocabulary."""
+        items = [dict(it) for it in items]
+        with self._lock:
+            self._commit(self.index.upsert(items, [self._item_text(it) for it in items]))
+
+    def remove_items(self, ids: Iterable):
+        with self._lock:
+            self._commit(self.index.remove(list(ids)))
+
+    def refit(self):
+        """Relearn vocabulary and idf from the live items, e.g. after heavy catalog drift."""
+        with self._lock:
+            self._commit(self._fit(self.items))
 
     def _normalize_text(self, text: str) -> str:
         t = unicodedata.normalize("NFKC", text)
@@ -66,83 +168,201 @@ class RecommenderAgent:
                 expanded.extend(self.synonyms[tok])
         return " ".join(expanded)
 
-    def run(self, query: str, k: int = 2):
-        # Expand and normalize the query for better lexical overlap
-        expanded_query = self._expand_query(query)
-        qv = self.vectorizer.transform([expanded_query])
-        sims = cosine_similarity(qv, self.mat)[0]
-        idxs = np.argsort(-sims)[:k]
+    def _query_matrix(self, idx: CatalogIndex, queries: List[str]):
+        return idx.transform([self._expand_query(q) for q in queries])
+
+    @staticmethod
+    def _top_k(sims: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the k best scores, best first, ties to the lower item index; O(n)
+        selection instead of a full sort."""
+        k = min(k, sims.shape[0])
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        if k < sims.shape[0]:
+            # argpartition picks an arbitrary subset of the scores tied at the k-th place:
+            # keep everything above it, then the lowest-index ties
+            kth = sims[np.argpartition(-sims, k - 1)[k - 1]]
+            above = np.flatnonzero(sims > kth)
+            cand = np.concatenate([above, np.flatnonzero(sims == kth)[:k - above.size]])
+        else:
+            cand = np.arange(sims.shape[0])
+        return cand[np.lexsort((cand, -sims[cand]))]
+
+    @staticmethod
+    def _top_k_rows(sims: np.ndarray, k: int) -> np.ndarray:
+        """_top_k for every row of a (queries x items) score block at once."""
+        n = sims.shape[1]
+        k = min(k, n)
+        if k <= 0:
+            return np.empty((sims.shape[0], 0), dtype=np.int64)
+        if k < n:
+            # Per row, as in _top_k: scores above the k-th, then its lowest-index ties
+            part = np.argpartition(-sims, k - 1, axis=1)[:, k - 1:k]
+            kth = np.take_along_axis(sims, part, axis=1)
+            above = sims > kth
+            ties = sims == kth
+            need = k - above.sum(axis=1, keepdims=True)
+            keep = above | (ties & (np.cumsum(ties, axis=1) <= need))
+            cand = np.nonzero(keep)[1].reshape(sims.shape[0], k)
+        else:
+            cand = np.broadcast_to(np.arange(n), sims.shape)
+        scores = np.take_along_axis(sims, cand, axis=1)
+        # Same tie order as _top_k: score descending, then item index
+        order = np.lexsort((cand, -scores), axis=1)
+        return np.take_along_axis(cand, order, axis=1)
+
+    @staticmethod
+    def _mask_dead(idx: CatalogIndex, sims: np.ndarray):
+        if idx.dead:
+            sims[..., ~idx.alive] = -np.inf  # tombstoned rows never rank
+
+    @staticmethod
+    def _rationale(idx: CatalogIndex, qidx: np.ndarray, qdata: np.ndarray, row: int):
+        """Top overlapping features, from the intersection of query and item nonzeros."""
+        mat = idx.mat
+        start, end = mat.indptr[row], mat.indptr[row + 1]
+        common, qi, ii = np.intersect1d(qidx, mat.indices[start:end], assume_unique=True, return_indices=True)
+        if not common.size:
+            return None
+        contrib = qdata[qi] * mat.data[start:end][ii]
+        order = np.argsort(-contrib, kind="stable")[:3]
+        feats = [idx.terms[common[j]] for j in order if contrib[j] > 0]
+        return ", ".join(feats) if feats else None
+
+    def _rank(self, idx: CatalogIndex, qv, sims, top: np.ndarray):
+        qidx, qdata = qv.indices, qv.data
         results = []
-        for i in idxs:
-            item = dict(self.items[int(i)])
-            score = float(sims[int(i)])
+        for i in top:
+            if not np.isfinite(sims[i]):
+                break
+            item = dict(idx.items[int(i)])
+            item.update({"score": float(sims[int(i)])})
             # Short rationale: show top overlapping features from vector vocab
-            rationale = None
             try:
-                vocab = self.vectorizer.get_feature_names_out()
-                qnz = qv.toarray()[0]
-                inz = self.mat[int(i)].toarray()[0]
-                contrib = (qnz * inz)
-                top_idx = np.argsort(-contrib)[:3]
-                feats = [vocab[j] for j in top_idx if contrib[j] > 0]
-                if feats:
-                    rationale = ", ".join(feats)
+                rationale = self._rationale(idx, qidx, qdata, int(i))
             except Exception:
                 rationale = None
-            item.update({"score": score})
             if rationale:
                 item["why"] = rationale
             results.append(item)
+        return results
 
-        # Optional re-ranking using LLM for tie-breaking/semantic boost
-        if _HAS_OPENAI and _ONLINE:
-            try:
-                prompt = (
-                    "Given the user query and a list of items (title + desc), "
-                    "return the best top items in order. Only re-rank; do not invent new items.\n"
-                    f"Query: {query}\n\n"
-                    f"Items:\n" +
-                    "\n".join([f"- {r['title']}: {r['desc']}" for r in results]) +
-                    "\n\nRespond with the reordered list of titles separated by newlines."
-                )
-                resp = openai.ChatCompletion.create(
-                    model=getattr(settings, "OPENAI_MODEL", "gpt-4o-mini"),
-                    messages=[
-                        {"role": "system", "content": "You are a ranking assistant."},
-                        {"role": "user", "content": prompt},
-                    ],
-                    temperature=0.0,
-                )
-                order = [t.strip("- ") for t in resp.choices[0].message.content.splitlines() if t.strip()]
-                title_to_item = {it["title"]: it for it in results}
-                reranked = [title_to_item[t] for t in order if t in title_to_item]
-                # Preserve any items not mentioned by LLM at the end
-                tail = [it for it in results if it not in reranked]
-                results = reranked + tail
-            except Exception:
-                pass
+    def run(self, query: str, k: int = 2):
+        idx = self.index  # one snapshot per call; updates swap in a new one
+        # Expand and normalize the query for better lexical overlap
+        with metrics.span("recommend"):
+            qv = self._query_matrix(idx, [query])
+            sims = np.asarray((idx.mat @ qv.T).todense()).ravel()
+            self._mask_dead(idx, sims)
+            results = self._rank(idx, qv, sims, self._top_k(sims, k))
+        return self._postprocess(query, results)
 
-        # Optional brand/link enrichment as a final step
-        if _HAS_OPENAI and _ONLINE:
-            try:
-                enrich_prompt = (
-                    "For each item below, suggest 1-2 reputable brand models and a short reason. "
-                    "Output one line per item as: Title — Brands: <brand1, brand2> — Note: <why>. "
-                    f"\nQuery: {query}\nItems:\n" +
-                    "\n".join([r['title'] for r in results])
-                )
-                resp = openai.ChatCompletion.create(
-                    model=getattr(settings, "OPENAI_MODEL", "gpt-4o-mini"),
-                    messages=[
-                        {"role": "system", "content": "You enrich recommendations with concrete brands."},
-                        {"role": "user", "content": enrich_prompt},
-                    ],
-                    temperature=0.2,
-                )
-                lines = [ln for ln in resp.choices[0].message.content.splitlines() if ln.strip()]
-                for i, ln in enumerate(lines[:len(results)]):
-                    results[i]["why"] = results[i].get("why") or ln.strip()
-            except Exception:
-                pass
+    def run_batch(self, queries: List[str], k: int = 2, chunk_size: int = None):
+        """Score many queries at once; same results as calling run per query.
+
+        All queries are expanded and vectorised in one call, then scored a chunk of rows at a
+        time (one sparse product per chunk) so the dense score block stays under
+        RECOMMENDER_BATCH_MAX_SCORES cells however large the batch or catalog."""
+        if not queries:
+            return []
+        idx = self.index
+        step = chunk_size or max(1, settings.RECOMMENDER_BATCH_MAX_SCORES // max(idx.mat.shape[0], 1))
+        ranked = []
+        with metrics.span("recommend"):
+            qm = self._query_matrix(idx, queries)
+            for start in range(0, qm.shape[0], step):
+                block = qm[start:start + step]
+                sims = (block @ idx.mat.T).toarray()
+                self._mask_dead(idx, sims)
+                top = self._top_k_rows(sims, k)
+                ranked.extend(self._rank(idx, block[r], sims[r], top[r]) for r in range(block.shape[0]))
+        return self._postprocess_many(queries, ranked)
+
+    # ---- optional LLM post-processing -----------------------------------
 
+    def _llm_step(self, step: str, query: str, results: List[Dict]) -> Dict:
+        """One LLM call; returns a plan {"order": [ids], "notes": {id: line}} over `results`."""
+        by_title = {r["title"]: r["id"] for r in results}
+        plan: Dict = {}
+        if step in ("rerank", "combined"):
+            items = "\n".join([f"- {r['title']}: {r['desc']}" for r in results])
+            if step == "rerank":
+                system = "You are a ranking assistant."
+                fmt = "Respond with the reordered list of titles separated by newlines."
+            else:
+                system = "You rank recommendations and enrich them with concrete brands."
+                fmt = ("Respond with one line per item, best first, as: "
+                       "Title — Brands: <brand1, brand2> — Note: <why>.")
+            prompt = (
+                "Given the user query and a list of items (title + desc), "
+                "return the best top items in order. Only re-rank; do not invent new items.\n"
+                f"Query: {query}\n\nItems:\n{items}\n\n{fmt}"
+            )
+            lines = _chat(system, prompt)
+            plan["order"] = [by_title[t] for t in map(_line_title, lines) if t in by_title]
+            if step == "combined":
+                plan["notes"] = {by_title[_line_title(ln)]: ln for ln in lines if _line_title(ln) in by_title}
+        else:
+            prompt = (
+                "For each item below, suggest 1-2 reputable brand models and a short reason. "
+                "Output one line per item as: Title — Brands: <brand1, brand2> — Note: <why>. "
+                f"\nQuery: {query}\nItems:\n" + "\n".join([r["title"] for r in results])
+            )
+            lines = _chat("You enrich recommendations with concrete brands.", prompt)
+            notes = {by_title[_line_title(ln)]: ln for ln in lines if _line_title(ln) in by_title}
+            # Lines that don't echo a title are taken positionally, as the model listed them
+            if not notes:
+                notes = {r["id"]: ln for r, ln in zip(results, lines)}
+            plan["notes"] = notes
+        self._llm_cache.set((step, self._normalize_text(query), tuple(r["id"] for r in results)), plan)
+        return plan
+
+    def _llm_future(self, step: str, query: str, results: List[Dict]) -> Future:
+        key = (step, self._normalize_text(query), tuple(r["id"] for r in results))
+        plan = self._llm_cache.get(key)
+        if plan is not None:
+            fut: Future = Future()
+            fut.set_result(plan)
+            return fut
+        # Identical (query, candidates) already in flight share that call
+        return self._llm_flight.submit(_get_llm_pool(), key, lambda: self._llm_step(step, query, results))
+
+    @staticmethod
+    def _apply(results: List[Dict], plan: Dict) -> List[Dict]:
+        by_id = {r["id"]: r for r in results}
+        order = [by_id[i] for i in plan.get("order", []) if i in by_id]
+        # Preserve any items not mentioned by LLM at the end
+        results = order + [r for r in results if r not in order]
+        for r in results:
+            note = plan.get("notes", {}).get(r["id"])
+            if note and not r.get("why"):
+                r["why"] = note
         return results
+
+    def _postprocess_many(self, queries: List[str], ranked: List[List[Dict]]):
+        """LLM re-rank + enrichment for every query at once, cached and coalesced.
+
+        RECOMMENDER_LLM_MODE "combined" asks for order and brand notes in one call; "parallel"
+        issues the two original calls side by side. Whatever hasn't answered within
+        RECOMMENDER_LLM_BUDGET_MS is skipped and the TF-IDF ordering returned as is; the call
+        keeps running and its answer lands in the cache for the next identical request."""
+        if not _online():
+            return ranked
+        steps = ["combined"] if settings.RECOMMENDER_LLM_MODE == "combined" else ["rerank", "enrich"]
+        pending = [[self._llm_future(step, q, res) for step in steps] if res else []
+                   for q, res in zip(queries, ranked)]
+        budget = settings.RECOMMENDER_LLM_BUDGET_MS / 1000.0
+        deadline = time.monotonic() + budget if budget > 0 else None
+        out = []
+        for res, futures in zip(ranked, pending):
+            plan: Dict = {}
+            for fut in futures:
+                try:
+                    plan.update(fut.result(None if deadline is None else max(0.0, deadline - time.monotonic())))
+                except Exception:
+                    pass  # over budget or failed: keep the TF-IDF result for this step
+            out.append(self._apply(res, plan) if plan else res)
+        return out
+
+    def _postprocess(self, query: str, results):
+        return self._postprocess_many([query], [results])[0]
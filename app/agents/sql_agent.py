@@ -1,36 +1,305 @@
 
+import logging
+import queue
+import re
 import sqlite3
 import os
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 from ..utils.config import settings
+from ..utils import metrics
+
+logger = logging.getLogger(__name__)
+
+class ReadPool:
+    """Read-only SQLite connections (mode=ro URIs) shared across threads, one query per
+    connection at a time. Connections are opened on demand up to `size`, then reused."""
+
+    def __init__(self, path: str, size: int = None, timeout: float = 30.0):
+        self.uri = f"{Path(path).resolve().as_uri()}?mode=ro"
+        self.size = size or settings.SQL_POOL_SIZE
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.uri, uri=True, check_same_thread=False,
+                              cached_statements=settings.SQL_STATEMENT_CACHE)
+        con.execute(f"PRAGMA mmap_size={int(settings.SQL_MMAP_SIZE)};")
+        con.execute(f"PRAGMA cache_size={-int(settings.SQL_CACHE_SIZE_KB)};")  # negative = KiB
+        con.execute("PRAGMA query_only=ON;")
+        return con
+
+    @contextmanager
+    def connection(self):
+        try:
+            con = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                grow = self._opened < self.size
+                if grow:
+                    self._opened += 1
+            if grow:
+                try:
+                    con = self._open()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                con = self._idle.get(timeout=self.timeout)
+        try:
+            yield con
+        finally:
+            if con.in_transaction:
+                con.rollback()
+            self._idle.put(con)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._opened = 0
+
+# Bump when the demo tables change; older databases are reseeded on the next start
+DEMO_SCHEMA_VERSION = 1
+DEMO_TABLES: Dict[str, Tuple[str, List[tuple]]] = {
+    "sales": (
+        "CREATE TABLE sales(id INTEGER, item VARCHAR, qty INTEGER, price FLOAT);",
+        [(1, "apple", 2, 1.2), (2, "pear", 5, 2.5), (3, "apple", 3, 1.2), (4, "banana", 10, 0.8),
+         (5, "orange", 7, 1.5), (6, "grape", 3, 2.8)],
+    ),
+    "employees": (
+        "CREATE TABLE employees(id INTEGER, name VARCHAR, department VARCHAR, salary FLOAT);",
+        [(1, "Alice Johnson", "IT", 75000), (2, "Bob Smith", "Marketing", 65000), (3, "Carol Davis", "IT", 80000),
+         (4, "David Wilson", "Sales", 60000), (5, "Eva Brown", "Marketing", 70000)],
+    ),
+    "products": (
+        "CREATE TABLE products(id INTEGER, name VARCHAR, category VARCHAR, stock INTEGER, price FLOAT);",
+        [(1, "Laptop", "Electronics", 50, 999.99), (2, "Mouse", "Electronics", 200, 25.50),
+         (3, "Notebook", "Stationery", 500, 3.99), (4, "Pen", "Stationery", 1000, 1.99),
+         (5, "Monitor", "Electronics", 75, 299.99)],
+    ),
+}
+# Columns the demo questions filter and group by
+DEMO_INDEXES: Dict[str, Tuple[str, ...]] = {
+    "sales": ("item",),
+    "employees": ("department",),
+    "products": ("category",),
+}
+
+class QueryInterrupted(sqlite3.OperationalError):
+    """The query ran past its time limit or was cancelled."""
+
+# String literals and quoted names are matched so comment markers inside them are kept
+_COMMENT_OR_QUOTED = re.compile(r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\]|--[^\n]*|/\*.*?(?:\*/|$)""", re.S)
+
+def _strip(sql: str) -> str:
+    """`sql` with comments and trailing semicolons removed, safe to wrap as a subquery."""
+    sql = _COMMENT_OR_QUOTED.sub(lambda m: " " if m.group(0)[0] in "-/" else m.group(0), sql)
+    return sql.strip().rstrip("; \t\r\n")
+
+class RowStream:
+    """One query's rows in batches of tuples that share a single `columns` header.
+
+    Holds a pooled connection until exhausted or closed (use it as a context manager).
+    A progress handler aborts the statement once `timeout` seconds have passed since
+    execution started or `cancel` is set; iteration stops quietly after `max_rows` rows
+    and sets `truncated`."""
+
+    PROGRESS_STEPS = 1000  # SQLite VM instructions between deadline/cancel checks
+
+    def __init__(self, pool: "ReadPool", sql: str, batch_size: int, max_rows: Optional[int],
+                 timeout: Optional[float], cancel: Optional[threading.Event] = None):
+        self.batch_size = batch_size
+        self.max_rows = max_rows
+        self.rows = 0
+        self.truncated = False
+        self._stack = ExitStack()
+        self._con = self._stack.enter_context(pool.connection())
+        self._interrupted = None
+        deadline = time.monotonic() + timeout if timeout else None
+
+        def _check():
+            if cancel is not None and cancel.is_set():
+                self._interrupted = "cancelled"
+            elif deadline is not None and time.monotonic() > deadline:
+                self._interrupted = f"exceeded the {timeout:g}s time limit"
+            return 1 if self._interrupted else 0
+
+        self._con.set_progress_handler(_check, self.PROGRESS_STEPS)
+        self._stack.callback(self._con.set_progress_handler, None, 0)
+        try:
+            self._cursor = self._call(self._con.execute, sql)
+        except BaseException:
+            self.close()
+            raise
+        self.columns: List[str] = [d[0] for d in self._cursor.description or ()]
+
+    def _call(self, fn, *args):
+        try:
+            return fn(*args)
+        except sqlite3.OperationalError as e:
+            if self._interrupted:
+                raise QueryInterrupted(f"query {self._interrupted}") from e
+            raise
+
+    def __iter__(self) -> Iterator[List[tuple]]:
+        try:
+            while True:
+                n = self.batch_size
+                if self.max_rows is not None:
+                    n = min(n, self.max_rows - self.rows)
+                    if n <= 0:
+                        # Probe one more row to tell "exactly max_rows" from "cut off"
+                        self.truncated = self._call(self._cursor.fetchone) is not None
+                        return
+                batch = self._call(self._cursor.fetchmany, n)
+                if not batch:
+                    return
+                self.rows += len(batch)
+                yield batch
+        finally:
+            self.close()
+
+    def iter_columnar(self) -> Iterator[Dict[str, tuple]]:
+        """The same batches, column-major: {column: (values...)}."""
+        for batch in self:
+            yield dict(zip(self.columns, zip(*batch)))
+
+    def close(self):
+        self._stack.close()
+
+    def __del__(self):
+        # An abandoned stream still hands its connection back to the pool
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
 
 class SQLAgent:
     def __init__(self):
-        os.makedirs(os.path.dirname(settings.SQL_DB_PATH), exist_ok=True)
-        self.con = sqlite3.connect(settings.SQL_DB_PATH)
+        parent = os.path.dirname(settings.SQL_DB_PATH)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        # One writer connection for seeding; queries go through the read-only pool
+        self.con = sqlite3.connect(settings.SQL_DB_PATH, check_same_thread=False)
+        if settings.SQL_WAL:  # persistent: converts the file and adds -wal/-shm files beside it
+            self.con.execute("PRAGMA journal_mode=WAL;")
+        self.pool = ReadPool(settings.SQL_DB_PATH)
+
+    def schema_version(self) -> int:
+        return self.con.execute("PRAGMA user_version;").fetchone()[0]
+
+    def ensure_schema(self) -> bool:
+        """Seed the demo tables only if the database has no tables or holds an older demo schema.
+
+        Reads one header field when the schema is current, so restarts cost the same for any
+        database size. Any table that is not a demo table, or is named like one but defined
+        differently, marks the database as someone else's and it is never touched. Returns
+        True if it seeded."""
+        version = self.schema_version()
+        if version >= DEMO_SCHEMA_VERSION:
+            return False
+        tables = dict(self.con.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';"))
+        if any(name not in DEMO_TABLES or sql != DEMO_TABLES[name][0].rstrip(";")
+               for name, sql in tables.items()):
+            logger.info("%s is not a demo database; leaving it as is", settings.SQL_DB_PATH)
+            return False
+        self.seed_demo()
+        return True
 
     def seed_demo(self):
-        # Clear existing data and recreate tables
-        self.con.execute("DROP TABLE IF EXISTS sales;")
-        self.con.execute("DROP TABLE IF EXISTS employees;")
-        self.con.execute("DROP TABLE IF EXISTS products;")
-        
-        # Sales table
-        self.con.execute("CREATE TABLE sales(id INTEGER, item VARCHAR, qty INTEGER, price FLOAT);")
-        self.con.execute("INSERT INTO sales VALUES (1,'apple',2,1.2),(2,'pear',5,2.5),(3,'apple',3,1.2),(4,'banana',10,0.8),(5,'orange',7,1.5),(6,'grape',3,2.8);")
-        
-        # Employees table
-        self.con.execute("CREATE TABLE employees(id INTEGER, name VARCHAR, department VARCHAR, salary FLOAT);")
-        self.con.execute("INSERT INTO employees VALUES (1,'Alice Johnson','IT',75000),(2,'Bob Smith','Marketing',65000),(3,'Carol Davis','IT',80000),(4,'David Wilson','Sales',60000),(5,'Eva Brown','Marketing',70000);")
-        
-        # Products table
-        self.con.execute("CREATE TABLE products(id INTEGER, name VARCHAR, category VARCHAR, stock INTEGER, price FLOAT);")
-        self.con.execute("INSERT INTO products VALUES (1,'Laptop','Electronics',50,999.99),(2,'Mouse','Electronics',200,25.50),(3,'Notebook','Stationery',500,3.99),(4,'Pen','Stationery',1000,1.99),(5,'Monitor','Electronics',75,299.99);")
-        
-        # Commit all changes
-        self.con.commit()
-
-    def run(self, sql: str):
-        cursor = self.con.execute(sql)
-        columns = [description[0] for description in cursor.description]
-        rows = cursor.fetchall()
-        return [dict(zip(columns, row)) for row in rows]
+        """Recreate the demo tables from scratch and stamp the schema version."""
+        # One transaction: readers see the old tables or the new ones, never a mix
+        self.con.execute("BEGIN;")
+        try:
+            for table, (ddl, rows) in DEMO_TABLES.items():
+                self.con.execute(f"DROP TABLE IF EXISTS {table};")
+                self.con.execute(ddl)
+                self._load(table, rows, DEMO_INDEXES.get(table, ()))
+            self.con.execute(f"PRAGMA user_version={DEMO_SCHEMA_VERSION};")
+            self.con.commit()
+        except BaseException:
+            self.con.rollback()
+            raise
+
+    def bulk_load(self, table: str, rows: Iterable[Sequence], indexes: Sequence[str] = (),
+                  batch_size: int = None) -> int:
+        """Append rows to an existing table in one transaction, returning the count.
+
+        Indexes on `indexes` columns are dropped first and rebuilt once at the end, which
+        is far cheaper than updating them row by row."""
+        self.con.execute("BEGIN;")
+        try:
+            n = self._load(table, rows, indexes, batch_size)
+            self.con.commit()
+        except BaseException:
+            self.con.rollback()
+            raise
+        return n
+
+    def _load(self, table: str, rows: Iterable[Sequence], indexes: Sequence[str] = (),
+              batch_size: int = None) -> int:
+        batch_size = batch_size or settings.SQL_BULK_BATCH
+        for col in indexes:
+            self.con.execute(f"DROP INDEX IF EXISTS idx_{table}_{col};")
+        it = iter(rows)
+        n = 0
+        with metrics.span("sql_load"):
+            while True:
+                batch = list(islice(it, batch_size))
+                if not batch:
+                    break
+                marks = ",".join("?" * len(batch[0]))
+                self.con.executemany(f"INSERT INTO {table} VALUES ({marks});", batch)
+                n += len(batch)
+            for col in indexes:
+                self.con.execute(f"CREATE INDEX idx_{table}_{col} ON {table}({col});")
+        return n
+
+    def stream(self, sql: str, batch_size: int = None, max_rows: int = None, timeout: float = None,
+               cancel: threading.Event = None) -> RowStream:
+        """Execute `sql` on a pooled read-only connection and return its rows in batches.
+        Limits default to SQL_BATCH_SIZE / SQL_MAX_ROWS / SQL_TIMEOUT; 0 disables one."""
+        max_rows = settings.SQL_MAX_ROWS if max_rows is None else max_rows
+        timeout = settings.SQL_TIMEOUT if timeout is None else timeout
+        return RowStream(self.pool, sql, batch_size or settings.SQL_BATCH_SIZE,
+                         max_rows or None, timeout or None, cancel)
+
+    def count(self, sql: str, limit: int = None, timeout: float = None) -> int:
+        """Row count of `sql` without fetching its rows. With `limit`, counting stops early
+        and any result over the limit comes back as limit + 1."""
+        inner = _strip(sql)
+        if limit:
+            inner = f"SELECT 1 FROM ({inner}) LIMIT {int(limit) + 1}"
+        with metrics.span("sql"), self.stream(f"SELECT COUNT(*) FROM ({inner})", 1, 0, timeout) as rows:
+            return next(iter(rows))[0][0]
+
+    def preview(self, sql: str, n: int = None, count_limit: int = None) -> Tuple[List[Dict], int]:
+        """First `n` rows as dicts plus the total row count (capped as in count())."""
+        n = n or settings.SQL_PREVIEW_ROWS
+        with metrics.span("sql"), self.stream(sql, batch_size=n, max_rows=n) as rows:
+            head = [dict(zip(rows.columns, r)) for batch in rows for r in batch]
+            more = rows.truncated
+        total = self.count(sql, limit=count_limit or settings.SQL_MAX_ROWS) if more else len(head)
+        return head, total
+
+    def run(self, sql: str) -> List[Dict]:
+        """All rows as dicts, up to SQL_MAX_ROWS and within SQL_TIMEOUT. To learn whether
+        the limit cut the result short, read stream()'s `truncated` or use preview()."""
+        with metrics.span("sql"), self.stream(sql) as rows:
+            return [dict(zip(rows.columns, r)) for batch in rows for r in batch]
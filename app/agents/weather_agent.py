@@ -1,10 +1,149 @@
 
-class WeatherAgent:
-    def run(self, location: str):
+"""Current weather for a place named in a chat turn.
+
+The place is pulled out of the sentence ("what's the weather in Paris today?" -> "paris")
+and normalised, and that key fronts a TTL cache and a single-flight map: a burst of turns
+about the same city costs one provider call, and repeats within WEATHER_CACHE_TTL cost none.
+Providers are looked up by WEATHER_PROVIDER in PROVIDERS.
+"""
+
+import re
+from typing import Callable, Dict
+
+from ..utils.cache import SingleFlight, TTLCache
+from ..utils.config import settings
+
+# Common short forms, applied after normalisation
+LOCATION_ALIASES = {
+    "nyc": "new york", "ny": "new york", "sf": "san francisco", "la": "los angeles",
+    "kl": "kuala lumpur", "sg": "singapore", "hk": "hong kong",
+}
+
+_TIME = (r"(?:today|tonight|tomorrow(?: (?:morning|afternoon|evening|night))?|now|right now|currently|please|"
+         r"(?:this|next|the) (?:morning|afternoon|evening|week|weekend))")
+_PLACE_AFTER = re.compile(r"^.*\b(?:in|for|at|near|around)\s+(.+)$", re.IGNORECASE)  # greedy: the last one
+_WEATHER_WORDS = re.compile(
+    r"\b(?:what(?:'s| is)?|how(?:'s| is)?|is it|the|weather|temperature|forecast|current(?:ly)?|"
+    r"like|today|tonight|tomorrow|now|right now|this (?:morning|afternoon|evening|week|weekend)|please|tell me|me)\b",
+    re.IGNORECASE,
+)
+# A time phrase at the end, with the preposition that introduces it ("... for the weekend")
+_TRAILING = re.compile(rf"(?:^|\s+)(?:(?:in|for|at|on|over|during)\s+)?{_TIME}$", re.IGNORECASE)
+
+def _strip_times(text: str) -> str:
+    prev = None
+    while prev != text:
+        prev, text = text, _TRAILING.sub("", text.strip(" ,?!."))
+    return text
+
+def extract_location(text: str) -> str:
+    """The place a weather question is about, or the text minus weather words if none is
+    marked; "" when it names no place."""
+    text = _strip_times(text)
+    m = _PLACE_AFTER.match(text)
+    place = m.group(1) if m else _WEATHER_WORDS.sub(" ", text)
+    return _strip_times(place)
+
+def normalize_location(place: str) -> str:
+    """Cache key for a place: lower case, punctuation dropped, whitespace collapsed, aliases resolved."""
+    key = " ".join(re.sub(r"[^\w\s-]", " ", place.casefold()).split())
+    return LOCATION_ALIASES.get(key, key)
+
+# ---- providers ----------------------------------------------------------
+
+class StubProvider:
+    name = "stub"
+
+    def current(self, location: str) -> Dict:
         return {
-            "provider": "stub",
-            "location": location,
+            "provider": self.name,
+            "location": location.title(),
             "temp_c": 27.0,
             "summary": "Partly cloudy",
             "humidity": 0.68,
         }
+
+class WeatherUnavailable(RuntimeError):
+    """The provider could not be reached or gave an unusable answer. The message never
+    carries the request URL, whose query string holds the API key."""
+
+class WeatherAPIProvider:
+    """weatherapi.com current conditions over a pooled keep-alive session."""
+
+    name = "weatherapi"
+
+    def __init__(self, api_key: str = None, base_url: str = None, timeout: float = None):
+        self.api_key = api_key if api_key is not None else settings.WEATHER_API_KEY
+        if not self.api_key:
+            raise WeatherUnavailable("WEATHER_API_KEY is not set")
+        self.base_url = (base_url or settings.WEATHER_BASE_URL).rstrip("/")
+        self.timeout = timeout or settings.WEATHER_TIMEOUT
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self._request_error = requests.RequestException
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.MAX_CONCURRENT_WEATHER)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def current(self, location: str) -> Dict:
+        try:
+            r = self.session.get(f"{self.base_url}/current.json",
+                                 params={"key": self.api_key, "q": location, "aqi": "no"}, timeout=self.timeout)
+            r.raise_for_status()
+            d = r.json()
+            cur = d["current"]
+            temp_c = float(cur["temp_c"])
+        except self._request_error as e:
+            # requests puts the full URL, key included, into its messages: keep only the kind
+            status = getattr(e.response, "status_code", None)
+            raise WeatherUnavailable(f"{self.name}: HTTP {status}" if status else
+                                     f"{self.name}: {type(e).__name__}") from None
+        except (ValueError, KeyError, TypeError):
+            raise WeatherUnavailable(f"{self.name}: unexpected response") from None
+        return {
+            "provider": self.name,
+            "location": d.get("location", {}).get("name") or location.title(),
+            "temp_c": temp_c,
+            "summary": cur.get("condition", {}).get("text", ""),
+            "humidity": round(float(cur.get("humidity", 0)) / 100.0, 2),
+        }
+
+PROVIDERS: Dict[str, Callable[[], object]] = {
+    "stub": StubProvider,
+    "weatherapi": WeatherAPIProvider,
+}
+
+def get_provider(name: str = None):
+    name = name or settings.WEATHER_PROVIDER
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown WEATHER_PROVIDER {name!r}; expected one of {sorted(PROVIDERS)}")
+    return PROVIDERS[name]()
+
+# ---- agent --------------------------------------------------------------
+
+class WeatherAgent:
+    def __init__(self, provider=None, cache_size: int = None, ttl: float = None):
+        self.provider = provider or get_provider()
+        self.cache = TTLCache(maxsize=cache_size or settings.WEATHER_CACHE_SIZE,
+                              ttl=settings.WEATHER_CACHE_TTL if ttl is None else ttl)
+        self._flight = SingleFlight()
+        self.provider_calls = 0
+
+    def _fetch(self, key: str) -> Dict:
+        self.provider_calls += 1
+        d = self.provider.current(key)
+        self.cache.set(key, d)
+        return d
+
+    def run(self, location: str) -> Dict:
+        """Weather for `location`, which may be a bare place or a whole question about one."""
+        key = normalize_location(extract_location(location)) or normalize_location(settings.WEATHER_DEFAULT_LOCATION)
+        if not key:
+            raise ValueError("No location given")
+        d = self.cache.get(key)
+        if d is None:
+            d = self._flight.do(key, lambda: self._fetch(key), timeout=settings.WEATHER_TIMEOUT * 2)
+        return dict(d)
+
@@ -1,61 +1,210 @@
 
-from .memory import LimitedMemory
-from .utils.text import detect_intent, normalize
+import asyncio
+import contextvars
+import logging
+import queue
+import weakref
+from typing import TYPE_CHECKING, Dict, Iterator, Optional
+
+from .memory import LimitedMemory, SessionMemoryStore
+from .registry import AgentRegistry
+from .utils.text import detect_intent, is_read_query, normalize
 from .schemas import Turn, TurnResponse
-from .rag.retriever import Retriever
-from .rag.qa import compose_answer
-from .t2i.image_gen import ImageGenerator
-from .agents.weather_agent import WeatherAgent
-from .agents.sql_agent import SQLAgent
-from .agents.recommender_agent import RecommenderAgent
 from .utils.config import settings
+from .utils import metrics
+
+if TYPE_CHECKING:
+    from .t2i.jobs import ImageJob
+
+logger = logging.getLogger(__name__)
+
+# Which backend each intent waits on; ahandle bounds concurrency per backend
+BACKENDS = {"rag": "llm", "chat": "llm", "t2i": "t2i", "weather": "weather", "sql": "sql", "recommender": "recommender"}
+
+# Agent factories import their modules on first use, so startup only pays for what is asked
+def _make_retriever():
+    from .rag.retriever import Retriever
+    return Retriever(settings.INDEX_DIR, settings.MODEL_NAME)
+
+def _make_images():
+    from .t2i.image_gen import ImageGenerator
+    return ImageGenerator()
+
+def _make_weather():
+    from .agents.weather_agent import WeatherAgent
+    return WeatherAgent()
+
+def _make_sql():
+    from .agents.sql_agent import SQLAgent
+    sql=SQLAgent(); sql.ensure_schema()
+    return sql
+
+def _make_recommender():
+    from .agents.recommender_agent import RecommenderAgent
+    return RecommenderAgent()
 
 class Controller:
-    def __init__(self):
-        self.mem = LimitedMemory(max_turns=6)
-        self._retriever=None; self._img=ImageGenerator()
-        self._weather=WeatherAgent(); self._sql=SQLAgent(); self._sql.seed_demo()
-        self._rec=RecommenderAgent()
+    def __init__(self, warm_up: str = None):
+        self.sessions=SessionMemoryStore()
+        self.agents=AgentRegistry()
+        self.agents.register("retriever",_make_retriever)
+        self.agents.register("images",_make_images)
+        self.agents.register("image_jobs",self._make_image_jobs)
+        self.agents.register("weather",_make_weather)
+        self.agents.register("sql",_make_sql)
+        self.agents.register("recommender",_make_recommender)
+        # asyncio semaphores bind to the loop that first awaits them, so keep one set per loop
+        self._limits: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+        warm=settings.AGENT_WARMUP if warm_up is None else warm_up
+        if warm:
+            self.agents.warm_up(None if warm=="all" else [n.strip() for n in warm.split(",") if n.strip()])
+
+    def _make_image_jobs(self):
+        from .t2i.jobs import ImageJobQueue
+        return ImageJobQueue(self._img)
 
     @property
     def retriever(self):
-        if self._retriever is None:
-            self._retriever = Retriever("indices/vector", "sentence-transformers/all-MiniLM-L6-v2")
-        return self._retriever
+        return self.agents.get("retriever")
 
-    def handle(self, turn: Turn) -> TurnResponse:
+    @property
+    def _img(self):
+        return self.agents.get("images")
+
+    @property
+    def images(self):
+        return self.agents.get("image_jobs")
+
+    @property
+    def _weather(self):
+        return self.agents.get("weather")
+
+    @property
+    def _sql(self):
+        return self.agents.get("sql")
+
+    @property
+    def _rec(self):
+        return self.agents.get("recommender")
+
+    def memory(self, session_id: str = "default") -> LimitedMemory:
+        return self.sessions.get(session_id)
+
+    @property
+    def mem(self) -> LimitedMemory:
+        return self.memory()
+
+    def submit_image(self, subject: str, negative: str = None) -> "ImageJob":
+        """Queue an image for background generation; raises queue.Full when the queue is."""
+        prompt=self._img.build_prompt(subject=subject)
+        return self.images.submit(prompt, negative) if negative is not None else self.images.submit(prompt)
+
+    def image_status(self, job_id: str) -> Optional["ImageJob"]:
+        jobs=self.agents.peek("image_jobs")
+        return jobs.get(job_id) if jobs is not None else None
+
+    def _limit(self, backend: str) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        sems = self._limits.get(loop)
+        if sems is None:
+            sems = self._limits[loop] = {
+                "llm": asyncio.Semaphore(settings.MAX_CONCURRENT_LLM),
+                "t2i": asyncio.Semaphore(settings.MAX_CONCURRENT_T2I),
+                "weather": asyncio.Semaphore(settings.MAX_CONCURRENT_WEATHER),
+                "sql": asyncio.Semaphore(settings.MAX_CONCURRENT_SQL),
+                "recommender": asyncio.Semaphore(settings.MAX_CONCURRENT_RECOMMENDER),
+            }
+        return sems[backend]
+
+    def _route(self, turn: Turn):
         text = normalize(turn.user_text)
-        intent = detect_intent(text)
+        with metrics.span("intent"):
+            intent = detect_intent(text)
+        metrics.set_intent(intent)
+        return text, intent
+
+    @staticmethod
+    def _with_timings(resp: TurnResponse, timings) -> TurnResponse:
+        if timings is not None:
+            resp.metrics["timings_ms"] = {k: round(v, 3) for k, v in timings.items()}
+        return resp
+
+    def handle(self, turn: Turn) -> TurnResponse:
+        with metrics.turn() as timings:
+            text, intent = self._route(turn)
+            resp = self._dispatch(intent, text, self.memory(turn.session_id))
+        return self._with_timings(resp, timings)
+
+    async def ahandle(self, turn: Turn) -> TurnResponse:
+        """Async variant of handle: the LLM is awaited natively, blocking agents run in threads."""
+        with metrics.turn() as timings:
+            text, intent = self._route(turn)
+            resp = await self._adispatch(intent, text, self.memory(turn.session_id))
+        return self._with_timings(resp, timings)
+
+    async def _adispatch(self, intent: str, text: str, mem: LimitedMemory) -> TurnResponse:
+        backend = BACKENDS.get(intent)
+        if backend is None:
+            return self._dispatch(intent, text, mem)
+
+        async with self._limit(backend):
+            if intent in {"rag","chat"}:
+                from .rag.qa import acompose_answer
+                retriever = self.agents.peek("retriever") or await asyncio.to_thread(lambda: self.retriever)
+                ans,cits=await acompose_answer(text,retriever)
+                return self._rag_reply(text,ans,cits,mem)
+            return await asyncio.to_thread(self._dispatch, intent, text, mem)
+
+    def _rag_reply(self, text: str, ans: str, cits, mem: LimitedMemory) -> TurnResponse:
+        reply=ans+(f"\n📚 Sources: {', '.join(set(cits))}" if cits else "")
+        # Web fallback removed per request
+        mem.add(text,reply)
+        return TurnResponse(response_text=reply,citations=cits)
+
+    def _dispatch(self, intent: str, text: str, mem: LimitedMemory) -> TurnResponse:
+        if intent == "t2i" and settings.T2I_QUEUE:
+            try:
+                job=self.submit_image(text)
+            except queue.Full:
+                return TurnResponse(response_text="⏳ Too many images in progress; try again shortly.")
+            reply=f"🖼️ Image job {job.id} queued. Check it with /image {job.id}"
+            mem.add(text,reply)
+            return TurnResponse(response_text=reply,metrics={"job_id":job.id})
 
         if intent == "t2i":
             prompt=self._img.build_prompt(subject=text)
             path=self._img.generate(prompt)
             reply=f"🖼️ Generated image saved to: {path}"
-            self.mem.add(text,reply)
+            mem.add(text,reply)
             return TurnResponse(response_text=reply,image_path=path)
 
         if intent in {"rag","chat"}:
+            from .rag.qa import compose_answer
             ans,cits=compose_answer(text,self.retriever)
-            reply=ans+(f"\n📚 Sources: {', '.join(set(cits))}" if cits else "")
-            # Web fallback removed per request
-            self.mem.add(text,reply)
-            return TurnResponse(response_text=reply,citations=cits)
+            return self._rag_reply(text,ans,cits,mem)
 
         if intent=="weather":
-            d=self._weather.run(location=text)
+            try:
+                d=self._weather.run(location=text)
+            except ValueError:
+                return TurnResponse(response_text="🌤️ Which city? Try: weather in Singapore")
+            except Exception:
+                logger.warning("Weather lookup failed", exc_info=True)
+                return TurnResponse(response_text="⚠️ Weather is unavailable right now; try again later.")
             reply=f"🌤️ {d['location']}: {d['temp_c']}°C, {d['summary']} (humidity {d['humidity']})"
-            self.mem.add(text,reply)
+            mem.add(text,reply)
             return TurnResponse(response_text=reply,metrics=d)
 
         if intent=="sql":
-            if not text.lower().startswith("select"):
-                return TurnResponse(response_text="⚠️ Only SELECT queries allowed.")
+            if not is_read_query(text):
+                return TurnResponse(response_text="⚠️ Only SELECT (or WITH … SELECT) queries allowed.")
             try:
-                rows=self._sql.run(text)
-                reply=f"📊 Rows: {rows[:3]}... (total {len(rows)})"
+                rows,total=self._sql.preview(text)
+                shown=f"{settings.SQL_MAX_ROWS}+" if settings.SQL_MAX_ROWS and total>settings.SQL_MAX_ROWS else total
+                reply=f"📊 Rows: {rows}... (total {shown})"
             except Exception as e:
                 reply=f"SQL error: {e}"
-            self.mem.add(text,reply)
+            mem.add(text,reply)
             return TurnResponse(response_text=reply)
 
         if intent=="recommender":
@@ -65,9 +214,44 @@ class Controller:
                 return f"- {r['title']} (score {r['score']:.2f}){why}"
             lines=["🛍️ Recommended items:"]+[_fmt(r) for r in recs]
             reply="\n".join(lines)
-            self.mem.add(text,reply)
+            mem.add(text,reply)
             return TurnResponse(response_text=reply)
 
         fb="🤖 Ask about documents, images, weather, SQL, or recommendations."
-        self.mem.add(text,fb)
+        mem.add(text,fb)
         return TurnResponse(response_text=fb)
+
+    def handle_stream(self, turn: Turn) -> Iterator[str]:
+        """Yield the reply as it is produced: LLM tokens for rag/chat, the whole reply otherwise."""
+        # The generator's turn lives in its own context, so the caller's context is untouched
+        # between pieces and the turn still closes cleanly if the caller stops early
+        ctx=contextvars.copy_context()
+        gen=self._stream(turn)
+        try:
+            while True:
+                try:
+                    piece=ctx.run(next,gen)
+                except StopIteration:
+                    return
+                yield piece
+        finally:
+            ctx.run(gen.close)
+
+    def _stream(self, turn: Turn) -> Iterator[str]:
+        with metrics.turn():
+            text, intent = self._route(turn)
+            mem=self.memory(turn.session_id)
+            if intent not in {"rag","chat"}:
+                yield self._dispatch(intent, text, mem).response_text
+                return
+
+            from .rag.qa import stream_answer
+            tokens,cits=stream_answer(text,self.retriever)
+            parts=[]
+            for tok in tokens:
+                parts.append(tok)
+                yield tok
+            sources=f"\n📚 Sources: {', '.join(set(cits))}" if cits else ""
+            if sources:
+                yield sources
+            mem.add(text,"".join(parts).strip()+sources)
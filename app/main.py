@@ -11,6 +11,7 @@ if project_root not in sys.path:
 try:
     from app.controller import Controller
     from app.schemas import Turn
+    from app.t2i.jobs import describe
 except ImportError as e:
     print(f"Import error: {e}")
     print("Make sure you're running this from the project root directory.")
@@ -24,10 +25,13 @@ def main():
         while True:
             user=input("🧑 You: ").strip()
             if not user: continue
-            result=ctrl.handle(Turn(user_text=user))
-            print("\n🤖 Assistant:\n", result.response_text)
-            if result.image_path:
-                print(f"[🖼️ Image saved at: {result.image_path}]\n")
+            if user.startswith("/image"):
+                print(describe(ctrl.image_status(user[len("/image"):].strip())))
+                continue
+            print("\n🤖 Assistant:\n", end=" ", flush=True)
+            for piece in ctrl.handle_stream(Turn(user_text=user)):
+                print(piece, end="", flush=True)
+            print()
     except KeyboardInterrupt:
         print("\n👋 Goodbye!")
 
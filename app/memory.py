@@ -1,20 +1,233 @@
 
-from collections import deque
-from typing import List, Tuple
+"""Conversation memory: a short window of turns per session, and the store holding sessions.
+
+Each turn is rendered and measured once, when it is added, and the prompt built from them
+is cached until the next turn, so to_prompt() is free between turns. Turns that leave the
+window, or don't fit the token budget, survive as one-line snippets in an "Earlier" summary.
+SessionMemoryStore keeps at most MEMORY_MAX_SESSIONS sessions in process, least recently
+used first out, drops those idle past MEMORY_IDLE_TTL, and can spill evicted sessions to
+SQLite (MEMORY_SPILL_PATH) to be picked up again on their next turn.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+from .utils.config import settings
+
+SNIPPET_WORDS = 12
+
+def approx_tokens(text: str) -> int:
+    """Rough token count (about four characters each); good enough for budgeting."""
+    return len(text) // 4 + 1
+
+def _snippet(user: str) -> str:
+    words = user.split()
+    return " ".join(words[:SNIPPET_WORDS]) + ("…" if len(words) > SNIPPET_WORDS else "")
 
 class LimitedMemory:
-    def __init__(self, max_turns: int = 6):
+    __slots__ = ("buf", "summary", "count", "_prompt", "_prompt_budget", "_lock")
+
+    def __init__(self, max_turns: int = 6, summary_turns: int = None):
+        # (user, assistant, rendered, tokens) per turn, newest last
         self.buf = deque(maxlen=max_turns)
+        self.summary = deque(maxlen=summary_turns or settings.MEMORY_SUMMARY_TURNS)
+        self.count = 0
+        self._prompt: Optional[str] = None
+        self._prompt_budget = None
+        self._lock = threading.Lock()
 
     def add(self, user: str, assistant: str):
-        self.buf.append((user, assistant))
+        limit = settings.MEMORY_MESSAGE_CHARS
+        if limit:
+            user, assistant = user[:limit], assistant[:limit]
+        with self._lock:
+            if len(self.buf) == self.buf.maxlen:
+                self.summary.append(_snippet(self.buf[0][0]))
+            self.count += 1
+            n = self.count
+            rendered = f"User {n}: {user}\nAssistant {n}: {assistant}"
+            self.buf.append((user, assistant, rendered, approx_tokens(rendered)))
+            self._prompt = None
 
     def context(self) -> List[Tuple[str, str]]:
-        return list(self.buf)
-
-    def to_prompt(self) -> str:
-        lines = []
-        for i, (u, a) in enumerate(self.buf, 1):
-            lines.append(f"User {i}: {u}")
-            lines.append(f"Assistant {i}: {a}")
-        return "\n".join(lines[-10:])
+        return [(u, a) for u, a, _, _ in self.buf]
+
+    def to_prompt(self, max_tokens: int = None) -> str:
+        """Recent turns verbatim, newest kept first, within `max_tokens`; the rest summarised."""
+        budget = max_tokens or settings.MEMORY_PROMPT_TOKENS
+        with self._lock:
+            if self._prompt is not None and self._prompt_budget == budget:
+                return self._prompt
+            turns = list(self.buf)
+            kept: List[str] = []
+            used = 0
+            while turns and used + turns[-1][3] <= budget:
+                t = turns.pop()
+                kept.append(t[2])
+                used += t[3]
+            # Older turns, and any that didn't fit, become snippets; oldest dropped first
+            snippets = list(self.summary) + [_snippet(t[0]) for t in turns]
+            head = ""
+            while snippets:
+                head = "Earlier the user asked about: " + "; ".join(snippets)
+                if used + approx_tokens(head) <= budget:
+                    break
+                snippets.pop(0)
+                head = ""
+            kept.reverse()
+            self._prompt = "\n".join(([head] if head else []) + kept)
+            self._prompt_budget = budget
+            return self._prompt
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {"count": self.count, "turns": [[u, a] for u, a, _, _ in self.buf],
+                    "summary": list(self.summary)}
+
+    @classmethod
+    def from_dict(cls, d: Dict, max_turns: int = 6) -> "LimitedMemory":
+        mem = cls(max_turns=max_turns)
+        mem.summary.extend(d.get("summary", []))
+        mem.count = d.get("count", 0) - len(d.get("turns", []))
+        for u, a in d.get("turns", []):
+            mem.add(u, a)
+        return mem
+
+class SessionMemoryStore:
+    """Session id -> LimitedMemory, bounded in count and idle time, optionally spilled to SQLite.
+
+    A handler still holding a session's memory when it is evicted writes to a detached copy;
+    with the LRU policy that only happens to a session that was silent the longest.
+    `_lock` covers only the in-memory maps; SQLite is used under `_db_lock`, never while
+    `_lock` is held, so a spill or load doesn't stall turns for other sessions."""
+
+    def __init__(self, max_sessions: int = None, idle_ttl: float = None, spill_path: str = None,
+                 max_turns: int = None):
+        self.max_sessions = max_sessions or settings.MEMORY_MAX_SESSIONS
+        self.idle_ttl = settings.MEMORY_IDLE_TTL if idle_ttl is None else idle_ttl
+        self.max_turns = max_turns or settings.MEMORY_MAX_TURNS
+        self._sessions: "OrderedDict[str, Tuple[LimitedMemory, float]]" = OrderedDict()
+        self._spilling: Dict[str, LimitedMemory] = {}  # evicted, not yet written
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()  # taken before _lock when both are needed
+        self.con = None
+        path = settings.MEMORY_SPILL_PATH if spill_path is None else spill_path
+        if path:
+            parent = os.path.dirname(path)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            self.con = sqlite3.connect(path, check_same_thread=False)
+            self.con.execute("PRAGMA journal_mode=WAL;")
+            self.con.execute("PRAGMA synchronous=NORMAL;")
+            self.con.execute(
+                "CREATE TABLE IF NOT EXISTS sessions("
+                "id TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL);"
+            )
+            self.con.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions(updated);")
+            self.con.commit()
+        self._spills_since_prune = 0
+
+    def get(self, session_id: str = "default") -> LimitedMemory:
+        now = time.monotonic()
+        evicted = None
+        with self._lock:
+            mem = self._find(session_id)
+            if mem is None and self.con is None:
+                mem = LimitedMemory(max_turns=self.max_turns)
+            if mem is not None:
+                evicted = self._put(session_id, mem, now)
+        if mem is None:
+            # Not in memory: look in SQLite. Loads run one at a time, so two turns for the
+            # same session can't both miss and one of them start it afresh.
+            with self._db_lock:
+                with self._lock:
+                    mem = self._find(session_id)
+                if mem is None:
+                    mem = self._load(session_id) or LimitedMemory(max_turns=self.max_turns)
+                with self._lock:
+                    evicted = self._put(session_id, mem, now)
+        if evicted:
+            self._spill(evicted)
+        return mem
+
+    def _find(self, session_id: str) -> Optional[LimitedMemory]:
+        """The session's memory if it is in process, including one still being spilled;
+        called with the lock held."""
+        entry = self._sessions.get(session_id)
+        return entry[0] if entry is not None else self._spilling.get(session_id)
+
+    def _put(self, session_id: str, mem: LimitedMemory, now: float) -> List[Tuple[str, LimitedMemory]]:
+        self._sessions[session_id] = (mem, now)
+        self._sessions.move_to_end(session_id)
+        return self._evict(now)
+
+    def _evict(self, now: float) -> List[Tuple[str, LimitedMemory]]:
+        """Pop least recently used sessions while over the bound or idle, returning those to
+        spill; called with the lock held. Over the bound, 5% go at once so spills are
+        written in batches."""
+        out = []
+        limit = self.max_sessions - self.max_sessions // 20 if len(self._sessions) > self.max_sessions else None
+        while self._sessions:
+            sid, (mem, last) = next(iter(self._sessions.items()))
+            over = limit is not None and len(self._sessions) > limit
+            if not over and not (self.idle_ttl and now - last > self.idle_ttl):
+                break
+            self._sessions.popitem(last=False)
+            out.append((sid, mem))
+        if self.con is None:
+            return []
+        self._spilling.update(out)
+        return out
+
+    def _spill(self, sessions: List[Tuple[str, LimitedMemory]]):
+        now = time.time()
+        rows = [(sid, json.dumps(mem.to_dict()), now) for sid, mem in sessions if mem.count]
+        with self._db_lock:
+            if self.con is None:
+                return
+            self.con.executemany("INSERT OR REPLACE INTO sessions(id, data, updated) VALUES (?, ?, ?);", rows)
+            self._spills_since_prune += len(rows)
+            if self._spills_since_prune >= 1000 and settings.MEMORY_SPILL_TTL:
+                self.con.execute("DELETE FROM sessions WHERE updated < ?;", (now - settings.MEMORY_SPILL_TTL,))
+                self._spills_since_prune = 0
+            with self._lock:
+                revived = []
+                for sid, mem in sessions:
+                    if self._spilling.get(sid) is mem:
+                        del self._spilling[sid]
+                        if sid in self._sessions:  # picked up again while being written
+                            revived.append((sid,))
+            self.con.executemany("DELETE FROM sessions WHERE id = ?;", revived)
+            self.con.commit()
+
+    def _load(self, session_id: str) -> Optional[LimitedMemory]:
+        """Take a spilled session out of SQLite; called with the db lock held."""
+        row = self.con.execute("SELECT data FROM sessions WHERE id = ?;", (session_id,)).fetchone()
+        if row is None:
+            return None
+        # Back in memory, it is the only copy until it is evicted again
+        self.con.execute("DELETE FROM sessions WHERE id = ?;", (session_id,))
+        self.con.commit()
+        return LimitedMemory.from_dict(json.loads(row[0]), max_turns=self.max_turns)
+
+    def flush(self):
+        """Spill every in-memory session, e.g. before shutdown; no-op without a spill path."""
+        with self._lock:
+            sessions = [(sid, mem) for sid, (mem, _) in self._sessions.items()]
+        if self.con is not None and sessions:
+            self._spill(sessions)
+
+    def close(self):
+        self.flush()
+        with self._db_lock:
+            if self.con is not None:
+                self.con.close()
+                self.con = None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
@@ -0,0 +1,64 @@
+
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from ..utils.cache import TTLCache
+from ..utils.config import settings
+from .embed_cache import cache_key
+
+class AnswerCache:
+    """Answers keyed by query embedding: exact text hits, or a near neighbour above `threshold`.
+    Without a vector (vec=None, e.g. lexical-only retrieval) only exact text hits are served.
+
+    Entries belong to one index version; when the retriever's manifest changes the whole
+    cache is dropped, since any cached answer may cite stale context.
+    """
+
+    def __init__(self, maxsize: int = None, ttl: float = None, threshold: float = None):
+        self.entries = TTLCache(
+            maxsize=maxsize or settings.ANSWER_CACHE_SIZE,
+            ttl=ttl if ttl is not None else settings.ANSWER_CACHE_TTL,
+        )
+        self.threshold = threshold if threshold is not None else settings.ANSWER_CACHE_THRESHOLD
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _check_version(self, version: str):
+        with self._lock:
+            if version != self._version:
+                self.entries.clear()
+                self._version = version
+
+    @staticmethod
+    def _unit(vec) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32)
+        n = float(np.linalg.norm(v))
+        return v / n if n else v
+
+    def get(self, query: str, vec, version: str) -> Optional[Tuple[str, List[str]]]:
+        self._check_version(version)
+        key = cache_key(version, query)
+        hit = self.entries.get(key)
+        if hit is not None:
+            return hit[1], list(hit[2])
+
+        if vec is None:
+            return None
+        live = [(k, v) for k, v in self.entries.items() if v[0] is not None]
+        if not live:
+            return None
+        mat = np.vstack([v[0] for _, v in live])
+        sims = mat @ self._unit(vec)
+        best = int(np.argmax(sims))
+        if sims[best] < self.threshold:
+            return None
+        best_key, (_, answer, citations) = live[best]
+        self.entries.get(best_key)  # refresh recency of the neighbour we served
+        return answer, list(citations)
+
+    def put(self, query: str, vec, version: str, answer: str, citations: List[str]):
+        self._check_version(version)
+        unit = self._unit(vec) if vec is not None else None
+        self.entries.set(cache_key(version, query), (unit, answer, tuple(citations)))
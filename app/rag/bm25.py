@@ -0,0 +1,97 @@
+
+import heapq
+import math
+import pickle
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from how in is it of on or that the this to was what when where which who why with".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+class BM25Index:
+    """Okapi BM25 over an inverted index that supports adding and removing single chunks."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}   # term -> {chunk id: term frequency}
+        self.doc_terms: Dict[str, Dict[str, int]] = {}  # chunk id -> its term frequencies
+        self.doc_len: Dict[str, int] = {}
+        self.total_len = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+
+    def add(self, doc_id: str, text: str):
+        if doc_id in self.doc_terms:
+            self.remove(doc_id)
+        tf = Counter(tokenize(text))
+        self.doc_terms[doc_id] = dict(tf)
+        self.doc_len[doc_id] = sum(tf.values())
+        self.total_len += self.doc_len[doc_id]
+        for term, n in tf.items():
+            self.postings.setdefault(term, {})[doc_id] = n
+
+    def remove(self, doc_id: str):
+        tf = self.doc_terms.pop(doc_id, None)
+        if tf is None:
+            return
+        self.total_len -= self.doc_len.pop(doc_id)
+        for term in tf:
+            plist = self.postings.get(term)
+            if plist is None:
+                continue
+            plist.pop(doc_id, None)
+            if not plist:
+                del self.postings[term]
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[str, float]]:
+        n_docs = len(self.doc_terms)
+        if not n_docs:
+            return []
+        avgdl = self.total_len / n_docs or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = math.log(1 + (n_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+            for doc_id, tf in plist.items():
+                denom = tf + self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / denom
+        return heapq.nlargest(k, scores.items(), key=lambda kv: kv[1])
+
+    def save(self, path: Path):
+        tmp = Path(path).with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump({"k1": self.k1, "b": self.b, "doc_terms": self.doc_terms}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "BM25Index":
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        idx = cls(k1=state["k1"], b=state["b"])
+        # Postings are derived data; rebuilding them keeps the file at one copy of each tf table
+        for doc_id, tf in state["doc_terms"].items():
+            idx.doc_terms[doc_id] = tf
+            idx.doc_len[doc_id] = sum(tf.values())
+            idx.total_len += idx.doc_len[doc_id]
+            for term, n in tf.items():
+                idx.postings.setdefault(term, {})[doc_id] = n
+        return idx
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists by sum(1 / (k + rank)); robust to the lists' incomparable score scales."""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda kv: kv[1], reverse=True)
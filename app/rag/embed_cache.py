@@ -0,0 +1,166 @@
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from typing import Dict, Iterable, List
+
+from langchain_core.embeddings import Embeddings
+
+from ..utils.cache import TTLCache
+from ..utils.config import settings
+from ..utils import metrics
+
+def normalize_text(text: str) -> str:
+    t = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", t).strip()
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+TOUCH_BATCH = 256  # memory hits collected before their last_used is written
+
+class EmbeddingCache:
+    """Content-addressed float32 vectors in SQLite, with an in-process LRU in front."""
+
+    def __init__(self, path: str = None, max_entries: int = None, memory_entries: int = None):
+        self.path = path or settings.EMBED_CACHE_PATH
+        self.max_entries = settings.EMBED_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.memory = TTLCache(maxsize=settings.EMBED_CACHE_MEMORY_ENTRIES if memory_entries is None else memory_entries)
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self._lock = threading.Lock()
+        self.con = sqlite3.connect(self.path, check_same_thread=False)
+        self.con.execute("PRAGMA journal_mode=WAL;")
+        self.con.execute("PRAGMA synchronous=NORMAL;")
+        self.con.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings("
+            "key TEXT PRIMARY KEY, vec BLOB NOT NULL, last_used REAL NOT NULL);"
+        )
+        self.con.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used);")
+        self.con.commit()
+        self._writes_since_evict = 0
+        # Keys served from memory since last_used was last written; flushed in batches so
+        # the hottest vectors don't look cold to _evict
+        self._touched: Dict[str, None] = {}
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        cold: List[str] = []
+        for k in keys:
+            vec = self.memory.get(k)
+            if vec is None:
+                cold.append(k)
+            else:
+                found[k] = vec
+        if not cold:
+            if found:
+                with self._lock:
+                    self._touched.update(dict.fromkeys(found))
+                    if len(self._touched) >= TOUCH_BATCH:
+                        self._flush_touched(time.time())
+                        self.con.commit()
+            return found
+
+        now = time.time()
+        with self._lock:
+            self._touched.update(dict.fromkeys(found))
+            self._flush_touched(now)
+            for start in range(0, len(cold), 500):
+                part = cold[start:start + 500]
+                marks = ",".join("?" * len(part))
+                rows = self.con.execute(
+                    f"SELECT key, vec FROM embeddings WHERE key IN ({marks});", part
+                ).fetchall()
+                for k, blob in rows:
+                    vec = array("f")
+                    vec.frombytes(blob)
+                    found[k] = vec.tolist()
+                    self.memory.set(k, found[k])
+                if rows:
+                    self.con.executemany(
+                        "UPDATE embeddings SET last_used=? WHERE key=?;", [(now, k) for k, _ in rows]
+                    )
+            self.con.commit()
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        if not items:
+            return
+        now = time.time()
+        for k, vec in items.items():
+            self.memory.set(k, list(vec))
+        with self._lock:
+            self.con.executemany(
+                "INSERT OR REPLACE INTO embeddings(key, vec, last_used) VALUES (?, ?, ?);",
+                [(k, array("f", vec).tobytes(), now) for k, vec in items.items()],
+            )
+            self._writes_since_evict += len(items)
+            # Counting rows is a full scan; only check the bound every few hundred writes
+            if self._writes_since_evict >= 256:
+                self._evict()
+            self.con.commit()
+
+    def _flush_touched(self, now: float):
+        """Write last_used for memory hits; called with the lock held, caller commits."""
+        if self._touched:
+            self.con.executemany("UPDATE embeddings SET last_used=? WHERE key=?;",
+                                 [(now, k) for k in self._touched])
+            self._touched.clear()
+
+    def _evict(self):
+        self._writes_since_evict = 0
+        self._flush_touched(time.time())
+        (count,) = self.con.execute("SELECT COUNT(*) FROM embeddings;").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self.con.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?);",
+                (excess,),
+            )
+
+    def close(self):
+        with self._lock:
+            self._flush_touched(time.time())
+            self.con.commit()
+            self.con.close()
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an embeddings model so each (model, text) pair is embedded at most once."""
+
+    def __init__(self, inner: Embeddings, model_name: str, cache: EmbeddingCache = None):
+        self.inner = inner
+        self.model_name = model_name
+        self.cache = cache or EmbeddingCache()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [cache_key(self.model_name, t) for t in texts]
+        found = self.cache.get_many(set(keys))
+        # Embed each distinct missing text once, even if it repeats within the batch
+        missing: Dict[str, str] = {}
+        for k, t in zip(keys, texts):
+            if k not in found and k not in missing:
+                missing[k] = t
+        if missing:
+            with metrics.span("embed"):
+                vecs = self.inner.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vecs))
+            self.cache.put_many(fresh)
+            found.update(fresh)
+        return [found[k] for k in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        k = cache_key(self.model_name, text)
+        found = self.cache.get_many([k])
+        if k in found:
+            return found[k]
+        with metrics.span("embed"):
+            vec = self.inner.embed_query(text)
+        self.cache.put_many({k: vec})
+        return vec
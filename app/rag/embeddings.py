@@ -0,0 +1,85 @@
+
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from ..utils.batching import MicroBatcher
+from ..utils.config import settings
+
+class LocalEmbeddings(Embeddings):
+    """sentence-transformers model run in-process on CPU; no network after the weights are cached."""
+
+    def __init__(self, model_name: str, batch_size: int = 32, threads: int = 0,
+                 local_files_only: bool = False):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if threads > 0:
+            torch.set_num_threads(threads)
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name, device="cpu", local_files_only=local_files_only)
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        vecs = self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
+        return vecs.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0]
+
+class BatchingEmbeddings(Embeddings):
+    """Coalesces concurrent embed_query calls into one embed_documents request."""
+
+    def __init__(self, inner: Embeddings, window_ms: float, max_batch: int = 64):
+        self.inner = inner
+        self.batcher = MicroBatcher(inner.embed_documents, max_batch=max_batch,
+                                    window_ms=window_ms, name="embed-batcher")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.batcher.submit(text)
+
+def embeddings_model_id(model_name: str = None, backend: str = None) -> str:
+    """Stable identifier of the vectors a backend produces, for cache keys and index manifests."""
+    backend = backend or settings.EMBEDDINGS_BACKEND
+    if backend == "openai":
+        return f"openai:{settings.OPENAI_EMBEDDINGS_MODEL}"
+    if backend == "local":
+        return f"local:{model_name or settings.MODEL_NAME}"
+    if backend == "stub":
+        return "stub:hashed-256"
+    raise ValueError(f"Unknown embeddings backend: {backend}")
+
+def load_embeddings(model_name: str = None, backend: str = None) -> Embeddings:
+    backend = backend or settings.EMBEDDINGS_BACKEND
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        emb = OpenAIEmbeddings(model=settings.OPENAI_EMBEDDINGS_MODEL)
+    elif backend == "local":
+        emb = LocalEmbeddings(
+            model_name or settings.MODEL_NAME,
+            batch_size=settings.EMBEDDINGS_BATCH_SIZE,
+            threads=settings.EMBEDDINGS_THREADS,
+            local_files_only=settings.EMBEDDINGS_LOCAL_ONLY,
+        )
+    elif backend == "stub":
+        from .stubs import StubEmbeddings
+        emb = StubEmbeddings()
+    else:
+        raise ValueError(f"Unknown embeddings backend: {backend}")
+    if settings.EMBEDDINGS_BATCH_WINDOW_MS > 0:
+        emb = BatchingEmbeddings(emb, settings.EMBEDDINGS_BATCH_WINDOW_MS)
+    return emb
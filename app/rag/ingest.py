@@ -0,0 +1,115 @@
+
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from ..utils import metrics
+
+# (source file name, chunk id, chunk text)
+Chunk = Tuple[str, str, str]
+
+@dataclass
+class IngestStats:
+    files: int = 0
+    chunks: int = 0
+    chars: int = 0
+    batches: int = 0
+    in_flight: int = 0
+    failed: List[str] = field(default_factory=list)  # names of files that could not be read
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def chunks_per_sec(self) -> float:
+        return self.chunks / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            "files": self.files,
+            "chunks": self.chunks,
+            "chars": self.chars,
+            "batches": self.batches,
+            "failed": len(self.failed),
+            "elapsed_s": round(self.elapsed, 3),
+            "chunks_per_sec": round(self.chunks_per_sec, 1),
+        }
+
+def iter_files(docs_dir: str, names: Optional[Iterable[str]] = None) -> Iterator[Path]:
+    """Walk the docs directory lazily; restrict to `names` when only some files changed."""
+    root = Path(docs_dir)
+    if names is not None:
+        for name in names:
+            yield root / name
+        return
+    if root.exists():
+        yield from sorted(root.glob("*.txt"))
+
+def iter_chunks(paths: Iterable[Path], splitter, stats: IngestStats) -> Iterator[Chunk]:
+    # Only one file's text is alive at a time
+    for file_path in paths:
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read().strip()
+        except Exception as e:
+            print(f"Error loading {file_path}: {e}")
+            stats.failed.append(file_path.name)
+            continue
+        stats.files += 1
+        if not content:
+            continue
+        for i, ch in enumerate(splitter.split_text(content)):
+            stats.chars += len(ch)
+            yield file_path.name, f"{file_path.name}:{i}", ch
+
+def iter_batches(chunks: Iterable[Chunk], size: int) -> Iterator[List[Chunk]]:
+    batch: List[Chunk] = []
+    for ch in chunks:
+        batch.append(ch)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def embed_batches(batches: Iterable[List[Chunk]], embeddings, stats: IngestStats,
+                  workers: int = 4, max_in_flight: int = 8) -> Iterator[Tuple[List[Chunk], List[List[float]]]]:
+    """Embed batches concurrently, yielding results in input order.
+
+    At most `max_in_flight` batches are submitted and not yet consumed; upstream
+    generators are not pulled until the oldest one is handed downstream, so memory
+    stays bounded no matter how large the corpus is.
+    """
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="embed") as pool:
+        for batch in batches:
+            pending.append((batch, metrics.submit(pool, embeddings.embed_documents, [c[2] for c in batch])))
+            stats.in_flight = len(pending)
+            if len(pending) >= max_in_flight:
+                done, fut = pending.popleft()
+                yield done, fut.result()
+        while pending:
+            done, fut = pending.popleft()
+            stats.in_flight = len(pending)
+            yield done, fut.result()
+
+def ingest(paths: Iterable[Path], splitter, embeddings, sink: Callable[[List[Chunk], List[List[float]]], None],
+           batch_size: int = 64, workers: int = 4, max_in_flight: int = 8,
+           on_progress: Optional[Callable[[IngestStats], None]] = None) -> IngestStats:
+    """file walk -> read -> split -> batch -> concurrent embed -> sink(batch, vectors)"""
+    stats = IngestStats()
+    chunks = iter_chunks(paths, splitter, stats)
+    for batch, vectors in embed_batches(iter_batches(chunks, batch_size), embeddings, stats,
+                                        workers=workers, max_in_flight=max_in_flight):
+        sink(batch, vectors)
+        stats.chunks += len(batch)
+        stats.batches += 1
+        if on_progress is not None:
+            on_progress(stats)
+    stats.in_flight = 0
+    return stats
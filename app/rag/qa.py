@@ -1,26 +1,133 @@
 
-from langchain_openai import ChatOpenAI
+import asyncio
+import threading
+from typing import Iterator, List, Tuple
+
 from ..utils.config import settings
+from ..utils import metrics
+from .answer_cache import AnswerCache
 
-def compose_answer(query: str, retriever):
-    ctx = retriever.search(query, k=4)
-    if not ctx:
-        return "No relevant context found.", []
+_answer_cache = AnswerCache() if settings.ANSWER_CACHE_ENABLED else None
+
+_llm = None
+_llm_lock = threading.Lock()
+
+SYSTEM_PROMPT = (
+    "You are a helpful assistant that answers questions using the provided context. "
+    "Always cite sources like [1], [2]. If not mentioned, say so."
+)
+
+def get_llm():
+    """One chat client per process, so every turn reuses its pooled keep-alive connections."""
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None and settings.LLM_BACKEND == "stub":
+                from .stubs import StubChatModel
+                _llm = StubChatModel()
+            if _llm is None:
+                import httpx
+                from langchain_openai import ChatOpenAI
+
+                limits = httpx.Limits(
+                    max_connections=settings.LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+                    keepalive_expiry=60.0,
+                )
+                _llm = ChatOpenAI(
+                    model=settings.OPENAI_MODEL,
+                    temperature=0.3,
+                    timeout=settings.LLM_TIMEOUT,
+                    http_client=httpx.Client(limits=limits, timeout=settings.LLM_TIMEOUT),
+                    http_async_client=httpx.AsyncClient(limits=limits, timeout=settings.LLM_TIMEOUT),
+                )
+    return _llm
+
+def _messages(query: str, ctx: List[dict]):
     context_text = "\n\n".join(
         [f"[{i+1}] {c['meta']['source']}:\n{c['text']}" for i, c in enumerate(ctx)]
     )
-    citations = [c["meta"]["source"] for c in ctx]
-    llm = ChatOpenAI(model=settings.OPENAI_MODEL, temperature=0.3)
-    system_prompt = (
-        "You are a helpful assistant that answers questions using the provided context. "
-        "Always cite sources like [1], [2]. If not mentioned, say so."
-    )
-    messages = [
-        ("system", system_prompt),
+    return [
+        ("system", SYSTEM_PROMPT),
         ("user", f"Question: {query}\n\nContext:\n{context_text}\n\nAnswer:"),
     ]
+
+def _cached(query: str, retriever, cache: AnswerCache):
+    if cache is None:
+        return None, None
+    if settings.RETRIEVAL_MODE == "lexical":
+        # No dense search to share an embedding with: exact repeats only
+        return None, cache.get(query, None, retriever.version)
+    # Same cached embedding the retriever's dense search uses, so this costs no extra call
+    qvec = retriever.embeddings.embed_query(query)
+    return qvec, cache.get(query, qvec, retriever.version)
+
+def compose_answer(query: str, retriever, cache: AnswerCache = None):
+    cache = cache or _answer_cache
+    qvec, hit = _cached(query, retriever, cache)
+    if hit is not None:
+        return hit
+
+    ctx = retriever.search(query, k=4)
+    if not ctx:
+        return "No relevant context found.", []
+    citations = [c["meta"]["source"] for c in ctx]
+    try:
+        with metrics.span("llm"):
+            ans = get_llm().invoke(_messages(query, ctx)).content.strip()
+    except Exception as e:
+        return f"OpenAI API error: {e}", citations
+    if cache is not None:
+        cache.put(query, qvec, retriever.version, ans, citations)
+    return ans, citations
+
+async def acompose_answer(query: str, retriever, cache: AnswerCache = None):
+    """compose_answer for event loops: retrieval runs in a thread, the LLM call is awaited."""
+    cache = cache or _answer_cache
+    qvec, hit = await asyncio.to_thread(_cached, query, retriever, cache)
+    if hit is not None:
+        return hit
+
+    ctx = await asyncio.to_thread(retriever.search, query, 4)
+    if not ctx:
+        return "No relevant context found.", []
+    citations = [c["meta"]["source"] for c in ctx]
     try:
-        ans = llm.invoke(messages).content.strip()
+        with metrics.span("llm"):
+            ans = (await get_llm().ainvoke(_messages(query, ctx))).content.strip()
     except Exception as e:
-        ans = f"OpenAI API error: {e}"
+        return f"OpenAI API error: {e}", citations
+    if cache is not None:
+        cache.put(query, qvec, retriever.version, ans, citations)
     return ans, citations
+
+def stream_answer(query: str, retriever, cache: AnswerCache = None) -> Tuple[Iterator[str], List[str]]:
+    """Like compose_answer, but returns (token iterator, citations) as soon as retrieval is done.
+
+    The LLM call starts when the iterator is first advanced; the full answer is cached
+    once the stream has been consumed to the end.
+    """
+    cache = cache or _answer_cache
+    qvec, hit = _cached(query, retriever, cache)
+    if hit is not None:
+        return iter([hit[0]]), hit[1]
+
+    ctx = retriever.search(query, k=4)
+    if not ctx:
+        return iter(["No relevant context found."]), []
+    citations = [c["meta"]["source"] for c in ctx]
+
+    def tokens() -> Iterator[str]:
+        parts: List[str] = []
+        try:
+            for chunk in get_llm().stream(_messages(query, ctx)):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield chunk.content
+        except Exception as e:
+            yield f"OpenAI API error: {e}"
+            return
+        if cache is not None:
+            cache.put(query, qvec, retriever.version, "".join(parts).strip(), citations)
+
+    return tokens(), citations
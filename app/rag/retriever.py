@@ -1,67 +1,286 @@
 
+import hashlib
+import json
 import os
+import pickle
 from pathlib import Path
-import re
 from typing import List, Dict, Any
 
+import numpy as np
 from langchain_community.vectorstores import FAISS
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
 from ..utils.config import settings
+from ..utils import metrics
+from .bm25 import BM25Index, reciprocal_rank_fusion
+from .embed_cache import CachedEmbeddings
+from .embeddings import embeddings_model_id, load_embeddings
+from .ingest import IngestStats, ingest, iter_files
+
+MANIFEST_VERSION = 2
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 100
 
 class Retriever:
     def __init__(self, index_dir: str, model_name: str):
-        self.docs_dir = "data/docs"
-        self._load_documents()
-        self._build_index()
-    
-    def _load_documents(self):
-        """Load all text documents from the docs directory"""
-        self.documents = []
+        self.docs_dir = settings.DOCS_DIR
+        self.index_dir = Path(index_dir or settings.INDEX_DIR)
+        self.model_name = model_name
+        self.embeddings_model = embeddings_model_id(model_name)
+        # Chunks and queries share one content-addressed cache, so repeats never hit the backend
+        self.embeddings = CachedEmbeddings(load_embeddings(model_name), self.embeddings_model)
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+        self.vs = None
+        self.bm25 = BM25Index()
+        self._positions = None  # docstore id -> FAISS row, built on first pre-filtered search
+        self.manifest: Dict[str, Any] = {}
+        self.version = ""  # _digest() of the manifest, refreshed by sync()
+        self.last_ingest = IngestStats()
+        self.sync()
+
+    # ---- manifest -------------------------------------------------------
+
+    @property
+    def _manifest_path(self) -> Path:
+        return self.index_dir / "manifest.json"
+
+    def _new_manifest(self) -> Dict[str, Any]:
+        return {
+            "version": MANIFEST_VERSION,
+            "embeddings_model": self.embeddings_model,
+            "chunk_size": CHUNK_SIZE,
+            "chunk_overlap": CHUNK_OVERLAP,
+            "files": {},
+        }
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        fresh = self._new_manifest()
+        try:
+            with open(self._manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return fresh
+        # Any change to how chunks are produced or embedded invalidates every vector
+        for key in ("version", "embeddings_model", "chunk_size", "chunk_overlap"):
+            if manifest.get(key) != fresh[key]:
+                return fresh
+        return manifest
+
+    def _write_manifest(self):
+        tmp = self._manifest_path.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, self._manifest_path)
+
+    def _digest(self) -> str:
+        """Digest of the indexed file set; changes whenever the index content does."""
+        files = self.manifest.get("files", {})
+        payload = "\n".join(f"{name}:{files[name]['sha256']}" for name in sorted(files))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    # ---- documents ------------------------------------------------------
+
+    def _scan_documents(self) -> Dict[str, str]:
+        """Content hash of every text document in the docs directory, keyed by file name."""
+        hashes: Dict[str, str] = {}
         docs_path = Path(self.docs_dir)
-        
-        if docs_path.exists():
-            for file_path in docs_path.glob("*.txt"):
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read().strip()
-                        if content:
-                            self.documents.append({
-                                "text": content,
-                                "source": file_path.name,
-                                "file_path": str(file_path)
-                            })
-                except Exception as e:
-                    print(f"Error loading {file_path}: {e}")
-
-    def _build_index(self):
-        # Split into chunks
-        splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
-        chunks: List[Dict[str, Any]] = []
-        for d in self.documents:
-            for ch in splitter.split_text(d["text"]):
-                chunks.append({"text": ch, "source": d["source"]})
-
-        if not chunks:
-            self.vs = None
-            return
-
-        # Build FAISS with OpenAI embeddings
-        embeddings = OpenAIEmbeddings(model=settings.OPENAI_EMBEDDINGS_MODEL)
-        texts = [c["text"] for c in chunks]
-        metadatas = [{"source": c["source"]} for c in chunks]
-        self.vs = FAISS.from_texts(texts=texts, embedding=embeddings, metadatas=metadatas)
-    
-    def search(self, query: str, k: int = 4):
+        if not docs_path.exists():
+            return hashes
+        for file_path in sorted(docs_path.glob("*.txt")):
+            h = hashlib.sha256()
+            try:
+                with open(file_path, "rb") as f:
+                    for block in iter(lambda: f.read(1 << 20), b""):
+                        h.update(block)
+            except OSError as e:
+                print(f"Error loading {file_path}: {e}")
+                continue
+            hashes[file_path.name] = h.hexdigest()
+        return hashes
+
+    # ---- vector store ---------------------------------------------------
+
+    def _load_store(self, mmap: bool):
+        """Load the persisted FAISS store, memory-mapping the index when it will only be read."""
+        index_path = self.index_dir / "index.faiss"
+        if not index_path.exists():
+            return None
+        import faiss
+        index = None
+        if mmap:
+            try:
+                index = faiss.read_index(str(index_path), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except Exception:
+                index = None  # older faiss builds can't mmap flat indexes
+        if index is None:
+            index = faiss.read_index(str(index_path))
+        with open(self.index_dir / "index.pkl", "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        return FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=index_to_docstore_id,
+        )
+
+    def _load_bm25(self) -> BM25Index:
+        path = self.index_dir / "bm25.pkl"
+        if not path.exists():
+            return BM25Index()
+        return BM25Index.load(path)
+
+    def _consistent(self, vs) -> bool:
+        expected = sum(len(f["ids"]) for f in self.manifest["files"].values())
+        actual = len(vs.index_to_docstore_id) if vs is not None else 0
+        return expected == actual == len(self.bm25)
+
+    def _diff(self, current: Dict[str, str]) -> Dict[str, List[str]]:
+        known = self.manifest["files"]
+        return {
+            "added": [n for n in current if n not in known],
+            "modified": [n for n in current if n in known and known[n]["sha256"] != current[n]],
+            "deleted": [n for n in known if n not in current],
+        }
+
+    def sync(self) -> Dict[str, List[str]]:
+        """Re-embed only the files that were added, modified or deleted since the last run."""
+        current = self._scan_documents()
+        self.manifest = self._read_manifest()
+        changes = self._diff(current)
+
+        self.vs = None
+        self.bm25 = BM25Index()
+        self._positions = None
+        if self.manifest["files"]:
+            # Read-only startups can share the mapped index; updates need it in memory
+            self.vs = self._load_store(mmap=not any(changes.values()))
+            self.bm25 = self._load_bm25()
+            if not self._consistent(self.vs):
+                # Index and manifest disagree (e.g. an interrupted save): start over
+                self.manifest = self._new_manifest()
+                self.vs = None
+                self.bm25 = BM25Index()
+                changes = self._diff(current)
+        if not any(changes.values()):
+            self.version = self._digest()
+            return changes
+
+        known = self.manifest["files"]
+        added, modified, deleted = changes["added"], changes["modified"], changes["deleted"]
+        stale = [cid for n in modified + deleted for cid in known[n]["ids"]]
+        if stale and self.vs is not None:
+            self.vs.delete(stale)
+        for cid in stale:
+            self.bm25.remove(cid)
+        for n in modified + deleted:
+            known.pop(n, None)
+
+        # Every changed file starts with no chunks; the sink fills in ids as batches land
+        for name in added + modified:
+            known[name] = {"sha256": current[name], "ids": []}
+
+        def sink(batch, vectors):
+            texts = [c[2] for c in batch]
+            ids = [c[1] for c in batch]
+            metadatas = [{"source": c[0]} for c in batch]
+            if self.vs is None:
+                self.vs = FAISS.from_embeddings(
+                    text_embeddings=list(zip(texts, vectors)), embedding=self.embeddings,
+                    metadatas=metadatas, ids=ids,
+                )
+            else:
+                self.vs.add_embeddings(text_embeddings=list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+            for source, cid, text in batch:
+                known[source]["ids"].append(cid)
+                self.bm25.add(cid, text)
+
+        self.last_ingest = ingest(
+            iter_files(self.docs_dir, added + modified), self.splitter, self.embeddings, sink,
+            batch_size=settings.INGEST_BATCH_SIZE,
+            workers=settings.INGEST_CONCURRENCY,
+            max_in_flight=settings.INGEST_MAX_IN_FLIGHT,
+        )
+        # Unreadable files stay out of the manifest, so the next sync retries them
+        for name in self.last_ingest.failed:
+            for cid in known.pop(name, {}).get("ids", []):
+                self.bm25.remove(cid)
+
+        self._persist()
+        self.version = self._digest()
+        return changes
+
+    def _persist(self):
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        if self.vs is not None:
+            self.vs.save_local(str(self.index_dir))
+            self.bm25.save(self.index_dir / "bm25.pkl")
+        else:
+            for stale in ("index.faiss", "index.pkl", "bm25.pkl"):
+                (self.index_dir / stale).unlink(missing_ok=True)
+        # Manifest goes last so a crash mid-save is caught by the consistency check
+        self._write_manifest()
+
+    # ---- search ---------------------------------------------------------
+
+    def _result(self, doc_id: str, score: float) -> Dict[str, Any]:
+        doc = self.vs.docstore.search(doc_id)
+        return {
+            "text": doc.page_content,
+            "meta": {"source": doc.metadata.get("source", "unknown")},
+            "score": float(score),
+        }
+
+    def _query_vector(self, query: str):
+        return np.asarray([self.embeddings.embed_query(query)], dtype=np.float32)
+
+    def _vector_ranking(self, query: str, k: int) -> List[str]:
+        distances, rows = self.vs.index.search(self._query_vector(query), k)
+        return [self.vs.index_to_docstore_id[int(r)] for r in rows[0] if r != -1]
+
+    def _rescore(self, query: str, candidates: List[str]) -> List[str]:
+        """Rank only the lexical candidates by L2 distance instead of scanning the whole index."""
+        if self._positions is None:
+            self._positions = {cid: row for row, cid in self.vs.index_to_docstore_id.items()}
+        rows = [self._positions[cid] for cid in candidates if cid in self._positions]
+        vecs = np.vstack([self.vs.index.reconstruct(int(r)) for r in rows])
+        dist = ((vecs - self._query_vector(query)) ** 2).sum(axis=1)
+        return [self.vs.index_to_docstore_id[rows[i]] for i in np.argsort(dist)]
+
+    def search(self, query: str, k: int = 4, mode: str = None):
+        """Top-k chunks for `query`.
+
+        mode="vector" ranks by FAISS L2 distance (lower score is closer), "lexical" by BM25
+        (no embedding call), and "hybrid" fuses both rankings with reciprocal rank fusion.
+        With RETRIEVAL_PREFILTER, hybrid only scores the BM25 candidates densely.
+        """
         if getattr(self, "vs", None) is None:
             return [{"text": "No index available.", "meta": {"source": "system"}, "score": 0.0}]
+        with metrics.span("retrieve"):
+            return self._search(query, k, mode or settings.RETRIEVAL_MODE)
+
+    def _search(self, query: str, k: int, mode: str):
+
+        if mode == "lexical":
+            return [self._result(cid, score) for cid, score in self.bm25.search(query, k)]
+
+        if mode == "vector":
+            docs = self.vs.similarity_search_with_score(query, k=k)
+            results = []
+            for doc, score in docs:
+                results.append({
+                    "text": doc.page_content,
+                    "meta": {"source": doc.metadata.get("source", "unknown")},
+                    "score": float(score) if score is not None else 0.0,
+                })
+            return results
+
+        if mode == "hybrid":
+            fetch_k = max(k, settings.RETRIEVAL_FETCH_K)
+            lexical = [cid for cid, _ in self.bm25.search(query, fetch_k)]
+            if settings.RETRIEVAL_PREFILTER and len(lexical) >= k:
+                dense = self._rescore(query, lexical)
+            else:
+                dense = self._vector_ranking(query, fetch_k)
+            fused = reciprocal_rank_fusion([lexical, dense])
+            return [self._result(cid, score) for cid, score in fused[:k]]
 
-        docs = self.vs.similarity_search_with_score(query, k=k)
-        results = []
-        for doc, score in docs:
-            results.append({
-                "text": doc.page_content,
-                "meta": {"source": doc.metadata.get("source", "unknown")},
-                "score": float(score) if score is not None else 0.0,
-            })
-        return results
+        raise ValueError(f"Unknown retrieval mode: {mode}")
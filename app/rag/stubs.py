@@ -0,0 +1,54 @@
+
+import hashlib
+import math
+import re
+from dataclasses import dataclass
+from typing import Iterator, List
+
+from langchain_core.embeddings import Embeddings
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+class StubEmbeddings(Embeddings):
+    """Offline, deterministic hashed bag-of-words vectors; similar texts still land close together."""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _vec(self, text: str) -> List[float]:
+        v = [0.0] * self.dim
+        for tok in _TOKEN.findall(text.lower()):
+            h = int.from_bytes(hashlib.blake2b(tok.encode("utf-8"), digest_size=8).digest(), "little")
+            v[h % self.dim] += 1.0 if (h >> 63) else -1.0
+        n = math.sqrt(sum(x * x for x in v)) or 1.0
+        return [x / n for x in v]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vec(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vec(text)
+
+@dataclass
+class _Message:
+    content: str
+
+class StubChatModel:
+    """Stands in for ChatOpenAI (invoke / ainvoke / stream) without leaving the process."""
+
+    def _answer(self, messages) -> str:
+        user = messages[-1][1] if messages else ""
+        question = user.split("\n", 1)[0].replace("Question:", "").strip()
+        sources = re.findall(r"^\[(\d+)\]", user, flags=re.M)
+        cited = ", ".join(f"[{s}]" for s in sources[:2])
+        return f"(stub) Answer to '{question}' based on {cited or 'no context'}."
+
+    def invoke(self, messages) -> _Message:
+        return _Message(self._answer(messages))
+
+    async def ainvoke(self, messages) -> _Message:
+        return self.invoke(messages)
+
+    def stream(self, messages) -> Iterator[_Message]:
+        for word in self._answer(messages).split(" "):
+            yield _Message(word + " ")
@@ -0,0 +1,74 @@
+
+"""Agents built on first use.
+
+Factories import their agent's module when called, so neither the import of app.controller
+nor Controller() pays for langchain, FAISS, sklearn, PIL or requests until a turn needs
+them. warm_up() builds a set of agents on a background thread instead.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+class AgentRegistry:
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._wrappers: Dict[str, List[Callable[[Any], Any]]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self.timings: Dict[str, float] = {}  # name -> seconds spent building it
+        self.warmup_errors: Dict[str, str] = {}  # name -> why its warm-up build failed
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        self._factories[name] = factory
+        self._locks[name] = threading.Lock()
+
+    def wrap(self, name: str, wrapper: Callable[[Any], Any]):
+        """Apply wrapper(agent) when the agent is built, or now if it already is."""
+        with self._locks[name]:
+            if name in self._instances:
+                self._instances[name] = wrapper(self._instances[name])
+            else:
+                self._wrappers.setdefault(name, []).append(wrapper)
+
+    def get(self, name: str) -> Any:
+        agent = self._instances.get(name)
+        if agent is not None:
+            return agent
+        with self._locks[name]:  # one build per agent; other agents build in parallel
+            agent = self._instances.get(name)
+            if agent is None:
+                t0 = time.perf_counter()
+                agent = self._factories[name]()
+                for wrapper in self._wrappers.pop(name, []):
+                    agent = wrapper(agent)
+                self.timings[name] = time.perf_counter() - t0
+                self._instances[name] = agent
+        return agent
+
+    def peek(self, name: str) -> Any:
+        """The agent if it has been built, else None; never builds."""
+        return self._instances.get(name)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._factories)
+
+    def warm_up(self, names: Iterable[str] = None) -> threading.Thread:
+        """Build the named agents (default: all) on a daemon thread; failures are left for first use."""
+        names = list(self._factories if names is None else names)
+
+        def _run():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    self.warmup_errors[name] = f"{type(e).__name__}: {e}"
+                    logger.warning("Warm-up of %s failed; it will be built on first use", name, exc_info=True)
+
+        thread = threading.Thread(target=_run, name="agent-warmup", daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,169 @@
+
+"""Replay a JSONL file of turns through the Controller.
+
+    python -m app.replay turns.jsonl -o responses.jsonl --workers 8 [--stub] [--report report.json]
+
+Each input line is a Turn: {"user_text": "...", "session_id": "..."}. Turns of one session
+run in file order (they share memory); different sessions run in parallel. A line without a
+session_id is its own session ("line-<n>"), so independent turns never wait on each other. Each output line
+is a TurnResponse plus "line", "session_id", "intent" and "latency_ms"; a line that isn't a
+valid turn gets {"line": n, "error": "..."} and the replay goes on.
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Callable, Dict, Iterator, Tuple
+
+from .schemas import Turn
+from .utils import metrics
+from .utils.stats import summarize
+from .utils.text import detect_intent, normalize
+
+def read_turns(stream, on_error: Callable[[int, str], None] = None) -> Iterator[Tuple[int, Turn]]:
+    """(line number, Turn) per non-blank line. A malformed line is passed to
+    on_error(lineno, message) and skipped, or raises ValueError without one."""
+    for lineno, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+            session_id = data.get("session_id")
+            turn = Turn(user_text=str(data["user_text"]),
+                        session_id=str(session_id) if session_id is not None else f"line-{lineno}")
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            message = f"invalid turn: {type(e).__name__}: {e}"
+            if on_error is None:
+                raise ValueError(f"line {lineno}: {message}") from e
+            on_error(lineno, message)
+            continue
+        yield lineno, turn
+
+class Replayer:
+    def __init__(self, ctrl, out, workers: int = 8, max_pending: int = None):
+        self.ctrl = ctrl
+        self.out = out
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="replay")
+        # Bounds how far reading runs ahead of execution
+        self.slots = threading.BoundedSemaphore(max_pending or workers * 4)
+        self.lock = threading.Lock()
+        self.active = set()
+        self.queued: Dict[str, deque] = defaultdict(deque)
+        self.latencies: Dict[str, list] = defaultdict(list)
+        self.errors = 0
+        self.turns = 0
+        self.idle = threading.Condition(self.lock)
+
+    def submit(self, lineno: int, turn: Turn):
+        self.slots.acquire()
+        with self.lock:
+            self.turns += 1
+            if turn.session_id in self.active:
+                self.queued[turn.session_id].append((lineno, turn))
+                return
+            self.active.add(turn.session_id)
+        self.pool.submit(self._run, lineno, turn)
+
+    def reject(self, lineno: int, message: str):
+        """Record an input line that could not be replayed."""
+        with self.lock:
+            self.turns += 1
+            self.errors += 1
+            self.out.write(json.dumps({"line": lineno, "error": message}, ensure_ascii=False) + "\n")
+
+    def _run(self, lineno: int, turn: Turn):
+        nxt = None
+        try:
+            intent = detect_intent(normalize(turn.user_text))
+            t0 = time.perf_counter()
+            try:
+                record = asdict(self.ctrl.handle(turn))
+            except Exception as e:
+                record = {"error": str(e)}
+            ms = (time.perf_counter() - t0) * 1000.0
+            record.update({"line": lineno, "session_id": turn.session_id, "intent": intent, "latency_ms": round(ms, 3)})
+            line = json.dumps(record, ensure_ascii=False, default=str)
+            with self.lock:
+                self.latencies[intent].append(ms)
+                self.errors += "error" in record
+                self.out.write(line + "\n")
+        except Exception:
+            with self.lock:
+                self.errors += 1
+        finally:
+            # Whatever happened above, free the slot and hand the session on, or wait() hangs
+            with self.lock:
+                nxt = self.queued[turn.session_id].popleft() if self.queued.get(turn.session_id) else None
+                if nxt is None:
+                    self.active.discard(turn.session_id)
+                    self.queued.pop(turn.session_id, None)
+                    if not self.active:
+                        self.idle.notify_all()
+            self.slots.release()
+        if nxt is not None:
+            self.pool.submit(self._run, *nxt)
+
+    def wait(self):
+        with self.lock:
+            while self.active:
+                self.idle.wait()
+        self.pool.shutdown(wait=True)
+
+def report(replayer: Replayer, wall_s: float) -> dict:
+    all_ms = [ms for vals in replayer.latencies.values() for ms in vals]
+    return {
+        "turns": replayer.turns,
+        "errors": replayer.errors,
+        "wall_s": round(wall_s, 3),
+        "throughput_tps": round(replayer.turns / wall_s, 2) if wall_s > 0 else 0.0,
+        "latency_ms": {k: round(v, 3) for k, v in summarize(all_ms).items()},
+        "intents": {
+            intent: {k: round(v, 3) for k, v in summarize(vals).items()}
+            for intent, vals in sorted(replayer.latencies.items())
+        },
+        "stages": metrics.snapshot(),
+    }
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Replay JSONL turns through the Controller.")
+    ap.add_argument("input", help="JSONL file of turns, or - for stdin")
+    ap.add_argument("-o", "--output", default="-", help="JSONL responses (default stdout)")
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--report", help="also write the latency/throughput report to this JSON file")
+    ap.add_argument("--stub", action="store_true", help="offline stub LLM and embeddings")
+    args = ap.parse_args(argv)
+
+    if args.stub:
+        from .server import use_stub_backends
+        use_stub_backends()
+    from .controller import Controller
+
+    ctrl = Controller()
+    src = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    replayer = Replayer(ctrl, out, workers=args.workers)
+    t0 = time.perf_counter()
+    try:
+        for lineno, turn in read_turns(src, on_error=replayer.reject):
+            replayer.submit(lineno, turn)
+    finally:
+        replayer.wait()  # turns already submitted finish and are written before out closes
+        if src is not sys.stdin:
+            src.close()
+        if out is not sys.stdout:
+            out.close()
+
+    text = json.dumps(report(replayer, time.perf_counter() - t0), indent=2)
+    print(text, file=sys.stderr)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ from typing import List, Dict, Any, Optional
 @dataclass
 class Turn:
     user_text: str
+    session_id: str = "default"
 
 @dataclass
 class TurnResponse:
@@ -0,0 +1,201 @@
+
+"""Local HTTP/JSON front end for the Controller.
+
+    python -m app.server --port 8080 --workers 16 --batch-window-ms 5 [--stub]
+
+POST /v1/turn  {"user_text": "...", "session_id": "..."}  -> TurnResponse as JSON
+GET  /healthz                                               -> {"status": "ok", ...}
+GET  /metrics                                               -> Prometheus text (?format=json for a snapshot)
+"""
+
+import argparse
+import json
+import select
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from .utils import metrics
+from .utils.batching import MicroBatcher
+from .utils.config import settings
+
+class BatchedRecommender:
+    """Drop-in for RecommenderAgent.run that folds concurrent queries into one run_batch call."""
+
+    def __init__(self, agent, window_ms: float, max_batch: int = 64):
+        self.agent = agent
+        self.batcher = MicroBatcher(self._score, max_batch=max_batch, window_ms=window_ms,
+                                    name="recommender-batcher")
+
+    def _score(self, requests):
+        by_k = defaultdict(list)
+        for pos, (query, k) in enumerate(requests):
+            by_k[k].append(pos)
+        out = [None] * len(requests)
+        for k, positions in by_k.items():
+            results = self.agent.run_batch([requests[p][0] for p in positions], k)
+            if len(results) != len(positions):
+                raise ValueError(f"run_batch returned {len(results)} results for {len(positions)} queries")
+            for p, res in zip(positions, results):
+                out[p] = res
+        return out
+
+    def run(self, query: str, k: int = 2):
+        with metrics.span("recommend"):  # in the caller's turn; the batcher thread records nothing
+            return self.batcher.submit((query, k))
+
+    def __getattr__(self, name):
+        return getattr(self.agent, name)
+
+class PooledHTTPServer(HTTPServer):
+    """Hands each connection to a fixed worker pool instead of spawning a thread per client.
+
+    A keep-alive connection holds its worker only while it is sending requests: once idle, it
+    is closed as soon as another connection is waiting for a worker, or after idle_timeout."""
+
+    IDLE_POLL = 0.05  # seconds between checks for waiting connections while idle
+
+    def __init__(self, addr, handler, workers: int, idle_timeout: float = 30.0):
+        super().__init__(addr, handler)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http-worker")
+        self.idle_timeout = idle_timeout
+        self._waiting = 0  # accepted connections not yet picked up by a worker
+        self._waiting_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self._waiting_lock:
+            self._waiting += 1
+        self.pool.submit(self._serve, request, client_address)
+
+    def _serve(self, request, client_address):
+        with self._waiting_lock:
+            self._waiting -= 1
+        ThreadingMixIn.process_request_thread(self, request, client_address)
+
+    def keep_alive(self, sock) -> bool:
+        """Wait for the next request on an idle connection: True once it arrives, False when
+        the worker is wanted elsewhere or idle_timeout has passed. Requests a client pipelined
+        before its previous response are not looked for, as no common client sends them."""
+        deadline = time.monotonic() + self.idle_timeout
+        while not self._waiting:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                return False
+            if select.select([sock], [], [], min(left, self.IDLE_POLL))[0]:
+                return True
+        return False
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+
+def make_handler(ctrl):
+    from .schemas import Turn
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive by default
+        timeout = 30  # a client stalled mid-request gives its worker back
+
+        def handle(self):
+            # One request at a time, so an idle connection yields its worker (see keep_alive)
+            self.close_connection = True
+            self.handle_one_request()
+            while not self.close_connection and self.server.keep_alive(self.connection):
+                self.handle_one_request()
+
+        def _send(self, code: int, payload, content_type: str = "application/json; charset=utf-8"):
+            if isinstance(payload, str):
+                body = payload.encode("utf-8")
+            else:
+                body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/healthz":
+                self._send(200, {"status": "ok", "llm": settings.LLM_BACKEND,
+                                 "embeddings": settings.EMBEDDINGS_BACKEND,
+                                 "warmup_errors": ctrl.agents.warmup_errors})
+            elif self.path == "/metrics?format=json":
+                self._send(200, metrics.snapshot())
+            elif self.path == "/metrics":
+                self._send(200, metrics.prometheus_text(), "text/plain; version=0.0.4")
+            elif self.path.startswith("/v1/images/"):
+                job = ctrl.image_status(self.path[len("/v1/images/"):])
+                if job is None:
+                    self._send(404, {"error": "no such image job"})
+                else:
+                    self._send(200, job.to_dict())
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/v1/turn":
+                self._send(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                data = json.loads(self.rfile.read(length) or b"{}")
+                turn = Turn(user_text=str(data["user_text"]), session_id=str(data.get("session_id", "default")))
+            except (ValueError, KeyError, TypeError) as e:
+                self._send(400, {"error": f"bad request: {e}"})
+                return
+            try:
+                resp = ctrl.handle(turn)
+            except Exception as e:
+                self._send(500, {"error": str(e)})
+                return
+            self._send(200, asdict(resp))
+
+        def log_message(self, fmt, *args):
+            pass  # per-request stderr lines would dominate a load test
+
+    return Handler
+
+def use_stub_backends():
+    """Offline LLM and embeddings; the index goes to its own directory so the real one is untouched."""
+    settings.LLM_BACKEND = "stub"
+    settings.EMBEDDINGS_BACKEND = "stub"
+    settings.INDEX_DIR = settings.INDEX_DIR.rstrip("/") + "-stub"
+
+def build_server(host: str, port: int, workers: int, batch_window_ms: float):
+    from .controller import Controller
+
+    if batch_window_ms > 0:
+        settings.EMBEDDINGS_BATCH_WINDOW_MS = batch_window_ms
+    ctrl = Controller()
+    if batch_window_ms > 0:
+        ctrl.agents.wrap("recommender", lambda agent: BatchedRecommender(agent, batch_window_ms))
+    return PooledHTTPServer((host, port), make_handler(ctrl), workers)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Serve the assistant over HTTP/JSON.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--workers", type=int, default=16, help="concurrent connections served")
+    ap.add_argument("--batch-window-ms", type=float, default=5.0,
+                    help="micro-batching window for embeddings and recommender scoring (0 disables)")
+    ap.add_argument("--stub", action="store_true", help="offline stub LLM and embeddings")
+    args = ap.parse_args(argv)
+
+    if args.stub:
+        use_stub_backends()
+    server = build_server(args.host, args.port, args.workers, args.batch_window_ms)
+    print(f"🤖 Serving on http://{args.host}:{args.port} ({args.workers} workers)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Tuple
+
+def image_key(model: str, prompt: str, negative: str, size: Tuple[int, int]) -> str:
+    payload = "\0".join([model, prompt, negative, f"{size[0]}x{size[1]}"])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _link_or_copy(src: Path, dst: Path):
+    """Hard-link src at dst (no bytes copied), or copy it where links aren't possible."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+class ImageCache:
+    """Generated images on disk, named by image_key and bounded to `max_bytes` by evicting
+    the least recently used. Recency is the file's mtime, so it survives restarts.
+
+    Entries are never handed out directly: add() and get() link the caller's own file to
+    the entry, so evicting it never removes a path already returned to a client."""
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()  # key -> bytes, oldest first
+        self.total = 0
+        entries = []
+        for p in self.root.glob("*.png"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, p.stem, st.st_size))
+        for _, key, size in sorted(entries):
+            self._sizes[key] = size
+            self.total += size
+
+    def path(self, key: str) -> Path:
+        return self.root / f"{key}.png"
+
+    def get(self, key: str, dest: Path) -> bool:
+        """Link the entry for `key` at `dest` and mark it recently used; False on a miss."""
+        with self._lock:  # held across the link so eviction can't remove the entry first
+            if key not in self._sizes:
+                return False
+            path = self.path(key)
+            try:
+                os.utime(path)
+                _link_or_copy(path, dest)
+            except OSError:  # removed behind our back
+                self.total -= self._sizes.pop(key)
+                return False
+            self._sizes.move_to_end(key)
+            return True
+
+    def add(self, key: str, src: Path):
+        """Store the finished file at `src` as the entry for `key` (src itself stays the
+        caller's), then evict down to the size bound."""
+        tmp = self.root / f"{key}.{uuid.uuid4().hex[:8]}.tmp"
+        _link_or_copy(src, tmp)
+        size = tmp.stat().st_size
+        with self._lock:
+            os.replace(tmp, self.path(key))
+            self.total += size - self._sizes.pop(key, 0)
+            self._sizes[key] = size
+            while self.total > self.max_bytes and len(self._sizes) > 1:
+                old, old_size = self._sizes.popitem(last=False)
+                self.total -= old_size
+                try:
+                    self.path(old).unlink()
+                except OSError:
+                    pass
+
+    def __len__(self) -> int:
+        return len(self._sizes)
@@ -1,13 +1,20 @@
 
+import os
+import threading
 import time
+import uuid
 from pathlib import Path
-import requests
-try:
-    import replicate  # optional; fallback to stub if missing
-except Exception:  # ImportError or runtime issues
-    replicate = None
+from typing import TYPE_CHECKING, Optional
+from ..utils.cache import SingleFlight
 from ..utils.config import settings
-from PIL import Image, ImageDraw
+from ..utils import metrics
+from .image_cache import ImageCache, image_key
+
+# PIL, requests and replicate are imported where used, so importing this module stays cheap
+if TYPE_CHECKING:
+    from PIL import Image
+
+IMAGE_SIZE = (768, 512)
 
 SAFE_NEGATIVE = "nsfw, nudity, gore, violence, low quality, blurry, watermark"
 
@@ -21,27 +28,77 @@ class ImageGenerator:
     def __init__(self, out_dir: str = "outputs/images"):
         self.out = Path(out_dir)
         self.out.mkdir(parents=True, exist_ok=True)
-        self.client = (
-            replicate.Client(api_token=settings.T2I_API_KEY)
-            if (replicate is not None and settings.T2I_API_KEY)
-            else None
-        )
+        self.client = _replicate_client()
+        if self.client is None:
+            import PIL.ImageDraw  # noqa: F401  every image will be a stub; load Pillow with the agent
+        self._session = None
+        self._session_lock = threading.Lock()
+        self.cache = (ImageCache(self.out / "cache", settings.T2I_CACHE_MAX_MB * 1024 * 1024)
+                      if settings.T2I_CACHE_MAX_MB > 0 else None)
+        self._flight = SingleFlight()
+
+    @property
+    def session(self):
+        """Keep-alive connections to the image CDN, shared by every download."""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.T2I_WORKERS)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return self._session
 
     def build_prompt(self, subject: str, style: str = "cinematic",
                      lighting: str = "soft studio", composition: str = "rule of thirds", lens: str = "50mm"):
         return PROMPT_TEMPLATE.format(subject=subject, style=style,
                                       lighting=lighting, composition=composition, lens=lens)
 
+    def _new_path(self) -> Path:
+        # Timestamp for humans, random suffix so concurrent generations never share a name
+        return self.out / f"image_{time.strftime('%Y%m%d-%H%M%S')}_{uuid.uuid4().hex[:8]}.png"
+
+    def _download(self, url: str, out_path: Path):
+        """Stream the body to disk in chunks; the file only appears once complete, and a
+        failed or interrupted download leaves nothing behind."""
+        part = out_path.with_suffix(".part")
+        try:
+            with self.session.get(url, stream=True, timeout=settings.T2I_DOWNLOAD_TIMEOUT) as r:
+                r.raise_for_status()
+                with open(part, "wb") as f:
+                    for chunk in r.iter_content(chunk_size=1 << 16):
+                        f.write(chunk)
+            os.replace(part, out_path)
+        except BaseException:
+            part.unlink(missing_ok=True)
+            raise
+
     def generate(self, prompt: str, negative: str = SAFE_NEGATIVE) -> str:
-        ts = int(time.time())
-        out_path = self.out / f"image_{ts}.png"
+        """Path of an image for `prompt`. Repeats of a (model, prompt, negative, size) seen
+        before come straight from the on-disk cache, and concurrent repeats share one render.
+        The path is outside the cache, so it stays valid when the cache entry is evicted."""
+        if self.cache is None:
+            return self._generate(prompt, negative, None)
+        key = image_key(settings.T2I_MODEL if self.client else "stub", prompt, negative, IMAGE_SIZE)
+        out_path = self._new_path()
+        if self.cache.get(key, out_path):
+            return str(out_path)
+        return self._flight.do(key, lambda: self._generate(prompt, negative, key))
+
+    def _generate(self, prompt: str, negative: str, key: Optional[str]) -> str:
+        out_path = self._new_path()
         try:
             if not self.client:
                 raise ValueError("Replicate key missing.")
-            output = self.client.run(
-                settings.T2I_MODEL,
-                input={"prompt": prompt, "negative_prompt": negative, "width": 768, "height": 512}
-            )
+            with metrics.span("image_render"):
+                output = self.client.run(
+                    settings.T2I_MODEL,
+                    input={"prompt": prompt, "negative_prompt": negative, "width": IMAGE_SIZE[0], "height": IMAGE_SIZE[1]}
+                )
             
             # Handle different output formats from Replicate
             if isinstance(output, list) and output:
@@ -52,63 +109,116 @@ class ImageGenerator:
                     url = str(url)
                 
                 if url.startswith("http"):
-                    data = requests.get(url).content
-                    with open(out_path, "wb") as f:
-                        f.write(data)
+                    with metrics.span("image_download"):
+                        self._download(url, out_path)
+                    if key:
+                        self.cache.add(key, out_path)
                     return str(out_path)
             
             raise ValueError(f"Unexpected response format: {output}")
         except Exception as e:
             print(f"Replicate API error: {e}")  # Debug: show the actual error
-            # Create a better stub image with actual drawing
-            img = Image.new("RGB", (768, 512), color=(240, 248, 255))  # Light blue background
-            draw = ImageDraw.Draw(img)
-            
-            # Add a border
-            draw.rectangle([(10, 10), (758, 502)], outline=(100, 100, 100), width=3)
-            
-            # Try to draw a simple representation based on the prompt
-            prompt_lower = prompt.lower()
-            
-            # Center coordinates
-            center_x, center_y = 384, 256
-            
-            if "cat" in prompt_lower:
-                # Draw a simple cat
-                draw.ellipse([center_x-60, center_y-40, center_x+60, center_y+40], fill=(255, 165, 0))  # Orange body
-                draw.ellipse([center_x-50, center_y-50, center_x-20, center_y-20], fill=(255, 165, 0))  # Left ear
-                draw.ellipse([center_x+20, center_y-50, center_x+50, center_y-20], fill=(255, 165, 0))  # Right ear
-                draw.ellipse([center_x-15, center_y-15, center_x-5, center_y-5], fill=(0, 0, 0))  # Left eye
-                draw.ellipse([center_x+5, center_y-15, center_x+15, center_y-5], fill=(0, 0, 0))  # Right eye
-                draw.polygon([(center_x-5, center_y+5), (center_x, center_y+15), (center_x+5, center_y+5)], fill=(0, 0, 0))  # Nose
-                # Whiskers
-                draw.line([(center_x-60, center_y), (center_x-30, center_y)], fill=(0, 0, 0), width=2)
-                draw.line([(center_x-60, center_y+5), (center_x-30, center_y+5)], fill=(0, 0, 0), width=2)
-                draw.line([(center_x+30, center_y), (center_x+60, center_y)], fill=(0, 0, 0), width=2)
-                draw.line([(center_x+30, center_y+5), (center_x+60, center_y+5)], fill=(0, 0, 0), width=2)
-                
-            elif "dog" in prompt_lower:
-                # Draw a simple dog
-                draw.ellipse([center_x-50, center_y-30, center_x+50, center_y+30], fill=(139, 69, 19))  # Brown body
-                draw.ellipse([center_x-40, center_y-45, center_x-15, center_y-20], fill=(139, 69, 19))  # Left ear
-                draw.ellipse([center_x+15, center_y-45, center_x+40, center_y-20], fill=(139, 69, 19))  # Right ear
-                draw.ellipse([center_x-15, center_y-10, center_x-5, center_y], fill=(0, 0, 0))  # Left eye
-                draw.ellipse([center_x+5, center_y-10, center_x+15, center_y], fill=(0, 0, 0))  # Right eye
-                draw.ellipse([center_x-5, center_y+5, center_x+5, center_y+10], fill=(0, 0, 0))  # Nose
-                
-            elif "sunset" in prompt_lower or "sun" in prompt_lower:
-                # Draw a simple sunset
-                draw.ellipse([center_x-100, center_y-80, center_x+100, center_y+80], fill=(255, 165, 0))  # Sun
-                draw.ellipse([center_x-80, center_y-60, center_x+80, center_y+60], fill=(255, 215, 0))  # Sun center
-                
-            else:
-                # Generic image placeholder
-                draw.ellipse([center_x-80, center_y-60, center_x+80, center_y+60], fill=(200, 200, 200))  # Gray circle
-                draw.text((center_x-50, center_y-10), "IMAGE", fill=(100, 100, 100))
-            
-            # Add text at bottom
-            draw.text((20, 480), f"Demo Image: {prompt[:50]}...", fill=(50, 50, 50))
-            draw.text((20, 460), "Note: Set T2I_API_KEY in config for real images", fill=(100, 100, 100))
-            
-            img.save(out_path)
+            if self.client:
+                # A stand-in for a failed call must not be cached as the real image
+                key, out_path = None, self._new_path()
+            with metrics.span("image_render"):
+                render_stub(prompt, out_path)
+            if key:
+                self.cache.add(key, out_path)
             return str(out_path)
+
+def _replicate_client():
+    if not settings.T2I_API_KEY:
+        return None
+    try:
+        import replicate  # optional; fallback to stub if missing
+    except Exception:  # ImportError or runtime issues
+        return None
+    return replicate.Client(api_token=settings.T2I_API_KEY)
+
+_stub_bases = {}
+_stub_lock = threading.Lock()
+
+def _stub_kind(prompt: str) -> str:
+    p = prompt.lower()
+    if "cat" in p:
+        return "cat"
+    if "dog" in p:
+        return "dog"
+    if "sunset" in p or "sun" in p:
+        return "sunset"
+    return "generic"
+
+def _draw_stub_base(kind: str) -> "Image.Image":
+    """Everything on a stub image except the per-prompt caption."""
+    from PIL import Image, ImageDraw
+
+    img = Image.new("RGB", IMAGE_SIZE, color=(240, 248, 255))  # Light blue background
+    draw = ImageDraw.Draw(img)
+
+    # Add a border
+    draw.rectangle([(10, 10), (758, 502)], outline=(100, 100, 100), width=3)
+
+    # Center coordinates
+    center_x, center_y = 384, 256
+
+    if kind == "cat":
+        # Draw a simple cat
+        draw.ellipse([center_x-60, center_y-40, center_x+60, center_y+40], fill=(255, 165, 0))  # Orange body
+        draw.ellipse([center_x-50, center_y-50, center_x-20, center_y-20], fill=(255, 165, 0))  # Left ear
+        draw.ellipse([center_x+20, center_y-50, center_x+50, center_y-20], fill=(255, 165, 0))  # Right ear
+        draw.ellipse([center_x-15, center_y-15, center_x-5, center_y-5], fill=(0, 0, 0))  # Left eye
+        draw.ellipse([center_x+5, center_y-15, center_x+15, center_y-5], fill=(0, 0, 0))  # Right eye
+        draw.polygon([(center_x-5, center_y+5), (center_x, center_y+15), (center_x+5, center_y+5)], fill=(0, 0, 0))  # Nose
+        # Whiskers
+        draw.line([(center_x-60, center_y), (center_x-30, center_y)], fill=(0, 0, 0), width=2)
+        draw.line([(center_x-60, center_y+5), (center_x-30, center_y+5)], fill=(0, 0, 0), width=2)
+        draw.line([(center_x+30, center_y), (center_x+60, center_y)], fill=(0, 0, 0), width=2)
+        draw.line([(center_x+30, center_y+5), (center_x+60, center_y+5)], fill=(0, 0, 0), width=2)
+
+    elif kind == "dog":
+        # Draw a simple dog
+        draw.ellipse([center_x-50, center_y-30, center_x+50, center_y+30], fill=(139, 69, 19))  # Brown body
+        draw.ellipse([center_x-40, center_y-45, center_x-15, center_y-20], fill=(139, 69, 19))  # Left ear
+        draw.ellipse([center_x+15, center_y-45, center_x+40, center_y-20], fill=(139, 69, 19))  # Right ear
+        draw.ellipse([center_x-15, center_y-10, center_x-5, center_y], fill=(0, 0, 0))  # Left eye
+        draw.ellipse([center_x+5, center_y-10, center_x+15, center_y], fill=(0, 0, 0))  # Right eye
+        draw.ellipse([center_x-5, center_y+5, center_x+5, center_y+10], fill=(0, 0, 0))  # Nose
+
+    elif kind == "sunset":
+        # Draw a simple sunset
+        draw.ellipse([center_x-100, center_y-80, center_x+100, center_y+80], fill=(255, 165, 0))  # Sun
+        draw.ellipse([center_x-80, center_y-60, center_x+80, center_y+60], fill=(255, 215, 0))  # Sun center
+
+    else:
+        # Generic image placeholder
+        draw.ellipse([center_x-80, center_y-60, center_x+80, center_y+60], fill=(200, 200, 200))  # Gray circle
+        draw.text((center_x-50, center_y-10), "IMAGE", fill=(100, 100, 100))
+
+    draw.text((20, 460), "Note: Set T2I_API_KEY in config for real images", fill=(100, 100, 100))
+    return img
+
+def _stub_base(kind: str) -> "Image.Image":
+    """Base canvas per subject kind, drawn once per process."""
+    base = _stub_bases.get(kind)
+    if base is None:
+        with _stub_lock:
+            base = _stub_bases.get(kind)
+            if base is None:
+                base = _stub_bases[kind] = _draw_stub_base(kind)
+    return base
+
+def render_stub(prompt: str, out_path: Path):
+    """Offline placeholder: the cached base canvas plus this prompt's caption."""
+    from PIL import ImageDraw
+
+    img = _stub_base(_stub_kind(prompt)).copy()
+    ImageDraw.Draw(img).text((20, 480), f"Demo Image: {prompt[:50]}...", fill=(50, 50, 50))
+    part = out_path.with_suffix(".part")
+    # Flat placeholder art: light compression is nearly as small and several times faster
+    try:
+        img.save(part, format="PNG", compress_level=1)
+        os.replace(part, out_path)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
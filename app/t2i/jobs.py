@@ -0,0 +1,102 @@
+
+"""Background image generation: submit returns a job id at once, a bounded pool renders."""
+
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Optional
+
+from ..utils.cache import TTLCache
+from ..utils.config import settings
+from .image_gen import SAFE_NEGATIVE, ImageGenerator
+
+@dataclass
+class ImageJob:
+    id: str
+    prompt: str
+    negative: str = SAFE_NEGATIVE
+    status: str = "queued"  # queued | running | done | failed
+    path: Optional[str] = None
+    error: Optional[str] = None
+    created: float = field(default_factory=time.time)
+    finished: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+def describe(job: Optional[ImageJob]) -> str:
+    """One-line status for chat/CLI replies."""
+    if job is None:
+        return "❓ No such image job."
+    if job.status == "done":
+        return f"🖼️ Image {job.id} saved to: {job.path}"
+    if job.status == "failed":
+        return f"⚠️ Image {job.id} failed: {job.error}"
+    return f"⏳ Image {job.id} is {job.status}."
+
+class ImageJobQueue:
+    """Runs ImageGenerator.generate on `workers` threads. At most `max_pending` jobs may be
+    queued or running (submit raises queue.Full beyond that); the last `history` jobs stay
+    queryable by id."""
+
+    def __init__(self, generator: ImageGenerator, workers: int = None, max_pending: int = None,
+                 history: int = None):
+        self.generator = generator
+        self.max_pending = max_pending or settings.T2I_MAX_PENDING
+        self.jobs = TTLCache(maxsize=history or settings.T2I_JOB_HISTORY)
+        self._futures: Dict[str, Future] = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers or settings.T2I_WORKERS, thread_name_prefix="t2i")
+
+    def submit(self, prompt: str, negative: str = SAFE_NEGATIVE) -> ImageJob:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise queue.Full(f"{self._pending} image jobs already pending")
+            self._pending += 1
+        job = ImageJob(id=uuid.uuid4().hex[:12], prompt=prompt, negative=negative)
+        self.jobs.set(job.id, job)
+        fut = self._pool.submit(self._run, job)
+        with self._lock:
+            self._futures[job.id] = fut
+        fut.add_done_callback(lambda f, jid=job.id: self._done(jid))
+        return job
+
+    def _run(self, job: ImageJob):
+        job.status = "running"
+        try:
+            job.path = self.generator.generate(job.prompt, job.negative)
+            job.status = "done"
+        except Exception as e:
+            job.error, job.status = str(e), "failed"
+        finally:
+            job.finished = time.time()
+
+    def _done(self, job_id: str):
+        with self._lock:
+            self._pending -= 1
+            self._futures.pop(job_id, None)
+
+    def get(self, job_id: str) -> Optional[ImageJob]:
+        return self.jobs.get(job_id)
+
+    def wait(self, job_id: str, timeout: float = None) -> Optional[ImageJob]:
+        """Block until the job finishes (or `timeout` passes) and return it."""
+        with self._lock:
+            fut = self._futures.get(job_id)
+        if fut is not None:
+            try:
+                fut.result(timeout)
+            except Exception:
+                pass
+        return self.get(job_id)
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,61 @@
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List
+
+from . import metrics
+
+class MicroBatcher:
+    """Groups items submitted from many threads into one call of `fn(items) -> results`.
+
+    A batch closes when `max_batch` items are waiting or `window_ms` has passed since the
+    first one arrived; each caller blocks only for its own result. A batch serves several
+    turns at once, so spans inside `fn` are dropped: callers time the wait for their result.
+    """
+
+    def __init__(self, fn: Callable[[List[Any]], List[Any]], max_batch: int = 32,
+                 window_ms: float = 5.0, name: str = "batcher"):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.window = window_ms / 1000.0
+        self._q: "queue.Queue" = queue.Queue()
+        self.batches = 0
+        self.items = 0
+        self._worker = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item: Any) -> Any:
+        fut: Future = Future()
+        self._q.put((item, fut))
+        return fut.result()
+
+    def _loop(self):
+        metrics.silence()
+        while True:
+            batch = [self._q.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.batches += 1
+            self.items += len(batch)
+            try:
+                results = list(self.fn([item for item, _ in batch]))
+                if len(results) != len(batch):
+                    raise ValueError(f"{self._worker.name}: fn returned {len(results)} results for {len(batch)} items")
+                for (_, fut), res in zip(batch, results):
+                    fut.set_result(res)
+            except BaseException as e:
+                # Every caller blocks on its future, so none may be left unresolved
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                if not isinstance(e, Exception):
+                    raise
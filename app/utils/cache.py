@@ -0,0 +1,112 @@
+
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Dict, Hashable, Optional
+
+_MISSING = object()
+
+class TTLCache:
+    """Thread-safe LRU mapping with an optional per-entry time-to-live (seconds)."""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[0]
+
+    def items(self):
+        """Snapshot of live (key, value) pairs, oldest first; does not touch recency."""
+        now = time.monotonic()
+        with self._lock:
+            return [(k, v) for k, (v, exp) in self._data.items() if exp is None or exp >= now]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class SingleFlight:
+    """Coalesce concurrent calls by key: the first caller does the work, later callers
+    arriving while it is in flight share its result (or exception) instead of repeating it."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def _forget(self, key: Hashable, fut: Future):
+        with self._lock:
+            if self._calls.get(key) is fut:
+                del self._calls[key]
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """Run fn in this thread, or wait up to `timeout` for the identical call in flight."""
+        with self._lock:
+            fut = self._calls.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._calls[key] = Future()
+        if not leader:
+            return fut.result(timeout)
+        try:
+            result = fn()
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            self._forget(key, fut)
+
+    def submit(self, executor: Executor, key: Hashable, fn: Callable[[], Any]) -> Future:
+        """Like do(), but the work runs on `executor`; every caller gets the same Future."""
+        with self._lock:
+            fut = self._calls.get(key)
+            if fut is not None:
+                return fut
+            # Run in the caller's context, so its metrics turn sees the work
+            fut = self._calls[key] = executor.submit(contextvars.copy_context().run, fn)
+        # Outside the lock: the callback runs at once if fn has already finished
+        fut.add_done_callback(lambda f: self._forget(key, f))
+        return fut
+
+    def __len__(self) -> int:
+        return len(self._calls)
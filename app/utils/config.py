@@ -14,27 +14,118 @@ class Settings:
     INDEX_DIR: str = "indices/vector"
     DOCS_DIR: str = "data/docs"
 
+    # Embedding cache shared by ingestion and queries
+    EMBED_CACHE_PATH: str = "indices/embed_cache.sqlite"
+    EMBED_CACHE_MAX_ENTRIES: int = 200_000   # rows kept on disk before LRU eviction
+    EMBED_CACHE_MEMORY_ENTRIES: int = 4096   # in-process LRU in front of SQLite
+
+    # Streaming ingestion: chunks per embedding request, parallel requests, and batches
+    # allowed in flight before the file walk pauses
+    INGEST_BATCH_SIZE: int = 64
+    INGEST_CONCURRENCY: int = 4
+    INGEST_MAX_IN_FLIGHT: int = 8
+
+    # Retrieval: "vector", "lexical" (BM25) or "hybrid" (reciprocal rank fusion of both)
+    RETRIEVAL_MODE: str = "hybrid"
+    RETRIEVAL_FETCH_K: int = 20        # candidates taken from each ranking before fusion
+    RETRIEVAL_PREFILTER: bool = False  # hybrid: score only BM25 candidates densely
+
+    # Semantic answer cache in front of compose_answer
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIZE: int = 512
+    ANSWER_CACHE_TTL: float = 3600.0       # seconds
+    ANSWER_CACHE_THRESHOLD: float = 0.95   # cosine similarity for a near-duplicate hit
+
     # OpenAI RAG (no secrets committed; set via env or secrets.py)
     OPENAI_API_KEY: str = ""
     OPENAI_MODEL: str = "gpt-4o-mini"
     OPENAI_EMBEDDINGS_MODEL: str = "text-embedding-3-small"
+    LLM_BACKEND: str = "openai"     # or "stub" for offline runs
+    LLM_MAX_CONNECTIONS: int = 20   # pooled keep-alive connections of the shared chat client
+    LLM_TIMEOUT: float = 60.0
+
+    # Embedding backend: "openai" (OPENAI_EMBEDDINGS_MODEL), "local" (MODEL_NAME on CPU) or "stub"
+    EMBEDDINGS_BACKEND: str = "openai"
+    EMBEDDINGS_BATCH_SIZE: int = 32
+    EMBEDDINGS_THREADS: int = 0          # 0 = let torch decide
+    EMBEDDINGS_LOCAL_ONLY: bool = False  # never reach the Hugging Face hub for weights
+    EMBEDDINGS_BATCH_WINDOW_MS: float = 0.0  # >0 coalesces concurrent query embeddings
 
     # Replicate T2I (no secrets committed; set via env or secrets.py)
     USE_DIFFUSERS: bool = False
     T2I_PROVIDER: str = "replicate"
     T2I_API_KEY: str = ""
     T2I_MODEL: str = "stability-ai/sdxl:39ed52f2a78e934b3ba6e2a89f5b1c712de7dfea535525255b1aa35c5565e08b"
+    T2I_QUEUE: bool = False           # reply with a job id at once and render in the background
+    T2I_WORKERS: int = 4              # concurrent generations (and pooled download connections)
+    T2I_MAX_PENDING: int = 64         # queued + running jobs before new ones are refused
+    T2I_JOB_HISTORY: int = 1024       # finished jobs kept for status lookups
+    T2I_DOWNLOAD_TIMEOUT: float = 60.0
+    T2I_CACHE_MAX_MB: int = 512       # content-addressed image cache on disk (0 = off)
+
+    # Intent router: extra/replacement hints as JSON {intent: [phrase | [phrase, weight]]},
+    # and a character-trigram fallback for turns that match no hint
+    INTENT_HINTS_PATH: str = ""
+    INTENT_CLASSIFIER: bool = False
+    INTENT_CLASSIFIER_THRESHOLD: float = 0.6
 
     # Weather Agent
     WEATHER_PROVIDER: str = "stub"
-    WEATHER_API_KEY: str = "1d56903457d644918ac31651251110"
+    WEATHER_API_KEY: str = ""             # required by WEATHER_PROVIDER=weatherapi
+    WEATHER_BASE_URL: str = "https://api.weatherapi.com/v1"
+    WEATHER_TIMEOUT: float = 5.0
+    WEATHER_CACHE_SIZE: int = 1024         # locations kept
+    WEATHER_CACHE_TTL: float = 600.0       # seconds a reading is reused
+    WEATHER_DEFAULT_LOCATION: str = ""     # used when a turn names no place
 
     # SQL Agent
     SQL_DB_PATH: str = "data/demo.db"
+    SQL_POOL_SIZE: int = 4                    # read-only connections shared by query threads
+    SQL_STATEMENT_CACHE: int = 256            # prepared statements kept per connection
+    SQL_MMAP_SIZE: int = 256 * 1024 * 1024    # bytes of the file read through mmap
+    SQL_CACHE_SIZE_KB: int = 16384            # page cache per connection
+    SQL_BATCH_SIZE: int = 500                 # rows per streamed batch
+    SQL_MAX_ROWS: int = 100_000               # rows a query may return (0 = unlimited)
+    SQL_TIMEOUT: float = 10.0                 # seconds before a query is interrupted (0 = none)
+    SQL_PREVIEW_ROWS: int = 3                 # rows shown in a chat reply
+    SQL_BULK_BATCH: int = 10_000              # rows per executemany when bulk loading
+    SQL_WAL: bool = False                     # WAL journal; rewrites the file's header for good, so
+                                              # keep it off for the committed data/demo.db
     LOG_LEVEL: str = "INFO"
+    METRICS_ENABLED: bool = True  # per-stage latency spans and histograms
 
     # Recommender
     RECOMMENDER_ONLINE_ENRICHMENT: bool = False  # set True to let LLM suggest brands/links
+    RECOMMENDER_CATALOG: str = ""                 # .json/.jsonl/.csv or SQLite file; "" = demo items
+    RECOMMENDER_CATALOG_TABLE: str = "catalog"    # table read when the catalog is SQLite
+    RECOMMENDER_INDEX_DIR: str = "indices/recommender"
+    RECOMMENDER_REFIT_RATIO: float = 0.5          # refit once appended rows exceed this share of fitted ones
+    RECOMMENDER_BATCH_MAX_SCORES: int = 4_000_000  # run_batch: dense (queries x items) cells per chunk
+    RECOMMENDER_LLM_CONCURRENCY: int = 8           # parallel LLM re-rank/enrichment calls
+    RECOMMENDER_LLM_MODE: str = "combined"         # one call for re-rank + enrichment, or "parallel"
+    RECOMMENDER_LLM_BUDGET_MS: float = 1500.0      # then fall back to TF-IDF order; 0 = wait
+    RECOMMENDER_LLM_CACHE_SIZE: int = 2048
+    RECOMMENDER_LLM_CACHE_TTL: float = 3600.0      # seconds
+
+    # Conversation memory per session
+    MEMORY_MAX_TURNS: int = 6              # turns kept verbatim
+    MEMORY_SUMMARY_TURNS: int = 20         # older turns kept as one-line snippets
+    MEMORY_MESSAGE_CHARS: int = 4000       # longer messages are cut when stored (0 = keep all)
+    MEMORY_PROMPT_TOKENS: int = 1024       # to_prompt budget
+    MEMORY_MAX_SESSIONS: int = 10_000      # sessions held in process
+    MEMORY_IDLE_TTL: float = 3600.0        # seconds before an idle session is evicted (0 = never)
+    MEMORY_SPILL_PATH: str = ""            # SQLite file evicted sessions go to; "" = drop them
+    MEMORY_SPILL_TTL: float = 7 * 86400.0  # spilled sessions older than this are deleted
+
+    # Agents are built on first use; these are built on a background thread at startup instead
+    AGENT_WARMUP: str = ""   # comma-separated agent names, or "all"
+
+    # Controller.ahandle: concurrent calls allowed per backend
+    MAX_CONCURRENT_LLM: int = 32
+    MAX_CONCURRENT_T2I: int = 4
+    MAX_CONCURRENT_WEATHER: int = 16
+    MAX_CONCURRENT_SQL: int = 4   # matches SQL_POOL_SIZE
+    MAX_CONCURRENT_RECOMMENDER: int = 8
 
 
 settings = Settings()
@@ -43,7 +134,11 @@ settings = Settings()
 def _override(name: str, default_val):
     env_val = os.getenv(name)
     if env_val is not None:
-        return env_val if not isinstance(default_val, bool) else env_val.lower() in {"1","true","yes","on"}
+        if isinstance(default_val, bool):
+            return env_val.lower() in {"1","true","yes","on"}
+        if isinstance(default_val, (int, float)):
+            return type(default_val)(env_val)
+        return env_val
     if _secrets is not None and hasattr(_secrets, name):
         return getattr(_secrets, name)
     return default_val
@@ -51,16 +146,96 @@ def _override(name: str, default_val):
 settings.OPENAI_API_KEY = _override("OPENAI_API_KEY", settings.OPENAI_API_KEY)
 settings.OPENAI_MODEL = _override("OPENAI_MODEL", settings.OPENAI_MODEL)
 settings.OPENAI_EMBEDDINGS_MODEL = _override("OPENAI_EMBEDDINGS_MODEL", settings.OPENAI_EMBEDDINGS_MODEL)
+settings.LLM_BACKEND = _override("LLM_BACKEND", settings.LLM_BACKEND)
+settings.LLM_MAX_CONNECTIONS = _override("LLM_MAX_CONNECTIONS", settings.LLM_MAX_CONNECTIONS)
+settings.LLM_TIMEOUT = _override("LLM_TIMEOUT", settings.LLM_TIMEOUT)
+
+settings.MODEL_NAME = _override("MODEL_NAME", settings.MODEL_NAME)
+settings.EMBEDDINGS_BACKEND = _override("EMBEDDINGS_BACKEND", settings.EMBEDDINGS_BACKEND)
+settings.EMBEDDINGS_BATCH_SIZE = _override("EMBEDDINGS_BATCH_SIZE", settings.EMBEDDINGS_BATCH_SIZE)
+settings.EMBEDDINGS_THREADS = _override("EMBEDDINGS_THREADS", settings.EMBEDDINGS_THREADS)
+settings.EMBEDDINGS_LOCAL_ONLY = _override("EMBEDDINGS_LOCAL_ONLY", settings.EMBEDDINGS_LOCAL_ONLY)
+settings.EMBEDDINGS_BATCH_WINDOW_MS = _override("EMBEDDINGS_BATCH_WINDOW_MS", settings.EMBEDDINGS_BATCH_WINDOW_MS)
+
+settings.EMBED_CACHE_PATH = _override("EMBED_CACHE_PATH", settings.EMBED_CACHE_PATH)
+settings.EMBED_CACHE_MAX_ENTRIES = _override("EMBED_CACHE_MAX_ENTRIES", settings.EMBED_CACHE_MAX_ENTRIES)
+settings.EMBED_CACHE_MEMORY_ENTRIES = _override("EMBED_CACHE_MEMORY_ENTRIES", settings.EMBED_CACHE_MEMORY_ENTRIES)
+settings.INGEST_BATCH_SIZE = _override("INGEST_BATCH_SIZE", settings.INGEST_BATCH_SIZE)
+settings.INGEST_CONCURRENCY = _override("INGEST_CONCURRENCY", settings.INGEST_CONCURRENCY)
+settings.INGEST_MAX_IN_FLIGHT = _override("INGEST_MAX_IN_FLIGHT", settings.INGEST_MAX_IN_FLIGHT)
+
+settings.RETRIEVAL_MODE = _override("RETRIEVAL_MODE", settings.RETRIEVAL_MODE)
+settings.RETRIEVAL_FETCH_K = _override("RETRIEVAL_FETCH_K", settings.RETRIEVAL_FETCH_K)
+settings.RETRIEVAL_PREFILTER = _override("RETRIEVAL_PREFILTER", settings.RETRIEVAL_PREFILTER)
+
+settings.ANSWER_CACHE_ENABLED = _override("ANSWER_CACHE_ENABLED", settings.ANSWER_CACHE_ENABLED)
+settings.ANSWER_CACHE_SIZE = _override("ANSWER_CACHE_SIZE", settings.ANSWER_CACHE_SIZE)
+settings.ANSWER_CACHE_TTL = _override("ANSWER_CACHE_TTL", settings.ANSWER_CACHE_TTL)
+settings.ANSWER_CACHE_THRESHOLD = _override("ANSWER_CACHE_THRESHOLD", settings.ANSWER_CACHE_THRESHOLD)
 
 settings.T2I_API_KEY = _override("T2I_API_KEY", settings.T2I_API_KEY)
 settings.T2I_MODEL = _override("T2I_MODEL", settings.T2I_MODEL)
-
+settings.T2I_QUEUE = _override("T2I_QUEUE", settings.T2I_QUEUE)
+settings.T2I_WORKERS = _override("T2I_WORKERS", settings.T2I_WORKERS)
+settings.T2I_MAX_PENDING = _override("T2I_MAX_PENDING", settings.T2I_MAX_PENDING)
+settings.T2I_JOB_HISTORY = _override("T2I_JOB_HISTORY", settings.T2I_JOB_HISTORY)
+settings.T2I_DOWNLOAD_TIMEOUT = _override("T2I_DOWNLOAD_TIMEOUT", settings.T2I_DOWNLOAD_TIMEOUT)
+settings.T2I_CACHE_MAX_MB = _override("T2I_CACHE_MAX_MB", settings.T2I_CACHE_MAX_MB)
+
+settings.INTENT_HINTS_PATH = _override("INTENT_HINTS_PATH", settings.INTENT_HINTS_PATH)
+settings.INTENT_CLASSIFIER = _override("INTENT_CLASSIFIER", settings.INTENT_CLASSIFIER)
+settings.INTENT_CLASSIFIER_THRESHOLD = _override("INTENT_CLASSIFIER_THRESHOLD", settings.INTENT_CLASSIFIER_THRESHOLD)
+
+settings.WEATHER_PROVIDER = _override("WEATHER_PROVIDER", settings.WEATHER_PROVIDER)
 settings.WEATHER_API_KEY = _override("WEATHER_API_KEY", settings.WEATHER_API_KEY)
+settings.WEATHER_BASE_URL = _override("WEATHER_BASE_URL", settings.WEATHER_BASE_URL)
+settings.WEATHER_TIMEOUT = _override("WEATHER_TIMEOUT", settings.WEATHER_TIMEOUT)
+settings.WEATHER_CACHE_SIZE = _override("WEATHER_CACHE_SIZE", settings.WEATHER_CACHE_SIZE)
+settings.WEATHER_CACHE_TTL = _override("WEATHER_CACHE_TTL", settings.WEATHER_CACHE_TTL)
+settings.WEATHER_DEFAULT_LOCATION = _override("WEATHER_DEFAULT_LOCATION", settings.WEATHER_DEFAULT_LOCATION)
+
+settings.MEMORY_MAX_TURNS = _override("MEMORY_MAX_TURNS", settings.MEMORY_MAX_TURNS)
+settings.MEMORY_SUMMARY_TURNS = _override("MEMORY_SUMMARY_TURNS", settings.MEMORY_SUMMARY_TURNS)
+settings.MEMORY_MESSAGE_CHARS = _override("MEMORY_MESSAGE_CHARS", settings.MEMORY_MESSAGE_CHARS)
+settings.MEMORY_PROMPT_TOKENS = _override("MEMORY_PROMPT_TOKENS", settings.MEMORY_PROMPT_TOKENS)
+settings.MEMORY_MAX_SESSIONS = _override("MEMORY_MAX_SESSIONS", settings.MEMORY_MAX_SESSIONS)
+settings.MEMORY_IDLE_TTL = _override("MEMORY_IDLE_TTL", settings.MEMORY_IDLE_TTL)
+settings.MEMORY_SPILL_PATH = _override("MEMORY_SPILL_PATH", settings.MEMORY_SPILL_PATH)
+settings.MEMORY_SPILL_TTL = _override("MEMORY_SPILL_TTL", settings.MEMORY_SPILL_TTL)
+
+settings.AGENT_WARMUP = _override("AGENT_WARMUP", settings.AGENT_WARMUP)
 
 settings.SQL_DB_PATH = _override("SQL_DB_PATH", settings.SQL_DB_PATH)
+settings.SQL_POOL_SIZE = _override("SQL_POOL_SIZE", settings.SQL_POOL_SIZE)
+settings.SQL_STATEMENT_CACHE = _override("SQL_STATEMENT_CACHE", settings.SQL_STATEMENT_CACHE)
+settings.SQL_MMAP_SIZE = _override("SQL_MMAP_SIZE", settings.SQL_MMAP_SIZE)
+settings.SQL_CACHE_SIZE_KB = _override("SQL_CACHE_SIZE_KB", settings.SQL_CACHE_SIZE_KB)
+settings.SQL_BATCH_SIZE = _override("SQL_BATCH_SIZE", settings.SQL_BATCH_SIZE)
+settings.SQL_MAX_ROWS = _override("SQL_MAX_ROWS", settings.SQL_MAX_ROWS)
+settings.SQL_TIMEOUT = _override("SQL_TIMEOUT", settings.SQL_TIMEOUT)
+settings.SQL_PREVIEW_ROWS = _override("SQL_PREVIEW_ROWS", settings.SQL_PREVIEW_ROWS)
+settings.SQL_BULK_BATCH = _override("SQL_BULK_BATCH", settings.SQL_BULK_BATCH)
+settings.SQL_WAL = _override("SQL_WAL", settings.SQL_WAL)
 settings.LOG_LEVEL = _override("LOG_LEVEL", settings.LOG_LEVEL)
+settings.METRICS_ENABLED = _override("METRICS_ENABLED", settings.METRICS_ENABLED)
 
 settings.RECOMMENDER_ONLINE_ENRICHMENT = _override("RECOMMENDER_ONLINE_ENRICHMENT", settings.RECOMMENDER_ONLINE_ENRICHMENT)
+settings.RECOMMENDER_CATALOG = _override("RECOMMENDER_CATALOG", settings.RECOMMENDER_CATALOG)
+settings.RECOMMENDER_CATALOG_TABLE = _override("RECOMMENDER_CATALOG_TABLE", settings.RECOMMENDER_CATALOG_TABLE)
+settings.RECOMMENDER_INDEX_DIR = _override("RECOMMENDER_INDEX_DIR", settings.RECOMMENDER_INDEX_DIR)
+settings.RECOMMENDER_REFIT_RATIO = _override("RECOMMENDER_REFIT_RATIO", settings.RECOMMENDER_REFIT_RATIO)
+settings.RECOMMENDER_BATCH_MAX_SCORES = _override("RECOMMENDER_BATCH_MAX_SCORES", settings.RECOMMENDER_BATCH_MAX_SCORES)
+settings.RECOMMENDER_LLM_CONCURRENCY = _override("RECOMMENDER_LLM_CONCURRENCY", settings.RECOMMENDER_LLM_CONCURRENCY)
+settings.RECOMMENDER_LLM_MODE = _override("RECOMMENDER_LLM_MODE", settings.RECOMMENDER_LLM_MODE)
+settings.RECOMMENDER_LLM_BUDGET_MS = _override("RECOMMENDER_LLM_BUDGET_MS", settings.RECOMMENDER_LLM_BUDGET_MS)
+settings.RECOMMENDER_LLM_CACHE_SIZE = _override("RECOMMENDER_LLM_CACHE_SIZE", settings.RECOMMENDER_LLM_CACHE_SIZE)
+settings.RECOMMENDER_LLM_CACHE_TTL = _override("RECOMMENDER_LLM_CACHE_TTL", settings.RECOMMENDER_LLM_CACHE_TTL)
+
+settings.MAX_CONCURRENT_LLM = _override("MAX_CONCURRENT_LLM", settings.MAX_CONCURRENT_LLM)
+settings.MAX_CONCURRENT_T2I = _override("MAX_CONCURRENT_T2I", settings.MAX_CONCURRENT_T2I)
+settings.MAX_CONCURRENT_WEATHER = _override("MAX_CONCURRENT_WEATHER", settings.MAX_CONCURRENT_WEATHER)
+settings.MAX_CONCURRENT_SQL = _override("MAX_CONCURRENT_SQL", settings.MAX_CONCURRENT_SQL)
+settings.MAX_CONCURRENT_RECOMMENDER = _override("MAX_CONCURRENT_RECOMMENDER", settings.MAX_CONCURRENT_RECOMMENDER)
 
 
 # Ensure LangChain/OpenAI SDK v1 picks up the key from env
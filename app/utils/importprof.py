@@ -0,0 +1,94 @@
+
+"""Where startup time goes: import cost per package and module, and agent build times.
+
+    python -m app.utils.importprof [--top 15] [--agents weather,sql | all] [module ...]
+
+Imports the modules (default app.controller) in a fresh interpreter under -X importtime and
+summarises its report; with --agents, also builds those agents through the Controller's
+registry and reports how long each took.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@dataclass
+class ImportRecord:
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+def parse_importtime(text: str) -> List[ImportRecord]:
+    records = []
+    for line in text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # the header line
+        name = parts[2]
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        records.append(ImportRecord(name.strip(), int(parts[0]), int(parts[1]), depth))
+    return records
+
+def profile(modules: Sequence[str], agents: Sequence[str] = ()) -> Tuple[List[ImportRecord], Dict[str, float]]:
+    """Import `modules` (then build `agents`, or every agent for ["all"]) in a child
+    interpreter; returns its import records and agent build times in seconds."""
+    code = "".join(f"import {m}\n" for m in modules)
+    if agents:
+        code += (
+            "import json\n"
+            "from app.controller import Controller\n"
+            "ctrl = Controller(warm_up='')\n"
+            f"names = {list(agents)!r}\n"
+            "for name in (ctrl.agents.names if names == ['all'] else names):\n"
+            "    ctrl.agents.get(name)\n"
+            "print(json.dumps(ctrl.agents.timings))\n"
+        )
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                          capture_output=True, text=True)
+    records = parse_importtime(proc.stderr)
+    if proc.returncode != 0:
+        errors = [l for l in proc.stderr.splitlines() if not l.startswith("import time:")]
+        raise RuntimeError("\n".join(errors[-5:]))
+    timings = json.loads(proc.stdout.strip().splitlines()[-1]) if agents else {}
+    return records, timings
+
+def report(records: List[ImportRecord], timings: Dict[str, float] = None, top: int = 15) -> str:
+    total = sum(r.cumulative_us for r in records if r.depth == 0)
+    by_package: Dict[str, int] = defaultdict(int)
+    for r in records:
+        by_package[r.name.split(".")[0]] += r.self_us
+    lines = [f"Imports: {total / 1000:.1f} ms over {len(records)} modules", "", "By package (self time):"]
+    for pkg, us in sorted(by_package.items(), key=lambda kv: -kv[1])[:top]:
+        lines.append(f"  {us / 1000:9.1f} ms  {100.0 * us / max(total, 1):5.1f}%  {pkg}")
+    lines += ["", "Slowest modules (self time):"]
+    for r in sorted(records, key=lambda r: -r.self_us)[:top]:
+        lines.append(f"  {r.self_us / 1000:9.1f} ms  {r.name}")
+    if timings:
+        lines += ["", "Agent construction (first use, imports included):"]
+        for name, s in timings.items():
+            lines.append(f"  {s * 1000:9.1f} ms  {name}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Report import and agent start-up cost.")
+    ap.add_argument("modules", nargs="*", default=["app.controller"])
+    ap.add_argument("--agents", default="", help='comma-separated agent names to build, or "all"')
+    ap.add_argument("--top", type=int, default=15)
+    args = ap.parse_args(argv)
+
+    agents = [a.strip() for a in args.agents.split(",") if a.strip()]
+    records, timings = profile(args.modules, agents)
+    print(report(records, timings, args.top))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+
+"""Per-stage latency spans, per-intent histograms and per-turn timings.
+
+    with metrics.turn() as timings:          # timings: {stage: ms} for this turn, or None
+        with metrics.span("retrieve"):
+            ...
+
+When METRICS_ENABLED is off, span() and turn() hand back one shared no-op object, so the
+instrumented code pays a function call and an attribute check and nothing else.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from concurrent.futures import Executor, Future
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .config import settings
+
+# Upper bounds in milliseconds; the last bucket is +Inf
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+_intent: ContextVar[str] = ContextVar("metrics_intent", default="none")
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("metrics_timings", default=None)
+# A turn's timings dict is shared with the pool threads its work is submitted to
+_timings_lock = threading.Lock()
+# Set in threads whose work is timed by the callers waiting on it (see silence())
+_silenced: ContextVar[bool] = ContextVar("metrics_silenced", default=False)
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.sum += ms
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Bucket upper bound at quantile q (0..1); coarse but free to compute."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return float(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else float("inf")
+        return float("inf")
+
+class Registry:
+    def __init__(self):
+        self._hists: Dict[Tuple[str, str], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, intent: str, stage: str, ms: float):
+        with self._lock:
+            h = self._hists.get((intent, stage))
+            if h is None:
+                h = self._hists[(intent, stage)] = Histogram()
+            h.observe(ms)
+
+    def reset(self):
+        with self._lock:
+            self._hists.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, dict]]:
+        out: Dict[str, Dict[str, dict]] = {}
+        with self._lock:
+            for (intent, stage), h in sorted(self._hists.items()):
+                out.setdefault(intent, {})[stage] = {
+                    "count": h.count,
+                    "sum_ms": round(h.sum, 3),
+                    "mean_ms": round(h.sum / h.count, 3) if h.count else 0.0,
+                    "p50_ms": h.quantile(0.50),
+                    "p95_ms": h.quantile(0.95),
+                    "p99_ms": h.quantile(0.99),
+                }
+        return out
+
+    def prometheus_text(self, name: str = "assistant_stage_latency_ms") -> str:
+        lines = [
+            f"# HELP {name} Latency of each Controller pipeline stage in milliseconds.",
+            f"# TYPE {name} histogram",
+        ]
+        with self._lock:
+            for (intent, stage), h in sorted(self._hists.items()):
+                labels = f'intent="{intent}",stage="{stage}"'
+                cum = 0
+                for bound, c in zip(BUCKETS_MS, h.counts):
+                    cum += c
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cum}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {h.count}')
+                lines.append(f"{name}_sum{{{labels}}} {h.sum:.3f}")
+                lines.append(f"{name}_count{{{labels}}} {h.count}")
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+class _Noop:
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP = _Noop()
+
+class _Span:
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        ms = (time.perf_counter() - self.t0) * 1000.0
+        timings = _timings.get()
+        if timings is None:
+            # Outside a turn (ingestion, benchmarks): record straight away
+            registry.observe(_intent.get(), self.name, ms)
+        else:
+            with _timings_lock:
+                timings[self.name] = timings.get(self.name, 0.0) + ms
+        return False
+
+class _Turn:
+    __slots__ = ("t0", "timings", "_tokens")
+
+    def __enter__(self) -> Dict[str, float]:
+        self.timings: Dict[str, float] = {}
+        self._tokens = (_timings.set(self.timings), _intent.set("none"))
+        self.t0 = time.perf_counter()
+        return self.timings
+
+    def __exit__(self, *exc):
+        ms = (time.perf_counter() - self.t0) * 1000.0
+        self.timings["total"] = ms
+        # Stages are recorded once per turn, under the intent the turn was finally routed to
+        intent = _intent.get()
+        for stage, stage_ms in self.timings.items():
+            registry.observe(intent, stage, stage_ms)
+        _timings.reset(self._tokens[0])
+        _intent.reset(self._tokens[1])
+        return False
+
+def span(name: str):
+    return _Span(name) if settings.METRICS_ENABLED and not _silenced.get() else _NOOP
+
+def silence():
+    """Make span() a no-op in the current thread's context from here on. For worker threads
+    serving many turns at once (e.g. a MicroBatcher's), whose callers time the stage instead."""
+    _silenced.set(True)
+
+def turn():
+    return _Turn() if settings.METRICS_ENABLED else _NOOP
+
+def set_intent(intent: str):
+    """Label the current turn's stages with its routed intent (applies to the whole turn)."""
+    if settings.METRICS_ENABLED:
+        _intent.set(intent)
+
+def submit(executor: Executor, fn: Callable[..., Any], *args) -> Future:
+    """executor.submit that carries the current turn and intent into the worker thread,
+    so spans recorded there count towards the turn that asked for the work."""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+def snapshot():
+    return registry.snapshot()
+
+def prometheus_text() -> str:
+    return registry.prometheus_text()
@@ -0,0 +1,22 @@
+
+from typing import Dict, List, Sequence
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Linear-interpolated percentile (q in 0..100) of an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    pos = (len(sorted_values) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+def summarize(values: List[float], quantiles=(50, 90, 95, 99)) -> Dict[str, float]:
+    vals = sorted(values)
+    out = {"count": len(vals)}
+    if not vals:
+        return out
+    out["mean"] = sum(vals) / len(vals)
+    for q in quantiles:
+        out[f"p{q}"] = percentile(vals, q)
+    out["max"] = vals[-1]
+    return out
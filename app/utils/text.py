@@ -1,6 +1,13 @@
-
+import json
 import re
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from .config import settings
 
+# intent -> hint phrases, in tie-break priority order. A phrase may be given as
+# (phrase, weight); plain strings weigh 1.0, and a phrase listed twice counts for the first
+# intent. INTENT_HINTS_PATH can extend or replace these.
 SYSTEM_INTENT_HINTS = {
     "rag": ["from the document", "according to", "cite", "source"],
     "t2i": ["draw", "image", "generate a picture", "logo", "icon"],
@@ -9,18 +16,157 @@ SYSTEM_INTENT_HINTS = {
     "recommender": ["recommend", "suggest", "similar"]
 }
 
+Hint = Union[str, Tuple[str, float]]
+
+# Inflections accepted after a hint's last word: "recommend" also matches "recommended",
+# "recommendations", ...; a trailing "y" becomes "y" / "ies" instead
+_SUFFIXES = ("", "s", "es", "d", "ed", "ing", "ings", "ion", "ions", "ation", "ations")
+
+# A real SELECT statement, not a sentence that happens to contain the word "select". The
+# router sends these to the SQL agent and the controller only runs text that matches, so
+# "with the database, show tables" is neither routed nor run. Anything else that slips
+# through is refused by the read-only connection
+_SQL_STATEMENT = re.compile(
+    r"^\s*(?:select\b.*\bfrom\b|select\s+(?:[\d'\"(*]|\w+\s*\()|"
+    r"with\s+(?:recursive\s+)?\w+\s*(?:\([^)]*\)\s*)?as\s*\(.*\bselect\b)",
+    re.IGNORECASE | re.DOTALL,
+)
+
+def is_read_query(text: str) -> bool:
+    return _SQL_STATEMENT.match(text) is not None
+
 def normalize(s: str) -> str:
     return re.sub(r"\s+", " ", s.strip())
 
+def _forms(phrase: str) -> List[str]:
+    words = phrase.lower().split()
+    head, last = words[:-1], words[-1]
+    if last.endswith("y") and len(last) > 2:
+        lasts = [last, last[:-1] + "ies"]
+    else:
+        lasts = [last + suf for suf in _SUFFIXES]
+    return [" ".join(head + [w]) for w in lasts]
+
+def _trie_regex(strings: Sequence[str]) -> str:
+    """Alternation factored by common prefix, so matching at each position follows one
+    branch per character (an automaton walk) instead of trying every phrase in turn."""
+    trie: Dict = {}
+    for s in strings:
+        node = trie
+        for ch in s:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: Dict) -> str:
+        alts = [re.escape(ch) + emit(sub) for ch, sub in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        # Greedy optional tail: the longest phrase at a position wins
+        return f"(?:{body})?" if "" in node else body
+
+    return emit(trie)
+
+def _trigrams(word: str) -> List[str]:
+    w = f"<{word}>"
+    return [w[i:i + 3] for i in range(len(w) - 2)]
+
+class IntentRouter:
+    """Every inflected form of every hint phrase, compiled into one word-bounded trie regex;
+    each match adds its phrase's weight to its intent and the highest total wins (ties go
+    to the earlier intent).
+
+    With `classifier=True`, turns that match no hint fall back to a nearest-neighbour vote
+    over hashed character trigrams of the hint words, which catches typos and word forms
+    the regex doesn't ("forcast", "pictures"). Scores below `threshold` stay "chat"."""
+
+    DIM = 1 << 12
+
+    def __init__(self, hints: Dict[str, Sequence[Hint]], classifier: bool = False, threshold: float = 0.6):
+        self.intents = list(hints)
+        self._rank = {intent: -i for i, intent in enumerate(self.intents)}
+        self._forms: Dict[str, Tuple[str, float]] = {}
+        entries = []
+        for intent, phrases in hints.items():
+            for p in phrases:
+                phrase, weight = (p, 1.0) if isinstance(p, str) else (p[0], float(p[1]))
+                if not phrase.strip():
+                    continue
+                entries.append((phrase, intent, weight))
+                for form in _forms(phrase):
+                    self._forms.setdefault(form, (intent, weight))
+        self._pattern = re.compile(r"\b(?:" + _trie_regex(list(self._forms)) + r")\b") if self._forms else None
+        self.threshold = threshold
+        self._vectors = self._word_labels = None
+        if classifier:
+            self._build_classifier(entries)
+
+    def _build_classifier(self, entries):
+        words, labels = [], []
+        for phrase, intent, _ in entries:
+            for w in re.findall(r"[a-z]{4,}", phrase.lower()):
+                if w not in words:
+                    words.append(w)
+                    labels.append(intent)
+        if words:
+            self._vectors = self._embed(words)
+            self._word_labels = labels
+
+    def _embed(self, words: List[str]):
+        import numpy as np
+
+        mat = np.zeros((len(words), self.DIM), dtype=np.float32)
+        for r, w in enumerate(words):
+            for g in _trigrams(w):
+                mat[r, zlib.crc32(g.encode("utf-8")) % self.DIM] += 1.0
+        mat /= np.maximum(np.linalg.norm(mat, axis=1, keepdims=True), 1e-12)
+        return mat
+
+    def scores(self, text: str) -> Dict[str, float]:
+        totals: Dict[str, float] = {}
+        if self._pattern is not None:
+            for form in self._pattern.findall(" ".join(text.lower().split())):
+                intent, weight = self._forms[form]
+                totals[intent] = totals.get(intent, 0.0) + weight
+        return totals
+
+    def _classify(self, text: str) -> Optional[str]:
+        words = re.findall(r"[a-z]{4,}", text.lower())
+        if self._vectors is None or not words:
+            return None
+        sims = self._embed(words) @ self._vectors.T
+        best = sims.max(axis=0)
+        j = int(best.argmax())
+        return self._word_labels[j] if best[j] >= self.threshold else None
+
+    def route(self, text: str) -> str:
+        if _SQL_STATEMENT.match(text):
+            return "sql"
+        totals = self.scores(text)
+        if totals:
+            return max(totals, key=lambda i: (totals[i], self._rank[i]))
+        return self._classify(text) or "chat"
+
+def load_hints(path: str = "") -> Dict[str, List[Hint]]:
+    """SYSTEM_INTENT_HINTS, with intents from the JSON file at `path` added or replaced."""
+    hints: Dict[str, List[Hint]] = {k: list(v) for k, v in SYSTEM_INTENT_HINTS.items()}
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            for intent, phrases in json.load(f).items():
+                hints[intent] = [p if isinstance(p, str) else tuple(p) for p in phrases]
+    return hints
+
+def configure(hints: Dict[str, Sequence[Hint]] = None, classifier: bool = None):
+    """Recompile the router used by detect_intent, e.g. after changing the hint table."""
+    global _router
+    _router = IntentRouter(
+        hints if hints is not None else load_hints(settings.INTENT_HINTS_PATH),
+        classifier=settings.INTENT_CLASSIFIER if classifier is None else classifier,
+        threshold=settings.INTENT_CLASSIFIER_THRESHOLD,
+    )
+
+_router: IntentRouter = None
+configure()
+
 def detect_intent(user_text: str) -> str:
-    t = user_text.lower()
-    
-    # Check for SQL queries first (most specific)
-    if t.startswith("select") or "select" in t:
-        return "sql"
-    
-    # Check other intents
-    for intent, keys in SYSTEM_INTENT_HINTS.items():
-        if any(k in t for k in keys):
-            return intent
-    return "chat"
+    return _router.route(user_text)
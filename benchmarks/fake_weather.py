@@ -0,0 +1,68 @@
+
+"""A local stand-in for the weatherapi.com /current.json endpoint.
+
+    with fake_weather(latency_ms=30) as (base_url, server):
+        settings.WEATHER_BASE_URL = base_url
+        ...
+        server.calls  # requests served
+
+Each reading is derived from the city name, so repeated lookups agree.
+"""
+
+import contextlib
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CONDITIONS = ["Sunny", "Partly cloudy", "Overcast", "Light rain", "Thunderstorm", "Mist"]
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so client-side pooling is exercised
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        q = parse_qs(url.query).get("q", [""])[0]
+        if url.path.rstrip("/").split("/")[-1] != "current.json" or not q:
+            self._send(400, {"error": {"code": 1003, "message": "Parameter q is missing."}})
+            return
+        time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.calls += 1
+        h = zlib.crc32(q.lower().encode("utf-8"))
+        self._send(200, {
+            "location": {"name": q.title()},
+            "current": {
+                "temp_c": round(-5 + (h % 400) / 10.0, 1),
+                "humidity": h % 101,
+                "condition": {"text": CONDITIONS[h % len(CONDITIONS)]},
+            },
+        })
+
+    def _send(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+@contextlib.contextmanager
+def fake_weather(latency_ms: float = 0.0):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.latency = latency_ms / 1000.0
+    server.calls = 0
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/v1", server
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,319 @@
+
+"""Offline benchmark suite for the router, every agent and the Controller.
+
+    python -m benchmarks.run [--quick] [--only intent,retriever,...] [-o results.json]
+                             [--baseline old.json --threshold 0.15]
+
+LLM and embeddings use the in-process stubs, images use the Pillow stub renderer, and all
+data (docs, indexes, caches, SQLite) is generated under a temporary directory, so runs are
+repeatable without network access or API keys. Results are written as JSON; with
+--baseline, any metric that got worse by more than --threshold fails the run (exit 1).
+Metrics ending in _per_s are higher-is-better; _ms / _s are lower-is-better.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.utils.config import settings  # noqa: E402
+from app.utils.stats import summarize  # noqa: E402
+
+from .synthetic import WORDS, catalog, sales_rows, user_turns, write_docs  # noqa: E402
+
+SIZES = {
+    "full": {"retriever": [100, 1000, 5000], "recommender": [1000, 10000, 100000], "sql": [10000, 100000, 1000000]},
+    "quick": {"retriever": [50, 200], "recommender": [500, 5000], "sql": [10000, 50000]},
+}
+
+def use_offline_backends(tmp: Path):
+    settings.LLM_BACKEND = "stub"
+    settings.EMBEDDINGS_BACKEND = "stub"
+    settings.EMBEDDINGS_BATCH_WINDOW_MS = 0.0
+    settings.T2I_API_KEY = ""
+    settings.RECOMMENDER_ONLINE_ENRICHMENT = False
+    settings.EMBED_CACHE_PATH = str(tmp / "embed_cache.sqlite")
+    settings.INDEX_DIR = str(tmp / "index")
+    settings.DOCS_DIR = str(tmp / "docs")
+    settings.SQL_DB_PATH = str(tmp / "bench.db")
+
+def latencies_ms(fn: Callable, args: List) -> List[float]:
+    out = []
+    for a in args:
+        t0 = time.perf_counter()
+        fn(a)
+        out.append((time.perf_counter() - t0) * 1000.0)
+    return out
+
+def lat_summary(values: List[float], prefix: str = "") -> Dict[str, float]:
+    s = summarize(values)
+    return {f"{prefix}{k}_ms": round(v, 4) for k, v in s.items() if k != "count"}
+
+# ---- benchmarks ---------------------------------------------------------
+
+def bench_intent(sizes, tmp: Path) -> Dict[str, dict]:
+    from app.utils.text import detect_intent
+
+    texts = user_turns(1000)
+    n = 50000
+    t0 = time.perf_counter()
+    for i in range(n):
+        detect_intent(texts[i % len(texts)])
+    elapsed = time.perf_counter() - t0
+    return {"detect_intent": {"calls_per_s": round(n / elapsed, 1), "mean_us": round(elapsed / n * 1e6, 3)}}
+
+def bench_retriever(sizes, tmp: Path) -> Dict[str, dict]:
+    from app.rag.retriever import Retriever
+
+    out = {}
+    rng = random.Random(1)
+    queries = [" ".join(rng.sample(WORDS, 3)) for _ in range(100)]
+    for n in sizes:
+        settings.DOCS_DIR = str(write_docs(tmp / f"docs_{n}", n))
+        settings.EMBED_CACHE_PATH = str(tmp / f"embed_cache_{n}.sqlite")
+        index_dir = str(tmp / f"index_{n}")
+
+        t0 = time.perf_counter()
+        r = Retriever(index_dir, settings.MODEL_NAME)
+        build_s = time.perf_counter() - t0
+        ingest = r.last_ingest
+        t0 = time.perf_counter()
+        r = Retriever(index_dir, settings.MODEL_NAME)
+        warm_s = time.perf_counter() - t0
+
+        res = {"build_s": round(build_s, 4), "warm_start_s": round(warm_s, 4),
+               "chunks": ingest.chunks, "ingest_chunks_per_s": round(ingest.chunks_per_sec, 1)}
+        for mode in ("vector", "lexical", "hybrid"):
+            res.update(lat_summary(latencies_ms(lambda q: r.search(q, k=4, mode=mode), queries), f"{mode}_"))
+        out[f"retriever_{n}"] = res
+    return out
+
+def bench_recommender(sizes, tmp: Path) -> Dict[str, dict]:
+    from app.agents.recommender_agent import RecommenderAgent
+    from .synthetic import PRODUCT_ADJS, PRODUCT_NOUNS
+
+    rng = random.Random(2)
+    queries = [f"recommend {rng.choice(PRODUCT_ADJS)} {rng.choice(PRODUCT_NOUNS)}" for _ in range(200)]
+    out = {}
+    for n in sizes:
+        items = catalog(n)
+        index_dir = str(tmp / f"rec_index_{n}")
+        t0 = time.perf_counter()
+        agent = RecommenderAgent(items=items, index_dir=index_dir)
+        build_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        agent = RecommenderAgent(items=items, index_dir=index_dir)
+        warm_s = time.perf_counter() - t0
+        res = {"build_s": round(build_s, 4), "warm_start_s": round(warm_s, 4)}
+        res.update(lat_summary(latencies_ms(lambda q: agent.run(q, k=5), queries), "run_"))
+        t0 = time.perf_counter()
+        agent.run_batch(queries, k=5)
+        res["batch_queries_per_s"] = round(len(queries) / (time.perf_counter() - t0), 1)
+        out[f"recommender_{n}"] = res
+    return out
+
+def bench_sql(sizes, tmp: Path) -> Dict[str, dict]:
+    from app.agents.sql_agent import SQLAgent
+
+    out = {}
+    for n in sizes:
+        settings.SQL_DB_PATH = str(tmp / f"sql_{n}.db")
+        agent = SQLAgent()
+        agent.ensure_schema()
+        agent.con.execute("DROP TABLE IF EXISTS big_sales;")
+        agent.con.execute("CREATE TABLE big_sales(id INTEGER, item VARCHAR, qty INTEGER, price FLOAT);")
+        t0 = time.perf_counter()
+        agent.bulk_load("big_sales", sales_rows(n), indexes=("item",))
+        res = {"load_s": round(time.perf_counter() - t0, 4)}
+        t0 = time.perf_counter()
+        SQLAgent().ensure_schema()
+        res["restart_s"] = round(time.perf_counter() - t0, 4)
+        queries = {
+            "count": "SELECT COUNT(*) FROM big_sales",
+            "group": "SELECT item, SUM(qty), AVG(price) FROM big_sales GROUP BY item",
+            "limit": "SELECT * FROM big_sales LIMIT 100",
+            "scan": "SELECT * FROM big_sales WHERE item = 'apple'",
+        }
+        for name, sql in queries.items():
+            reps = 3 if name == "scan" else 10
+            res.update(lat_summary(latencies_ms(agent.run, [sql] * reps), f"{name}_"))
+        out[f"sql_{n}"] = res
+    return out
+
+def bench_image(sizes, tmp: Path) -> Dict[str, dict]:
+    from app.t2i.image_gen import ImageGenerator
+
+    gen = ImageGenerator(out_dir=str(tmp / "images"))
+    # Distinct prompts so every render misses the cache; then the same prompts again, all hits
+    prompts = [gen.build_prompt(subject=f"{s} #{i}")
+               for i in range(5) for s in ["a cat", "a dog", "a sunset", "a city"]]
+    with contextlib.redirect_stdout(io.StringIO()):  # the stub path logs the missing key
+        res = lat_summary(latencies_ms(gen.generate, prompts), "render_")
+        res.update(lat_summary(latencies_ms(gen.generate, prompts), "cached_"))
+    return {"image_stub": res}
+
+def bench_weather(sizes, tmp: Path) -> Dict[str, dict]:
+    from concurrent.futures import ThreadPoolExecutor
+
+    from app.agents.weather_agent import WeatherAgent, WeatherAPIProvider
+    from .fake_weather import fake_weather
+
+    # Bursty and skewed: a few cities take most of the traffic, phrased different ways
+    rng = random.Random(4)
+    cities = ["Singapore", "London", "New York", "Paris", "Tokyo", "Sydney", "Berlin", "Dubai",
+              "Toronto", "Mumbai", "Seoul", "Madrid", "Rome", "Cairo", "Lima", "Oslo"]
+    forms = ["weather in {c}", "What's the weather like in {c} today?", "{c} weather", "temperature in {c}",
+             "forecast for {lc}"]
+    weights = [1.0 / (i + 1) for i in range(len(cities))]
+    turns = [rng.choice(forms).format(c=c, lc=c.lower()) for c in rng.choices(cities, weights, k=2000)]
+    with fake_weather(latency_ms=20) as (base_url, server):
+        agent = WeatherAgent(provider=WeatherAPIProvider(api_key="bench", base_url=base_url))
+        with ThreadPoolExecutor(max_workers=settings.MAX_CONCURRENT_WEATHER) as pool:
+            t0 = time.perf_counter()
+            lat = list(pool.map(lambda t: latencies_ms(agent.run, [t])[0], turns))
+            wall = time.perf_counter() - t0
+        res = {"lookups_per_s": round(len(turns) / wall, 1), "provider_calls": server.calls}
+    res.update(lat_summary(lat, "lookup_"))
+    return {"weather": res}
+
+def bench_controller(sizes, tmp: Path) -> Dict[str, dict]:
+    from app.controller import Controller
+    from app.schemas import Turn
+    from app.utils.text import detect_intent, normalize
+
+    settings.DOCS_DIR = str(write_docs(tmp / "docs_e2e", 50))
+    settings.INDEX_DIR = str(tmp / "index_e2e")
+    settings.SQL_DB_PATH = str(tmp / "e2e.db")
+    turns = user_turns(300, seed=3)
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        ctrl = Controller()
+        init_s = time.perf_counter() - t0
+        # Agents build on first use; build them all here so turns_per_s measures serving only
+        t0 = time.perf_counter()
+        ctrl.agents.warm_up().join()
+        warm_up_s = time.perf_counter() - t0
+        by_intent: Dict[str, List[float]] = {}
+        t0 = time.perf_counter()
+        for text in turns:
+            t1 = time.perf_counter()
+            ctrl.handle(Turn(user_text=text))
+            by_intent.setdefault(detect_intent(normalize(text)), []).append((time.perf_counter() - t1) * 1000.0)
+        wall = time.perf_counter() - t0
+    res = {"init_s": round(init_s, 4), "warm_up_s": round(warm_up_s, 4), "turns_per_s": round(len(turns) / wall, 1)}
+    for intent, vals in sorted(by_intent.items()):
+        res.update(lat_summary(vals, f"{intent}_"))
+    return {"controller": res}
+
+BENCHES = {
+    "intent": bench_intent,
+    "retriever": bench_retriever,
+    "recommender": bench_recommender,
+    "sql": bench_sql,
+    "image": bench_image,
+    "weather": bench_weather,
+    "controller": bench_controller,
+}
+
+# ---- comparison ---------------------------------------------------------
+
+def _direction(metric: str) -> int:
+    if metric.endswith("_per_s"):
+        return 1
+    if metric.endswith(("_ms", "_s", "_us")):
+        return -1
+    return 0
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[str]:
+    regressions = []
+    for bench, cur in current["results"].items():
+        base = baseline.get("results", {}).get(bench, {})
+        for metric, val in cur.items():
+            old = base.get(metric)
+            d = _direction(metric)
+            if not d or not isinstance(val, (int, float)) or not isinstance(old, (int, float)) or old <= 0:
+                continue
+            change = (val - old) / old
+            if (d < 0 and change > threshold) or (d > 0 and change < -threshold):
+                regressions.append(f"{bench}.{metric}: {old} -> {val} ({change:+.1%})")
+    return regressions
+
+def _git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Run the offline benchmark suite.")
+    ap.add_argument("--quick", action="store_true", help="smaller sizes for a fast smoke run")
+    ap.add_argument("--only", help=f"comma-separated subset of: {','.join(BENCHES)}")
+    ap.add_argument("-o", "--output", help="results JSON (default benchmarks/results/<timestamp>.json)")
+    ap.add_argument("--baseline", help="previous results JSON to compare against")
+    ap.add_argument("--threshold", type=float, default=0.15, help="allowed relative regression")
+    args = ap.parse_args(argv)
+
+    names = args.only.split(",") if args.only else list(BENCHES)
+    unknown = [n for n in names if n not in BENCHES]
+    if unknown:
+        ap.error(f"unknown benchmark(s): {', '.join(unknown)}")
+    sizes = SIZES["quick" if args.quick else "full"]
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    output = Path(args.output or ROOT / "benchmarks" / "results" / f"{stamp}.json").resolve()
+
+    results: Dict[str, dict] = {}
+    with tempfile.TemporaryDirectory(prefix="assistant-bench-") as tmpdir:
+        tmp = Path(tmpdir)
+        use_offline_backends(tmp)
+        cwd = os.getcwd()
+        os.chdir(tmp)  # anything written to a relative path (e.g. outputs/images) stays in tmp
+        try:
+            for name in names:
+                print(f"▶ {name}", file=sys.stderr)
+                results.update(BENCHES[name](sizes.get(name), tmp))
+        finally:
+            os.chdir(cwd)
+
+    doc = {
+        "meta": {
+            "timestamp": stamp,
+            "git": _git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(doc, indent=2) + "\n", encoding="utf-8")
+    print(json.dumps(results, indent=2))
+    print(f"Results written to {output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(doc, baseline, args.threshold)
+        if regressions:
+            print("Regressions beyond threshold:", file=sys.stderr)
+            for r in regressions:
+                print(f"  {r}", file=sys.stderr)
+            sys.exit(1)
+        print("No regressions beyond threshold.", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
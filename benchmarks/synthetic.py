@@ -0,0 +1,63 @@
+
+"""Deterministic synthetic data for the benchmark suite."""
+
+import random
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+WORDS = (
+    "model data learning neural network training inference vector index query retrieval "
+    "embedding token context prompt answer source document chunk latency throughput cache "
+    "memory batch stream server client request response agent router intent weather image "
+    "sales product employee price stock category department salary python code test bench "
+    "wireless bluetooth running shoes keyboard tactile compact breathable lightweight travel"
+).split()
+
+PRODUCT_NOUNS = "headphones shoes keyboard mouse monitor laptop backpack jacket bottle lamp chair desk".split()
+PRODUCT_ADJS = (
+    "wireless bluetooth lightweight breathable tactile compact quiet rgb ergonomic waterproof "
+    "foldable portable durable cushioned insulated adjustable premium budget travel office"
+).split()
+
+def sentence(rng: random.Random, n: int = 12) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+def write_docs(root: Path, n_docs: int, paragraphs: int = 4, seed: int = 0) -> Path:
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    for i in range(n_docs):
+        text = "\n\n".join(" ".join(sentence(rng) for _ in range(5)) for _ in range(paragraphs))
+        (root / f"doc_{i:06d}.txt").write_text(text, encoding="utf-8")
+    return root
+
+def catalog(n_items: int, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    items = []
+    for i in range(n_items):
+        noun = rng.choice(PRODUCT_NOUNS)
+        adjs = rng.sample(PRODUCT_ADJS, 4)
+        items.append({"id": i + 1, "title": f"{adjs[0].capitalize()} {noun} {i}", "desc": " ".join(adjs[1:] + [noun])})
+    return items
+
+def sales_rows(n_rows: int, seed: int = 0) -> Iterator[tuple]:
+    rng = random.Random(seed)
+    items = ["apple", "pear", "banana", "orange", "grape", "kiwi", "mango", "plum"]
+    for i in range(n_rows):
+        yield (i + 1, rng.choice(items), rng.randint(1, 20), round(rng.uniform(0.2, 5.0), 2))
+
+def user_turns(n: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    templates = [
+        "What does the document say about {w}?",
+        "According to the sources, how does {w} work?",
+        "draw a {w} at sunset",
+        "weather in singapore",
+        "SELECT item, SUM(qty) FROM sales GROUP BY item",
+        "recommend {a} {n}",
+        "hello there",
+    ]
+    out = []
+    for _ in range(n):
+        t = rng.choice(templates)
+        out.append(t.format(w=rng.choice(WORDS), a=rng.choice(PRODUCT_ADJS), n=rng.choice(PRODUCT_NOUNS)))
+    return out
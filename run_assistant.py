@@ -18,6 +18,7 @@ if script_dir not in sys.path:
 try:
     from app.controller import Controller
     from app.schemas import Turn
+    from app.t2i.jobs import describe
     
     def main():
         ctrl = Controller()
@@ -27,10 +28,14 @@ try:
                 user = input("🧑 You: ").strip()
                 if not user: 
                     continue
-                result = ctrl.handle(Turn(user_text=user))
-                print("\n🤖 Assistant:\n", result.response_text)
-                if result.image_path:
-                    print(f"[🖼️ Image saved at: {result.image_path}]\n")
+                if user.startswith("/image"):
+                    print(describe(ctrl.image_status(user[len("/image"):].strip())))
+                    continue
+                # Tokens are printed as they arrive; image replies already carry their path
+                print("\n🤖 Assistant:\n", end=" ", flush=True)
+                for piece in ctrl.handle_stream(Turn(user_text=user)):
+                    print(piece, end="", flush=True)
+                print()
         except KeyboardInterrupt:
             print("\n👋 Goodbye!")
     
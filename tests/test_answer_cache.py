@@ -0,0 +1,33 @@
+from app.rag import qa
+from app.rag.answer_cache import AnswerCache
+from app.utils.config import settings
+
+class _NoEmbeddings:
+    def embed_query(self, text):
+        raise AssertionError("lexical mode must not embed the query")
+
+class _LexicalRetriever:
+    version = "v1"
+    embeddings = _NoEmbeddings()
+
+    def __init__(self):
+        self.searches = 0
+
+    def search(self, query, k=4):
+        self.searches += 1
+        return [{"text": "alpha", "meta": {"source": "a.txt"}, "score": 1.0}]
+
+def test_lexical_mode_caches_without_embedding(monkeypatch):
+    monkeypatch.setattr(settings, "RETRIEVAL_MODE", "lexical")
+    monkeypatch.setattr(settings, "LLM_BACKEND", "stub")
+    retriever, cache = _LexicalRetriever(), AnswerCache(maxsize=8, ttl=60, threshold=0.9)
+    first = qa.compose_answer("what is alpha?", retriever, cache)
+    second = qa.compose_answer("what is alpha?", retriever, cache)
+    assert first == second
+    assert retriever.searches == 1
+
+def test_entries_without_vectors_are_skipped_by_semantic_lookup():
+    cache = AnswerCache(maxsize=8, ttl=60, threshold=0.5)
+    cache.put("q1", None, "v1", "a1", [])
+    assert cache.get("q1", None, "v1") == ("a1", [])
+    assert cache.get("q2", [1.0, 0.0], "v1") is None
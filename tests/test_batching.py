@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.utils.batching import MicroBatcher
+
+def _submit_all(batcher, items):
+    with ThreadPoolExecutor(max_workers=len(items)) as pool:
+        futures = [pool.submit(batcher.submit, i) for i in items]
+        return [f.exception(timeout=5) or f.result() for f in futures]
+
+def test_results_are_matched_to_callers():
+    batcher = MicroBatcher(lambda items: [i * 10 for i in items], max_batch=8, window_ms=20)
+    assert _submit_all(batcher, list(range(6))) == [0, 10, 20, 30, 40, 50]
+
+def test_short_result_list_fails_every_caller():
+    batcher = MicroBatcher(lambda items: items[:-1], max_batch=8, window_ms=50)
+    out = _submit_all(batcher, list(range(4)))
+    assert all(isinstance(r, ValueError) for r in out)
+
+def test_exception_from_fn_reaches_every_caller():
+    def boom(items):
+        raise RuntimeError("backend down")
+
+    batcher = MicroBatcher(boom, max_batch=8, window_ms=20)
+    out = _submit_all(batcher, list(range(3)))
+    assert all(isinstance(r, RuntimeError) for r in out)
+
+def test_worker_survives_a_failed_batch():
+    calls = []
+
+    def flaky(items):
+        calls.append(len(items))
+        if len(calls) == 1:
+            raise RuntimeError("first batch fails")
+        return items
+
+    batcher = MicroBatcher(flaky, max_batch=1, window_ms=0)
+    with pytest.raises(RuntimeError):
+        batcher.submit("a")
+    assert batcher.submit("b") == "b"
@@ -0,0 +1,45 @@
+from app.rag.bm25 import BM25Index, reciprocal_rank_fusion, tokenize
+
+def _index():
+    idx = BM25Index()
+    idx.add("cats", "cats purr and cats nap in the sun")
+    idx.add("dogs", "dogs bark at the mail carrier")
+    idx.add("both", "cats and dogs can share a home")
+    idx.add("long", "cats " + "filler words about nothing in particular " * 10)
+    return idx
+
+def test_tokenize_drops_stopwords_and_punctuation():
+    assert tokenize("What is the Weather, in Paris?") == ["weather", "paris"]
+
+def test_ranking_follows_term_frequency_rarity_and_length():
+    idx = _index()
+    ranked = [doc for doc, _ in idx.search("cats", k=4)]
+    assert ranked[0] == "cats"            # two mentions in a short chunk
+    assert ranked[-1] == "long"           # one mention diluted by length
+    assert [d for d, _ in idx.search("bark", k=4)] == ["dogs"]
+    # "dogs" is rarer than "cats", so the chunk with both ranks above the cats-only ones
+    assert idx.search("cats dogs", k=1)[0][0] == "both"
+    assert idx.search("unicorns") == []
+
+def test_remove_and_re_add_keep_statistics_consistent():
+    idx = _index()
+    idx.remove("cats")
+    assert "cats" not in [d for d, _ in idx.search("cats purr", k=4)]
+    assert "purr" not in idx.postings
+    idx.add("dogs", "dogs dogs dogs")  # replaces the earlier version
+    assert len(idx) == 3
+    assert idx.total_len == sum(idx.doc_len.values())
+    assert idx.doc_terms["dogs"] == {"dogs": 3}
+
+def test_save_and_load_round_trip(tmp_path):
+    idx = _index()
+    path = tmp_path / "bm25.pkl"
+    idx.save(path)
+    loaded = BM25Index.load(path)
+    assert loaded.postings == idx.postings and loaded.total_len == idx.total_len
+    assert loaded.search("cats dogs", k=4) == idx.search("cats dogs", k=4)
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "b", "d"]])
+    assert [d for d, _ in fused] == ["c", "b", "a", "d"]
+    assert fused[1][1] == 2 / 62 and fused[2][1] == 1 / 61
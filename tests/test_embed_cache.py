@@ -0,0 +1,29 @@
+from app.rag import embed_cache
+from app.rag.embed_cache import EmbeddingCache
+
+def _last_used(cache, key):
+    return cache.con.execute("SELECT last_used FROM embeddings WHERE key=?;", (key,)).fetchone()[0]
+
+def test_memory_hits_refresh_last_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(embed_cache, "TOUCH_BATCH", 1)
+    cache = EmbeddingCache(str(tmp_path / "e.sqlite"), max_entries=10, memory_entries=10)
+    cache.put_many({"hot": [1.0], "cold": [2.0]})
+    before = _last_used(cache, "hot")
+    assert cache.get_many(["hot"]) == {"hot": [1.0]}  # served from memory
+    assert _last_used(cache, "hot") > before
+    assert _last_used(cache, "cold") == before
+
+def test_hot_vector_survives_eviction(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "e.sqlite"), max_entries=1, memory_entries=10)
+    cache.put_many({"hot": [1.0]})
+    cache.put_many({"cold": [2.0]})
+    cache.get_many(["hot"])
+    cache._evict()
+    keys = [k for (k,) in cache.con.execute("SELECT key FROM embeddings;")]
+    assert keys == ["hot"]
+
+def test_explicit_zero_is_respected(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "e.sqlite"), max_entries=0, memory_entries=0)
+    assert cache.max_entries == 0
+    cache.put_many({"a": [1.0]})
+    assert len(cache.memory) == 0
@@ -0,0 +1,46 @@
+import pytest
+
+from app.t2i.image_gen import ImageGenerator
+from app.utils.config import settings
+
+class _BrokenResponse:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        yield b"\x89PNG partial"
+        raise ConnectionError("connection reset")
+
+class _BrokenSession:
+    def get(self, url, **kwargs):
+        return _BrokenResponse()
+
+@pytest.fixture
+def gen(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "T2I_API_KEY", "")
+    return ImageGenerator(out_dir=str(tmp_path / "images"))
+
+def test_failed_download_leaves_no_part_file(gen):
+    gen._session = _BrokenSession()
+    out = gen.out / "image.png"
+    with pytest.raises(ConnectionError):
+        gen._download("http://example.invalid/image.png", out)
+    assert not out.exists()
+    assert not out.with_suffix(".part").exists()
+
+def test_returned_paths_survive_cache_eviction(gen):
+    first = gen.generate("a cat")
+    assert gen.generate("a cat") != first  # a hit gets its own path too
+    size = gen.cache.total
+    gen.cache.max_bytes = size  # room for one entry: each new render evicts the last
+    for subject in ("a dog", "a sunset", "a city"):
+        gen.generate(subject)
+    assert len(gen.cache) == 1 and len(list(gen.cache.root.glob("*.png"))) == 1
+    with open(first, "rb") as f:
+        assert f.read(4) == b"\x89PNG"
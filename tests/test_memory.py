@@ -0,0 +1,77 @@
+import threading
+
+from app.memory import SessionMemoryStore
+
+def test_lru_eviction_spills_and_reloads(tmp_path):
+    store = SessionMemoryStore(max_sessions=2, idle_ttl=0, spill_path=str(tmp_path / "mem.db"))
+    store.get("a").add("hello from a", "hi a")
+    store.get("b")
+    store.get("c")  # over the bound: "a" is least recently used
+    assert len(store) == 2
+    assert store.con.execute("SELECT id FROM sessions;").fetchall() == [("a",)]
+    assert store.get("a").context() == [("hello from a", "hi a")]
+    # Back in memory it is the only copy
+    assert store.con.execute("SELECT id FROM sessions WHERE id = 'a';").fetchall() == []
+    store.close()
+
+def test_idle_sessions_are_evicted(tmp_path, monkeypatch):
+    import app.memory as memory_mod
+
+    clock = [1000.0]
+    monkeypatch.setattr(memory_mod.time, "monotonic", lambda: clock[0])
+    store = SessionMemoryStore(max_sessions=10, idle_ttl=60, spill_path=str(tmp_path / "mem.db"))
+    store.get("old").add("q", "a")
+    clock[0] += 61
+    store.get("new")
+    assert len(store) == 1
+    assert store.get("old").context() == [("q", "a")]
+    store.close()
+
+def test_flush_and_reopen(tmp_path):
+    path = str(tmp_path / "mem.db")
+    store = SessionMemoryStore(max_sessions=10, idle_ttl=0, spill_path=path)
+    store.get("s").add("remember me", "ok")
+    store.close()
+    store = SessionMemoryStore(max_sessions=10, idle_ttl=0, spill_path=path)
+    assert store.get("s").context() == [("remember me", "ok")]
+    store.close()
+
+def test_spill_runs_without_the_store_lock(tmp_path):
+    store = SessionMemoryStore(max_sessions=1, idle_ttl=0, spill_path=str(tmp_path / "mem.db"))
+    store.get("a").add("q", "a")
+    held = []
+    spill = store._spill
+
+    def checking_spill(sessions):
+        held.append(store._lock.locked())
+        spill(sessions)
+
+    store._spill = checking_spill
+    store.get("b")
+    assert held == [False]
+    store.close()
+
+def test_session_picked_up_while_spilling_keeps_its_turns(tmp_path):
+    store = SessionMemoryStore(max_sessions=1, idle_ttl=0, spill_path=str(tmp_path / "mem.db"))
+    store.get("a").add("first", "1")
+    entered, release = threading.Event(), threading.Event()
+    spill = store._spill
+
+    def slow_spill(sessions):
+        entered.set()
+        release.wait(5)
+        spill(sessions)
+
+    store._spill = slow_spill
+    t = threading.Thread(target=store.get, args=("b",))
+    t.start()
+    assert entered.wait(5)
+    store._spill = spill
+    mem = store.get("a")  # evicted, not yet written
+    assert mem.context() == [("first", "1")]
+    release.set()
+    t.join(5)
+    assert store.get("a") is mem
+    # The late write of the evicted copy was dropped again: the live session is the only copy
+    assert store.con.execute("SELECT id FROM sessions WHERE id = 'a';").fetchall() == []
+    store.close()
@@ -0,0 +1,54 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from app.utils import metrics
+from app.utils.cache import SingleFlight
+
+def _work():
+    with metrics.span("pooled"):
+        pass
+    return 1
+
+def test_submit_attributes_pool_spans_to_the_turn():
+    with ThreadPoolExecutor(max_workers=1) as pool, metrics.turn() as timings:
+        metrics.set_intent("recommender")
+        assert metrics.submit(pool, _work).result() == 1
+        assert SingleFlight().submit(pool, "k", _work).result() == 1
+    assert "pooled" in timings
+    assert "pooled" in metrics.snapshot()["recommender"]
+
+def test_handle_stream_is_instrumented_and_leaves_caller_context_alone(tmp_path, monkeypatch):
+    from app.controller import Controller
+    from app.schemas import Turn
+    from app.utils.config import settings
+
+    monkeypatch.setattr(settings, "SQL_DB_PATH", str(tmp_path / "demo.db"))
+    metrics.registry.reset()
+    ctrl = Controller(warm_up="")
+    pieces = list(ctrl.handle_stream(Turn(user_text="weather in paris")))
+    assert "Paris" in "".join(pieces)
+    assert metrics.snapshot()["weather"]["intent"]["count"] == 1
+    assert metrics._timings.get() is None
+
+    # Abandoning the stream part-way still closes the turn
+    gen = ctrl.handle_stream(Turn(user_text="weather in rome"))
+    next(gen)
+    gen.close()
+    assert metrics.snapshot()["weather"]["total"]["count"] == 2
+
+def test_batched_recommender_times_the_stage_in_the_callers_turn():
+    from app.server import BatchedRecommender
+
+    class _Agent:
+        def run_batch(self, queries, k):
+            with metrics.span("recommend"):  # on the batcher thread: must not be recorded
+                return [f"{q}:{k}" for q in queries]
+
+    metrics.registry.reset()
+    rec = BatchedRecommender(_Agent(), window_ms=1)
+    with metrics.turn() as timings:
+        metrics.set_intent("recommender")
+        assert rec.run("laptop", 3) == "laptop:3"
+    assert "recommend" in timings
+    snap = metrics.snapshot()
+    assert snap["recommender"]["recommend"]["count"] == 1
+    assert "none" not in snap
@@ -0,0 +1,198 @@
+import numpy as np
+
+from app.agents.recommender_agent import RecommenderAgent
+
+def test_top_k_ties_resolve_to_the_lowest_indices():
+    sims = np.zeros(20_000)
+    assert RecommenderAgent._top_k(sims, 5).tolist() == [0, 1, 2, 3, 4]
+    rows = RecommenderAgent._top_k_rows(np.zeros((3, 20_000)), 5)
+    assert rows.tolist() == [[0, 1, 2, 3, 4]] * 3
+
+def test_top_k_orders_by_score_then_index():
+    sims = np.array([0.1, 0.5, 0.5, 0.9, 0.5, 0.0])
+    assert RecommenderAgent._top_k(sims, 3).tolist() == [3, 1, 2]
+    assert RecommenderAgent._top_k_rows(sims[None, :], 3).tolist() == [[3, 1, 2]]
+
+import csv
+import json
+
+import pytest
+
+from app.utils.config import settings
+
+CATALOG = [
+    {"id": 1, "title": "Noise-cancelling headphones", "desc": "over-ear bluetooth travel wireless"},
+    {"id": 2, "title": "Running shoes", "desc": "lightweight breathable daily trainer cushioned"},
+    {"id": 3, "title": "Mechanical keyboard", "desc": "tactile switches compact rgb quiet office"},
+    {"id": 4, "title": "Wireless mouse", "desc": "bluetooth compact quiet office travel"},
+]
+
+def _write_json(path, items):
+    path.write_text(json.dumps(items))
+    return str(path)
+
+def _ids(results):
+    return [r["id"] for r in results]
+
+def _is_mapped(arr) -> bool:
+    while arr is not None:
+        if isinstance(arr, np.memmap):
+            return True
+        arr = getattr(arr, "base", None)
+    return False
+
+@pytest.fixture
+def catalog(tmp_path):
+    return _write_json(tmp_path / "catalog.json", CATALOG)
+
+def test_index_persists_and_reloads_memory_mapped(tmp_path, catalog):
+    index_dir = str(tmp_path / "index")
+    first = RecommenderAgent(catalog=catalog, index_dir=index_dir)
+    second = RecommenderAgent(catalog=catalog, index_dir=index_dir)
+    assert _is_mapped(second.index.mat.data) and _is_mapped(second.index.mat.indices)
+    assert second.index.terms == first.index.terms
+    for query in ("bluetooth headphones", "quiet office keyboard", "running"):
+        assert second.run(query, k=3) == first.run(query, k=3)
+
+def test_upsert_is_searchable_and_persisted(tmp_path, catalog):
+    index_dir = str(tmp_path / "index")
+    agent = RecommenderAgent(catalog=catalog, index_dir=index_dir)
+    agent.upsert_items([{"id": 5, "title": "Travel headphones", "desc": "wireless bluetooth over-ear"}])
+    assert agent.index.fitted_rows == 4 and agent.index.appended == 1
+    assert 5 in _ids(agent.run("wireless travel headphones", k=2))
+    from app.agents.catalog import CatalogIndex
+
+    saved = CatalogIndex.load(index_dir, CatalogIndex.read_manifest(index_dir))
+    assert 5 in saved.rows and saved.appended == 1
+    # A hand edit is saved unsigned, so the next sync re-diffs against the source
+    assert CatalogIndex.read_manifest(index_dir)["signature"] == ""
+
+def test_upsert_replaces_the_old_version(catalog, tmp_path):
+    agent = RecommenderAgent(catalog=catalog, index_dir=str(tmp_path / "index"))
+    agent.upsert_items([{"id": 2, "title": "Trail shoes", "desc": "running trainer"}])
+    hits = [r for r in agent.run("running shoes", k=4) if r["id"] == 2]
+    assert len(hits) == 1 and hits[0]["title"] == "Trail shoes"
+
+def test_removed_items_never_rank(catalog, tmp_path):
+    agent = RecommenderAgent(catalog=catalog, index_dir=str(tmp_path / "index"))
+    assert _ids(agent.run("bluetooth headphones", k=1)) == [1]
+    agent.remove_items([1])
+    assert 1 not in _ids(agent.run("bluetooth headphones", k=4))
+    assert 1 not in _ids(agent.run_batch(["bluetooth headphones"], k=4)[0])
+    assert 1 not in [it["id"] for it in agent.items]
+
+def test_source_changes_append_until_the_refit_threshold(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "RECOMMENDER_REFIT_RATIO", 0.5)
+    path = tmp_path / "catalog.json"
+    agent = RecommenderAgent(catalog=_write_json(path, CATALOG), index_dir=str(tmp_path / "index"))
+    extra = {"id": 5, "title": "Gaming headset", "desc": "wireless over-ear rgb"}
+    _write_json(path, CATALOG[1:] + [extra])  # one removed, one added: diffed in
+    agent.sync()
+    assert (agent.index.fitted_rows, agent.index.appended) == (4, 1)
+    assert 1 not in agent.index.rows and 5 in agent.index.rows
+    more = [{"id": 6 + i, "title": f"Desk lamp {i}", "desc": "led warm light"} for i in range(2)]
+    _write_json(path, CATALOG[1:] + [extra] + more)  # 3 appended > 0.5 * 4 fitted: refit
+    agent.sync()
+    assert (agent.index.fitted_rows, agent.index.appended) == (6, 0)
+    assert "lamp" in agent.index.terms  # the refit vocabulary knows the new words
+
+def test_json_and_csv_sources_build_the_same_index(tmp_path):
+    csv_path = tmp_path / "catalog.csv"
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["id", "title", "desc"])
+        writer.writeheader()
+        writer.writerows(CATALOG)
+    from_json = RecommenderAgent(catalog=_write_json(tmp_path / "catalog.json", CATALOG),
+                                 index_dir=str(tmp_path / "json")).index
+    from_csv = RecommenderAgent(catalog=str(csv_path), index_dir=str(tmp_path / "csv")).index
+    assert from_csv.terms == from_json.terms
+    np.testing.assert_allclose(from_csv.mat.toarray(), from_json.mat.toarray())
+    # CSV has no types: ids come back as strings
+    assert [(str(a["id"]), a["title"], a["desc"]) for a in from_json.items] == \
+           [(b["id"], b["title"], b["desc"]) for b in from_csv.items]
+
+def test_run_batch_matches_run():
+    rng = np.random.default_rng(3)
+    words = "bluetooth quiet office travel running keyboard wireless compact shoes lamp rgb".split()
+    items = [{"id": i, "title": " ".join(rng.choice(words, 2)), "desc": " ".join(rng.choice(words, 4))}
+             for i in range(200)]
+    agent = RecommenderAgent(items=items)
+    queries = [" ".join(rng.choice(words, 2)) for _ in range(25)] + ["nothing matches this", ""]
+    expected = [agent.run(q, k=5) for q in queries]
+    for chunk_size in (None, 1, 7):
+        assert agent.run_batch(queries, k=5, chunk_size=chunk_size) == expected
+    assert agent.run_batch([], k=5) == []
+
+class _FakeChat:
+    """Stands in for the LLM: lists the prompt's titles in reverse, after `delay` seconds."""
+
+    def __init__(self, delay=0.0):
+        import threading
+
+        self.delay = delay
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, system, prompt):
+        import time
+
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        titles = [ln[2:].split(":")[0] for ln in prompt.splitlines() if ln.startswith("- ")]
+        return [f"{t} — Brands: Acme — Note: good" for t in reversed(titles)]
+
+@pytest.fixture
+def online(monkeypatch):
+    import app.agents.recommender_agent as rec_mod
+
+    monkeypatch.setattr(settings, "RECOMMENDER_ONLINE_ENRICHMENT", True)
+    monkeypatch.setattr(settings, "LLM_BACKEND", "stub")
+    monkeypatch.setattr(settings, "RECOMMENDER_LLM_MODE", "combined")
+    monkeypatch.setattr(settings, "RECOMMENDER_LLM_BUDGET_MS", 0.0)
+
+    def install(chat):
+        monkeypatch.setattr(rec_mod, "_chat", chat)
+        return chat
+    return install
+
+def _plain_ids(query: str):
+    """TF-IDF order, without the LLM step."""
+    settings.RECOMMENDER_ONLINE_ENRICHMENT = False
+    try:
+        return _ids(RecommenderAgent(items=CATALOG).run(query, k=2))
+    finally:
+        settings.RECOMMENDER_ONLINE_ENRICHMENT = True
+
+def test_llm_rerank_is_cached(online):
+    chat = online(_FakeChat())
+    agent = RecommenderAgent(items=CATALOG)
+    tfidf = _plain_ids("bluetooth travel")
+    first = agent.run("bluetooth travel", k=2)
+    assert _ids(first) == tfidf[::-1]
+    assert agent.run("Bluetooth  travel!", k=2) == first  # same normalised query and candidates
+    assert chat.calls == 1
+
+def test_concurrent_identical_requests_share_one_llm_call(online):
+    from concurrent.futures import ThreadPoolExecutor
+
+    chat = online(_FakeChat(delay=0.2))
+    agent = RecommenderAgent(items=CATALOG)
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        results = list(pool.map(lambda _: agent.run("quiet office", k=2), range(6)))
+    assert chat.calls == 1
+    assert all(r == results[0] for r in results)
+
+def test_llm_over_budget_falls_back_and_fills_the_cache(online, monkeypatch):
+    import time
+
+    monkeypatch.setattr(settings, "RECOMMENDER_LLM_BUDGET_MS", 50.0)
+    chat = online(_FakeChat(delay=0.3))
+    agent = RecommenderAgent(items=CATALOG)
+    plain = _plain_ids("quiet office")
+    t0 = time.monotonic()
+    assert _ids(agent.run("quiet office", k=2)) == plain
+    assert time.monotonic() - t0 < 0.25
+    time.sleep(0.4)  # the call finishes in the background and is cached
+    assert _ids(agent.run("quiet office", k=2)) == plain[::-1]
+    assert chat.calls == 1
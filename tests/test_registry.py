@@ -0,0 +1,31 @@
+import logging
+
+from app.registry import AgentRegistry
+
+def test_build_once_and_wrap():
+    built = []
+    reg = AgentRegistry()
+    reg.register("a", lambda: built.append(1) or ["agent"])
+    reg.wrap("a", lambda agent: ("wrapped", agent))
+    assert reg.peek("a") is None
+    first = reg.get("a")
+    assert first == ("wrapped", ["agent"]) and reg.get("a") is first
+    assert built == [1] and "a" in reg.timings
+
+def test_warm_up_failure_is_logged_and_left_for_first_use(caplog):
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("model missing")
+        return "agent"
+
+    reg = AgentRegistry()
+    reg.register("flaky", flaky)
+    with caplog.at_level(logging.WARNING, logger="app.registry"):
+        reg.warm_up().join(5)
+    assert "Warm-up of flaky failed" in caplog.text
+    assert reg.warmup_errors == {"flaky": "RuntimeError: model missing"}
+    assert reg.peek("flaky") is None
+    assert reg.get("flaky") == "agent"
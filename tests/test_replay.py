@@ -0,0 +1,94 @@
+import io
+import json
+import threading
+import time
+
+from app.replay import Replayer, read_turns
+from app.schemas import TurnResponse
+
+class _SlowController:
+    """Records how many turns of each session overlap, and the order each session ran in."""
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.order = {}
+        self.active = set()
+        self.overlapped = False
+
+    def handle(self, turn):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            self.order.setdefault(turn.session_id, []).append(turn.user_text)
+            self.overlapped |= turn.session_id in self.active
+            self.active.add(turn.session_id)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+            self.active.discard(turn.session_id)
+        return TurnResponse(response_text=turn.user_text)
+
+def _replay(lines, workers=8):
+    ctrl, out = _SlowController(), io.StringIO()
+    replayer = Replayer(ctrl, out, workers=workers)
+    for lineno, turn in read_turns(io.StringIO("\n".join(json.dumps(l) for l in lines))):
+        replayer.submit(lineno, turn)
+    replayer.wait()
+    return ctrl, [json.loads(l) for l in out.getvalue().splitlines()]
+
+def test_lines_without_session_get_their_own():
+    turns = list(read_turns(io.StringIO('{"user_text": "a"}\n\n{"user_text": "b"}\n')))
+    assert [(n, t.session_id) for n, t in turns] == [(1, "line-1"), (3, "line-3")]
+
+def test_sessionless_turns_run_in_parallel():
+    ctrl, records = _replay([{"user_text": f"t{i}"} for i in range(8)])
+    assert len(records) == 8
+    assert ctrl.peak > 1
+
+def test_shared_session_keeps_file_order_and_never_overlaps():
+    lines = [{"user_text": f"s{i}", "session_id": "s"} for i in range(5)]
+    lines += [{"user_text": f"x{i}"} for i in range(5)]
+    ctrl, _ = _replay(lines)
+    assert ctrl.order["s"] == [f"s{i}" for i in range(5)]
+    assert not ctrl.overlapped
+
+def test_malformed_lines_are_recorded_and_the_rest_replayed(tmp_path, monkeypatch):
+    import app.controller
+    from app.replay import main
+
+    monkeypatch.setattr(app.controller, "Controller", lambda: _SlowController(delay=0.01))
+    src, dst = tmp_path / "turns.jsonl", tmp_path / "out.jsonl"
+    src.write_text('{"user_text": "a"}\n{not json\n["no", "dict"]\n{"session_id": "s"}\n{"user_text": "b"}\n')
+    main([str(src), "-o", str(dst), "--workers", "2"])
+    records = sorted((json.loads(l) for l in dst.read_text().splitlines()), key=lambda r: r["line"])
+    assert [r["line"] for r in records] == [1, 2, 3, 4, 5]
+    assert [r["response_text"] for r in records if "error" not in r] == ["a", "b"]
+    assert all(r["error"].startswith("invalid turn") for r in records[1:4])
+
+def test_read_turns_without_handler_raises():
+    import pytest
+
+    with pytest.raises(ValueError, match="line 2"):
+        list(read_turns(io.StringIO('{"user_text": "a"}\n{oops\n')))
+
+def test_failed_write_does_not_hang_wait():
+    class _BrokenOut:
+        def write(self, text):
+            raise OSError("disk full")
+
+    replayer = Replayer(_SlowController(delay=0), _BrokenOut(), workers=2, max_pending=2)
+    lines = "\n".join(json.dumps({"user_text": f"t{i}", "session_id": "s"}) for i in range(4))
+
+    def run():  # submit blocks too if slots leak, so both go on a thread we can time out
+        for lineno, turn in read_turns(io.StringIO(lines)):
+            replayer.submit(lineno, turn)
+        replayer.wait()
+
+    done = threading.Thread(target=run, daemon=True)
+    done.start()
+    done.join(5)
+    assert not done.is_alive()
+    assert replayer.errors == 4
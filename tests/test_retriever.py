@@ -0,0 +1,77 @@
+import builtins
+
+import pytest
+
+from app.rag import ingest as ingest_mod
+from app.rag.retriever import Retriever
+from app.utils.config import settings
+
+@pytest.fixture
+def docs(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDINGS_BACKEND", "stub")
+    monkeypatch.setattr(settings, "EMBED_CACHE_PATH", str(tmp_path / "embed.sqlite"))
+    d = tmp_path / "docs"
+    d.mkdir()
+    (d / "a.txt").write_text("alpha bravo charlie " * 20, encoding="utf-8")
+    (d / "b.txt").write_text("delta echo foxtrot " * 20, encoding="utf-8")
+    monkeypatch.setattr(settings, "DOCS_DIR", str(d))
+    return d
+
+def test_unreadable_file_is_retried_on_next_sync(docs, tmp_path, monkeypatch):
+    def flaky_open(path, *args, **kwargs):
+        if str(path).endswith("b.txt"):
+            raise OSError("disk hiccup")
+        return builtins.open(path, *args, **kwargs)
+
+    monkeypatch.setattr(ingest_mod, "open", flaky_open, raising=False)
+    r = Retriever(str(tmp_path / "index"), settings.MODEL_NAME)
+    assert r.last_ingest.failed == ["b.txt"]
+    assert "b.txt" not in r.manifest["files"]
+
+    monkeypatch.delattr(ingest_mod, "open")
+    changes = r.sync()
+    assert changes["added"] == ["b.txt"]
+    assert r.manifest["files"]["b.txt"]["ids"]
+
+def test_version_is_computed_by_sync_not_per_query(docs, tmp_path):
+    r = Retriever(str(tmp_path / "index"), settings.MODEL_NAME)
+    assert "version" in vars(r)
+    before = r.version
+    (docs / "a.txt").write_text("golf hotel india " * 20, encoding="utf-8")
+    assert r.version == before
+    r.sync()
+    assert r.version != before
+
+def _sources(results):
+    return [r["meta"]["source"] for r in results]
+
+def test_lexical_ranking_and_removal_of_a_deleted_file(docs, tmp_path):
+    (docs / "c.txt").write_text("alpha golf hotel " * 20, encoding="utf-8")
+    r = Retriever(str(tmp_path / "index"), settings.MODEL_NAME)
+    assert _sources(r.search("bravo charlie", k=1, mode="lexical"))[0].endswith("a.txt")
+    assert _sources(r.search("golf", k=1, mode="lexical"))[0].endswith("c.txt")
+    (docs / "c.txt").unlink()
+    assert r.sync()["deleted"] == ["c.txt"]
+    assert r.search("golf hotel", k=4, mode="lexical") == []
+    assert not any(s.endswith("c.txt") for s in _sources(r.search("alpha golf", k=4, mode="hybrid")))
+
+def test_prefilter_scores_only_lexical_candidates(docs, tmp_path, monkeypatch):
+    for i in range(6):
+        (docs / f"n{i}.txt").write_text(f"november oscar papa{i} " * 20, encoding="utf-8")
+    r = Retriever(str(tmp_path / "index"), settings.MODEL_NAME)
+    query = "alpha bravo delta"
+    lexical = [cid for cid, _ in r.bm25.search(query, 20)]
+    # The prefilter's dense order is the full vector ranking restricted to the candidates
+    full = r._vector_ranking(query, len(r.vs.index_to_docstore_id))
+    assert r._rescore(query, lexical) == [cid for cid in full if cid in lexical]
+
+    monkeypatch.setattr(settings, "RETRIEVAL_FETCH_K", 20)
+    monkeypatch.setattr(settings, "RETRIEVAL_PREFILTER", False)
+    hybrid = r.search(query, k=2, mode="hybrid")
+    monkeypatch.setattr(settings, "RETRIEVAL_PREFILTER", True)
+    prefiltered = r.search(query, k=2, mode="hybrid")
+    # Only the two lexical hits are candidates; full hybrid agrees on them and their order
+    assert [s.split(":")[0] for s in _sources(prefiltered)] == ["a.txt", "b.txt"]
+    assert _sources(prefiltered) == _sources(hybrid)
+    monkeypatch.setattr(settings, "RETRIEVAL_FETCH_K", 1)
+    assert _sources(r.search(query, k=1, mode="hybrid")) == _sources(prefiltered)[:1]
@@ -0,0 +1,41 @@
+import http.client
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.server import PooledHTTPServer, make_handler
+
+@pytest.fixture
+def server():
+    ctrl = SimpleNamespace(agents=SimpleNamespace(warmup_errors={}))
+    srv = PooledHTTPServer(("127.0.0.1", 0), make_handler(ctrl), workers=1)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+def _get(conn, path="/healthz"):
+    conn.request("GET", path)
+    resp = conn.getresponse()
+    resp.read()
+    return resp.status
+
+def test_keep_alive_connection_is_reused(server):
+    conn = http.client.HTTPConnection(*server.server_address, timeout=5)
+    assert _get(conn) == 200
+    sock = conn.sock
+    assert _get(conn) == 200
+    assert conn.sock is sock
+    conn.close()
+
+def test_idle_keep_alive_does_not_starve_other_clients(server):
+    idle = http.client.HTTPConnection(*server.server_address, timeout=5)
+    assert _get(idle) == 200  # now parked on the only worker
+    other = http.client.HTTPConnection(*server.server_address, timeout=5)
+    t0 = time.monotonic()
+    assert _get(other) == 200
+    assert time.monotonic() - t0 < 2
+    idle.close()
+    other.close()
@@ -0,0 +1,95 @@
+import sqlite3
+
+import pytest
+
+from app.agents.sql_agent import SQLAgent
+from app.utils.config import settings
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = tmp_path / "demo.db"
+    monkeypatch.setattr(settings, "SQL_DB_PATH", str(path))
+    return path
+
+def _journal_mode(path) -> str:
+    con = sqlite3.connect(str(path))
+    try:
+        return con.execute("PRAGMA journal_mode;").fetchone()[0]
+    finally:
+        con.close()
+
+def test_database_file_is_not_converted_to_wal_by_default(db_path):
+    agent = SQLAgent()
+    agent.ensure_schema()
+    agent.pool.close()
+    agent.con.close()
+    assert _journal_mode(db_path) == "delete"
+    assert not (db_path.parent / "demo.db-wal").exists()
+
+def test_wal_is_opt_in(db_path, monkeypatch):
+    monkeypatch.setattr(settings, "SQL_WAL", True)
+    agent = SQLAgent()
+    agent.ensure_schema()
+    agent.pool.close()
+    agent.con.close()
+    assert _journal_mode(db_path) == "wal"
+
+@pytest.mark.parametrize("sql", [
+    "SELECT item FROM sales;",
+    "SELECT item FROM sales -- every sale",
+    "SELECT item FROM sales; -- every sale\n",
+    "SELECT item /* the name */ FROM sales ;;",
+    "SELECT item FROM sales /* unterminated",
+])
+def test_count_accepts_trailing_comments_and_semicolons(db_path, sql):
+    agent = SQLAgent()
+    agent.ensure_schema()
+    expected = len(agent.run("SELECT item FROM sales"))
+    assert agent.count(sql) == expected
+    assert agent.count(sql, limit=1) == min(expected, 2)
+
+def test_comment_markers_inside_literals_are_kept(db_path):
+    agent = SQLAgent()
+    agent.ensure_schema()
+    assert agent.count("SELECT '--not a comment;' AS a, \"/*x*/\" AS b -- real") == 1
+
+def test_run_returns_rows_and_stream_reports_truncation(db_path, monkeypatch):
+    agent = SQLAgent()
+    agent.ensure_schema()
+    rows = agent.run("SELECT item FROM sales")
+    assert isinstance(rows, list) and rows[0] == {"item": "apple"}
+    monkeypatch.setattr(settings, "SQL_MAX_ROWS", len(rows) - 1)
+    assert len(agent.run("SELECT item FROM sales")) == len(rows) - 1
+    with agent.stream("SELECT item FROM sales") as stream:
+        assert sum(len(batch) for batch in stream) == len(rows) - 1
+        assert stream.truncated
+
+def test_empty_database_is_seeded(db_path):
+    agent = SQLAgent()
+    assert agent.ensure_schema()
+    assert agent.schema_version() >= 1
+    assert not agent.ensure_schema()
+
+def test_foreign_table_with_a_demo_name_is_left_alone(db_path, caplog, capsys):
+    con = sqlite3.connect(str(db_path))
+    con.execute("CREATE TABLE products(sku TEXT, name TEXT);")
+    con.execute("INSERT INTO products VALUES ('A-1', 'widget');")
+    con.commit()
+    con.close()
+    agent = SQLAgent()
+    with caplog.at_level("INFO", logger="app.agents.sql_agent"):
+        assert not agent.ensure_schema()
+    assert "not a demo database" in caplog.text and capsys.readouterr().out == ""
+    assert agent.con.execute("SELECT * FROM products;").fetchall() == [("A-1", "widget")]
+    assert agent.schema_version() == 0
+
+def test_unversioned_demo_database_is_reseeded(db_path):
+    from app.agents.sql_agent import DEMO_TABLES
+
+    con = sqlite3.connect(str(db_path))
+    con.execute(DEMO_TABLES["sales"][0])
+    con.commit()
+    con.close()
+    agent = SQLAgent()
+    assert agent.ensure_schema()
+    assert agent.run("SELECT COUNT(*) AS n FROM sales") == [{"n": len(DEMO_TABLES["sales"][1])}]
@@ -0,0 +1,37 @@
+import pytest
+
+from app.utils.text import detect_intent, is_read_query
+
+@pytest.mark.parametrize("sql", [
+    "SELECT item FROM sales",
+    "with x as (select 1 as a) select a from x",
+    "  WITH totals AS (SELECT item, SUM(qty) q FROM sales GROUP BY item) SELECT * FROM totals",
+    "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 3) SELECT i FROM n",
+])
+def test_routed_sql_is_accepted_by_the_controller(sql):
+    assert detect_intent(sql) == "sql"
+    assert is_read_query(sql)
+
+def test_other_statements_are_not_read_queries():
+    assert not is_read_query("DROP TABLE sales")
+    assert not is_read_query("selection of books")
+    assert not is_read_query("with the database, show tables")
+
+def test_sentence_starting_with_with_is_refused(tmp_path, monkeypatch):
+    from app.controller import Controller
+    from app.schemas import Turn
+    from app.utils.config import settings
+
+    monkeypatch.setattr(settings, "SQL_DB_PATH", str(tmp_path / "demo.db"))
+    ctrl = Controller(warm_up="")
+    reply = ctrl.handle(Turn(user_text="with the database, show tables SELECT")).response_text
+    assert reply.startswith("⚠️ Only SELECT")
+
+def test_cte_runs_end_to_end(tmp_path, monkeypatch):
+    from app.controller import Controller
+    from app.schemas import Turn
+    from app.utils.config import settings
+
+    monkeypatch.setattr(settings, "SQL_DB_PATH", str(tmp_path / "demo.db"))
+    reply = Controller(warm_up="").handle(Turn(user_text="WITH x AS (SELECT 1 AS a) SELECT a FROM x")).response_text
+    assert reply.startswith("📊") and "'a': 1" in reply
@@ -0,0 +1,72 @@
+import pytest
+
+from app.agents.weather_agent import WeatherAgent, extract_location, normalize_location
+from app.utils.config import settings
+
+@pytest.mark.parametrize("text, place", [
+    ("weather in singapore", "singapore"),
+    ("What's the weather like in New York today?", "new york"),
+    ("Paris weather", "paris"),
+    ("temperature in sf", "san francisco"),
+    ("forecast for tokyo", "tokyo"),
+    ("how is the weather in São Paulo right now?", "são paulo"),
+    ("weather in Rio de Janeiro tomorrow please", "rio de janeiro"),
+    ("how is the weather for the weekend in Paris", "paris"),
+    ("how is the weather in Paris for the weekend", "paris"),
+    ("Paris weather for tomorrow", "paris"),
+    ("weather", ""),
+    ("weather forecast for tomorrow", ""),
+    ("weather for the weekend", ""),
+])
+def test_extract_location(text, place):
+    assert normalize_location(extract_location(text)) == place
+
+class _Provider:
+    def current(self, location):
+        return {"location": location}
+
+def test_time_only_question_uses_the_default_location(monkeypatch):
+    monkeypatch.setattr(settings, "WEATHER_DEFAULT_LOCATION", "Singapore")
+    assert WeatherAgent(provider=_Provider()).run("weather forecast for tomorrow") == {"location": "singapore"}
+
+def test_no_location_and_no_default_is_an_error(monkeypatch):
+    monkeypatch.setattr(settings, "WEATHER_DEFAULT_LOCATION", "")
+    with pytest.raises(ValueError):
+        WeatherAgent(provider=_Provider()).run("weather for the weekend")
+
+def test_provider_errors_do_not_carry_the_api_key():
+    from app.agents.weather_agent import WeatherAPIProvider, WeatherUnavailable
+
+    provider = WeatherAPIProvider(api_key="SECRET123", base_url="http://127.0.0.1:1/v1", timeout=1)
+    with pytest.raises(WeatherUnavailable) as exc:
+        provider.current("paris")
+    assert "SECRET123" not in str(exc.value) and "current.json" not in str(exc.value)
+    assert exc.value.__cause__ is None and exc.value.__suppress_context__
+
+def test_http_errors_report_only_the_status():
+    from app.agents.weather_agent import WeatherAPIProvider, WeatherUnavailable
+    from benchmarks.fake_weather import fake_weather
+
+    with fake_weather() as (base_url, _):
+        provider = WeatherAPIProvider(api_key="SECRET123", base_url=base_url)
+        with pytest.raises(WeatherUnavailable, match=r"^weatherapi: HTTP 400$"):
+            provider.current("")  # the fake answers 400 without a place
+
+def test_provider_needs_a_key(monkeypatch):
+    from app.agents.weather_agent import WeatherAPIProvider, WeatherUnavailable
+
+    monkeypatch.setattr(settings, "WEATHER_API_KEY", "")
+    with pytest.raises(WeatherUnavailable):
+        WeatherAPIProvider()
+
+def test_controller_reply_hides_provider_errors(monkeypatch, caplog):
+    from app.controller import Controller
+    from app.schemas import Turn
+
+    monkeypatch.setattr(settings, "WEATHER_PROVIDER", "weatherapi")
+    monkeypatch.setattr(settings, "WEATHER_API_KEY", "SECRET123")
+    monkeypatch.setattr(settings, "WEATHER_BASE_URL", "http://127.0.0.1:1/v1")
+    monkeypatch.setattr(settings, "WEATHER_TIMEOUT", 1.0)
+    reply = Controller(warm_up="").handle(Turn(user_text="weather in paris")).response_text
+    assert reply.startswith("⚠️ Weather is unavailable") and "SECRET123" not in reply
+    assert "Weather lookup failed" in caplog.text and "SECRET123" not in caplog.text